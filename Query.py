@@ -1,11 +1,8 @@
-import requests
-import socket
-import struct
-import concurrent.futures
+import re
+import signal
+import threading
 import time
 import uuid
-import re 
-import ipaddress # <--- Added for IP Math
 from datetime import datetime, timedelta
 import sys
 import os
@@ -16,7 +13,15 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 # 导入配置和数据库抽象层
 try:
     import config
-    from app.models.database import get_database
+    from app.models.database import get_database, copy_rows
+    from psycopg2.extras import execute_values
+    from app.services.a2s import A2SQueryEngine
+    from app.services.scheduler import ScanScheduler
+    from app.services.pipeline import ResultStream, ShardedWriter, start_producer
+    from app.services.master_list import MasterList, MasterListUnavailable
+    from app.services.public_ip import PublicIPResolver
+    from app.services.geoip import GEOIP_VERSION_KEY, GeoIPIndex
+    from app.services.faction import FactionClassifier
 except ImportError as e:
     print(f"Error importing modules: {e}")
     print("Make sure you're running from the project root directory")
@@ -26,195 +31,47 @@ except ImportError as e:
 STEAM_KEY = config.STEAM_KEY
 APP_ID = config.APP_ID
 API_URL = f"https://api.steampowered.com/IGameServersService/GetServerList/v1/?key={STEAM_KEY}&limit=50000&filter=\\appid\\{APP_ID}"
+MASTER_LIST_CACHE = config.MASTER_LIST_CACHE
+MASTER_LIST_CACHE_TTL = config.MASTER_LIST_CACHE_TTL
+MASTER_LIST_TIMEOUT = config.MASTER_LIST_TIMEOUT
 
 # 数据库配置现在从 config.py 和环境变量读取
 # DB_TYPE 自动在 database.py 中检测
 
 LOCAL_LOOPBACK_IP = config.LOCAL_LOOPBACK_IP
-
-A2S_INFO = b"\xff\xff\xff\xff\x54\x53\x6f\x75\x72\x63\x65\x20\x45\x6e\x67\x69\x6e\x65\x20\x51\x75\x65\x72\x79\x00"
-A2S_PLAYER_CHALLENGE = b"\xff\xff\xff\xff\x55\xff\xff\xff\xff"
-A2S_PLAYER_HEADER = b"\xff\xff\xff\xff\x55"
+PUBLIC_IP = config.PUBLIC_IP
+PUBLIC_IP_CACHE = config.PUBLIC_IP_CACHE
+PUBLIC_IP_TTL = config.PUBLIC_IP_TTL
 
 MAX_WORKERS = config.MAX_WORKERS
+QUERY_SOCKETS = config.QUERY_SOCKETS
 TIMEOUT = config.TIMEOUT
+MIN_TIMEOUT = config.MIN_TIMEOUT
+INITIAL_TIMEOUT = config.INITIAL_TIMEOUT
+QUERY_RETRIES = config.QUERY_RETRIES
+SEND_RATE = config.SEND_RATE
+SEND_BURST = config.SEND_BURST
 PRUNE_THRESHOLD = config.PRUNE_THRESHOLD
+PRUNE_BATCH_SIZE = config.PRUNE_BATCH_SIZE
+TIERED_SCAN = config.TIERED_SCAN
+COLLECTOR_INTERVAL = config.COLLECTOR_INTERVAL
+LAST_SEEN_REFRESH = config.LAST_SEEN_REFRESH
+GEOIP_BINARY = config.GEOIP_BINARY
+ROLLUP_RECONCILE_INTERVAL = config.ROLLUP_RECONCILE_INTERVAL
+ROLLUP_RECONCILE_DAYS = config.ROLLUP_RECONCILE_DAYS
+HISTORY_PARTITION_MONTHS_AHEAD = config.HISTORY_PARTITION_MONTHS_AHEAD
+HISTORY_RETENTION_MONTHS = config.HISTORY_RETENTION_MONTHS
+PIPELINE_QUEUE_SIZE = config.PIPELINE_QUEUE_SIZE
+PIPELINE_BATCH_SIZE = config.PIPELINE_BATCH_SIZE
+PIPELINE_BATCH_WAIT = config.PIPELINE_BATCH_WAIT
+DB_WRITERS = config.DB_WRITERS
 
 # --- FACTION INTELLIGENCE MODULE ---
-def get_fallback_country(raw_name):
-    geo_pattern = r'\b(us|eu|cn|ru|de|au|uk|fr|jp|kr|tw|sg|br|es|th|vn|nl)\b'
-    match = re.search(geo_pattern, raw_name, re.IGNORECASE)
-    if match:
-        return f"Unknown [{match.group(1).upper()}]"
-    return "Unknown"
-
-def extract_domain_name(raw_name):
-    match = re.search(r'([a-zA-Z0-9-]{2,})\.(com|net|org|tk|ru|de|eu|gg|host|cloud|xyz|info)\b', raw_name.lower())
-    if match:
-        return match.group(1).title()
-    return None
+# Patterns are compiled once in FactionClassifier; results are memoized per (name, ip)
+FACTIONS = FactionClassifier()
 
 def clean_server_name(raw_name, ip_address):
-
-    if not raw_name: return ip_address
-    name = raw_name.lower()
-
-    # --- 0. VIP LIST ---
-    VIP_PATTERNS = {
-        r'simpleserver': "SimpleServer (TH)",
-        r'valeria': "Valeria & Friends",
-        r'nekoha': "Nekoha Club",    
-        r'\bbaz\b': "BAz",
-        r'\bkf-?fr\b': "KF-FR",
-        r'\bkf-?br\b': "KF-BR",
-        r'jp\s?\|': "JP Server",
-        r'\bsg-?servers?\b': "SG-Servers",
-        r'\bhuwhyte\b': "Huwhyte",
-        r'\btripwire\b': "Tripwire Official",
-        r'\bbloodhounds\b': "Bloodhounds",
-        r'\bkog\b': "KoG Clan",
-        r'\bcyxc\b': "Cyxc",
-        r'\bamursk\b': "Amursk",
-        r'\bmadhouse\b': "MadHouse",
-        r'\bamerica latina brasil\b': "America Latina Brasil",
-        r'\blarge\s?farva\b': "Large Farva",
-        r'\bpunchguts\b': "Punchguts",
-        r'\bspb-?gs\b': "SPB-GS",
-        r'\bextreme\s?server\b': "Extreme Server",
-        r'\bpowerbits\b': "Powerbits",
-        r'\bwilnet\b': "Wilnet Gaming",
-        r'\bnerdit\b': "Nerdit",
-        r'\bmod-?eu\b': "Mod-EU",
-        r'\bnfo(?:servers)?\b': "NFO Servers",
-        r'\bdslive\b': "DSLive",
-        r'\bzgaming\b': "ZGaming",
-        r'\[kr\]\s+public\s+server': "[KR] Public Server",
-        r'\bkf2\.eu\b': "KF2.eu SuperPerkTraining",
-        r'\btwilight realm\b': "Twilight Realm",
-        r'\bthe alley\b': "The Alley",
-        r'^cd\s?#\d+': "Legs CD",
-        r'the\s?outpost': "The Outpost",
-        r'sora-?iro': "Sora-Iro (JP)", 
-        
-        # --- ASIAN / SPECIAL CHARACTER FACTIONS ---
-        r'뽀이뿨이\s?poi': "POI (Korea)",
-        r'猛男妙妙屋': "Mengnan (CN)",
-        r'烂番茄菜篮子': "Rotten Tomato (CN)",
-        r'孤风娱乐': "Gufeng Entertainment",
-        r'禁忌边境线': "Forbidden Borderline",
-        r'医疗大小姐': "Medical Miss",
-        r'土豆服务器': "Potato Server (CN)",
-        r'ナツ': "Natsu",
-        r'诗人\s?rpg': "Poet RPG",
-        r'缅北腰花': "Myanmar Kidney Assoc",
-        r'大布笑传': "Dabu Laughing",
-        r'柚子': "Youzi",
-        r'离离原上咪': "Lili Plain",
-    }
-
-    for pattern, faction in VIP_PATTERNS.items():
-        if re.search(pattern, name):
-            return faction
-
-    # --- 0.5 DOMAIN RESCUE ---
-    domain_faction = extract_domain_name(raw_name)
-    if domain_faction:
-        return domain_faction
-
-    # --- 1. REMOVE WEB TRASH ---
-    name = re.sub(r'https?://\S+|www\.\S+|discord\.gg/\S+', '', name)
-    name = re.sub(r'\.(com|net|org|tk|ru|de|eu|gg|host|cloud|xyz|info)\b', '', name)
-    name = re.sub(r'\bqq\d+\b', '', name)
-
-    # --- 2. REMOVE UUIDs ---
-    name = re.sub(r'#[a-f0-9-]{10,}', '', name)
-
-    # --- 2.5 EARLY PIPE SPLIT (ENHANCED) ---
-    # Normalize weird pipes to standard pipe
-    name = name.replace('¦', '|').replace('｜', '|').replace('│', '|')
-    if '|' in name:
-        name = name.split('|')[0]
-
-    # --- 3. THE KILL LIST ---
-    KILL_PATTERNS = [
-        r'\b(us|eu|cn|ru|de|au|uk|fr|jp|kr|tw|sg|br|es|th|vn|nl)\b',
-        r'\b(east|west|north|south|central|global|international)\b',
-        r'\b(dallas|seattle|miami|chicago|new\s?york|london|tokyo|santiago|montreal|sydney|paris|frankfurt|singapore|los\s?angeles)\b',
-        r'\btakeover\b', r'\bstandby\b', r'\bidle\b', r'\bafk\b',
-        r'\branked\b', r'\bunranked\b', r'\bwhitelist(?:ed)?\b', r'\bprivate\b',
-        r'\bpassword(?:ed)?\b', r'\bpublic\b', r'\bdedicated\b', r'\bofficial\b',
-        r'\bby\b', 
-        r'\bendless\b', r'\bsurvival\b', r'\bobjective\b', r'\bholdout\b', r'\bversus\b',
-        r'\bweekly\b', r'\boutbreak\b', r'\bwave\b', r'\bclassic\b',
-        r'\bcd\b', r'\bcontrolled\s?difficulty\b', r'\bprecision\b', r'\bspam\b',
-        r'\bzerg\s?mode\b', 
-        r'\bhoe\+{0,4}\b', r'\bhell\s?on\s?earth\b', r'\bsuicidal\b', r'\bhard\b',
-        r'\bnormal\b', r'\bbeginner\b', r'\bgod\s?mode\b', r'\bdifficulty\b',
-        r'\bextreme\b', r'\binsane\b', r'\bvery\b',
-        r'\btick(?:rate)?\b', r'\bhz\b', r'\bfps\b', r'\bm\.2\b', r'\bssd\b', r'\bnvme\b',
-        r'\blow\s?ping\b', r'\bfast\s?dl\b', r'\bredirect\b', r'\blatency\b',
-        r'\bslot\b', r'\bplayer\b', r'\b\d{1,3}p\b',
-        r'\bcustom\b', r'\bmap(?:s)?\b', r'\bvanilla\b', r'\bworkshop\b',
-        r'\brpg(?:mod)?\b', r'\bzedternal(?:reborn)?\b', r'\breborn\b',
-        r'\bno\s?edars?\b', r'\bno\s?qps?\b', r'\bmax\s?spawn\b',
-        r'\bweapon(?:s)?\b', r'\bzed(?:s)?\b', r'\bdlc\b', r'\bshared\b',
-        r'\bperk(?:s)?\b', r'\blevel(?:s)?\b', r'\blvl\b', r'\bxp\b', r'\bprestige\b',
-        r'\bdosh\b', r'\bvault\b', r'\bfriendly\s?fire\b', r'\bff\b',
-        r'\brampage(?:mod)?\b', r'\band\s?more\b',
-        r'\bkilling floor 2(?: server)?\b', r'\bkf2(?: server)?\b', r'\bserver\b',
-        r'\blong\b', r'\bshort\b', r'\bmedium\b', r'\bauto\b', r'\breset\b', r'\bnew\b'
-    ]
-    
-    name = re.sub("|".join(KILL_PATTERNS), ' ', name)
-
-    # --- 4. CLEANUP ---
-    name = re.sub(r'#\d+', ' ', name) 
-    name = re.sub(r'\b\d+\b', ' ', name) 
-    name = re.sub(r'[^\w\s]', ' ', name) 
-    name = re.sub(r'\s+', ' ', name).strip()
-
-    # --- 5. THE FAILSAFE ---
-    if len(name) < 2:
-        fallback = get_fallback_country(raw_name)
-        if fallback != "Unknown":
-            return fallback
-        return f"{ip_address}"
-
-    return name.title()
-
-def resolve_geo_db(cur, ip_str, has_geoip=False):
-    """Resolves IP to City, Code using DB ip_ranges."""
-    if not has_geoip:
-        return "Unknown"
-    
-    try:
-        ip_int = int(ipaddress.IPv4Address(ip_str))
-        cur.execute("""
-            SELECT city_name, country_code
-            FROM ip_ranges 
-            WHERE ip_to >= %s 
-            ORDER BY ip_to ASC 
-            LIMIT 1
-        """, (ip_int,))
-        row = cur.fetchone()
-        if row:
-            city_name = row.get('city_name') if isinstance(row, dict) else row[0]
-            country_code = row.get('country_code') if isinstance(row, dict) else row[1]
-            if city_name and country_code:
-                return f"{city_name}, {country_code}"
-            elif country_code:
-                return country_code
-    except Exception:
-        pass
-    return "Unknown"
-
-# --- Parsing ---
-def read_string(data, pos):
-    try:
-        end = data.find(b'\x00', pos)
-        if end == -1: return "", pos
-        return data[pos:end].decode('utf-8', errors='ignore'), end + 1
-    except: return "Unknown", pos + 1
+    return FACTIONS.classify(raw_name, ip_address)
 
 def parse_iso_time(time_val):
     """Parse time value - handles both datetime objects (PostgreSQL) and ISO strings (SQLite legacy)"""
@@ -231,95 +88,141 @@ def parse_iso_time(time_val):
     except (ValueError, TypeError): 
         return datetime.utcnow()
 
+# Configured or cached public IP; lookups run in the background and never hold up a scan
+_public_ip_resolver = None
+
 def get_public_ip():
-    try:
-        return requests.get('https://ifconfig.me/ip', timeout=5).text.strip()
-    except: return None
+    global _public_ip_resolver
+    if _public_ip_resolver is None:
+        _public_ip_resolver = PublicIPResolver(PUBLIC_IP, cache_path=PUBLIC_IP_CACHE, ttl=PUBLIC_IP_TTL)
+    return _public_ip_resolver.current()
 
-def query_server(server_addr):
+def update_loopback_targets(state, public_ip, master):
+    """
+    Keep the public "ip:port" -> loopback target table for locally hosted servers in step
+    with the master list. Rebuilt on the first cycle of a process, when the public IP changes
+    or when there is no previous list, otherwise only the added / removed addresses are applied.
+    """
+    def local_target(addr):
+        host, sep, port = addr.rpartition(':')
+        if sep and host == public_ip:
+            return f"{LOCAL_LOOPBACK_IP}:{port}"
+        return None
+
+    if not public_ip:
+        state.loopback_targets = {}
+    elif public_ip != state.loopback_ip or master['initial']:
+        state.loopback_targets = {}
+        for addr in master['addrs']:
+            target = local_target(addr)
+            if target:
+                state.loopback_targets[addr] = target
+    else:
+        for addr in master['removed']:
+            state.loopback_targets.pop(addr, None)
+        for addr in master['added']:
+            target = local_target(addr)
+            if target:
+                state.loopback_targets[addr] = target
+    state.loopback_ip = public_ip
+
+# Shared across scans so per-server A2S challenge tokens survive between cycles
+_query_engine = None
+
+def get_query_engine():
+    global _query_engine
+    if _query_engine is None:
+        _query_engine = A2SQueryEngine(
+            timeout=TIMEOUT, max_in_flight=MAX_WORKERS, sockets=QUERY_SOCKETS,
+            retries=QUERY_RETRIES, min_timeout=MIN_TIMEOUT, initial_timeout=INITIAL_TIMEOUT,
+            send_rate=SEND_RATE, send_burst=SEND_BURST
+        )
+    return _query_engine
+
+# Master list with its last good copy on disk, kept across scans for diffing
+_master_list = None
+
+def get_master_list():
+    global _master_list
+    if _master_list is None:
+        _master_list = MasterList(API_URL, cache_path=MASTER_LIST_CACHE, cache_ttl=MASTER_LIST_CACHE_TTL,
+                                  timeout=MASTER_LIST_TIMEOUT)
+    return _master_list
+
+# Tiered scan state (populated / empty / unreachable), kept across scans in the same process
+_scheduler = None
+
+def get_scheduler():
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = ScanScheduler(
+            populated_interval=config.SCHEDULE_POPULATED_INTERVAL,
+            empty_interval=config.SCHEDULE_EMPTY_INTERVAL,
+            backoff_base=config.SCHEDULE_BACKOFF_BASE,
+            backoff_max=config.SCHEDULE_BACKOFF_MAX
+        )
+    return _scheduler
+
+def seed_scheduler(scheduler, scan_time):
+    """Cold start: empty servers seen recently by a previous run are not due yet."""
     try:
-        ip, query_port = server_addr.split(':')
-        addr = (ip, int(query_port))
-        query_port = int(query_port)
-    except: return None
-    
-    game_port = None # Will try to discover real port
-    
-    results = {
-        "addr": server_addr, 
-        "name": None, 
-        "map": "", 
-        "player_list": [],
-        "header_count": 0,
-        "query_port": query_port,
-        "game_port": game_port
-    }
-    
-    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
-        sock.settimeout(TIMEOUT)
+        db = get_database()
+        with db.cursor() as cur:
+            cur.execute("SELECT ip_address, query_port, player_count, last_seen FROM dim_servers")
+            scheduler.seed(cur.fetchall(), scan_time)
+        db.commit()
+    except Exception as e:
+        print(f"[!] Scheduler seed failed, probing everything: {e}")
+        scheduler.seeded = True
+
+def refresh_geoip(state, db):
+    """
+    Load the GeoIP index, or reload it once import_geoip.py has replaced the binary file
+    (new inode / mtime) or re-imported the ip_ranges table (new geoip_version in meta_kv).
+    Leaves state.geoip as None when neither source is available.
+    """
+    if GEOIP_BINARY and os.path.exists(GEOIP_BINARY):
         try:
-            # 1. A2S_INFO
-            sock.sendto(A2S_INFO, addr)
-            resp = sock.recv(4096)
-            
-            if resp.startswith(b'\xff\xff\xff\xff\x41'):
-                sock.sendto(A2S_INFO + resp[5:], addr)
-                resp = sock.recv(4096)
-                
-            if resp.startswith(b'\xff\xff\xff\xff\x49'): 
-                name, pos = read_string(resp, 6)
-                map_name, pos = read_string(resp, pos)
-                folder, pos = read_string(resp, pos)
-                game, pos = read_string(resp, pos)
-                
-                pos += 2 # Skip ID
-                if pos < len(resp):
-                    results["header_count"] = resp[pos]
-
-                pos += 1 
-                if pos < len(resp):
-                    edf = resp[pos]
-                    pos += 1
-                    if edf & 0x80:
-                        if pos + 2 <= len(resp):
-                            game_port = struct.unpack('<H', resp[pos:pos+2])[0]
-                            results["game_port"] = game_port
-                
-                results["name"] = name
-                results["map"] = map_name
-            else: return None
-
-            # 2. A2S_PLAYERS
-            sock.sendto(A2S_PLAYER_CHALLENGE, addr)
-            resp = sock.recv(4096)
-            if resp.startswith(b'\xff\xff\xff\xff\x41'):
-                sock.sendto(A2S_PLAYER_HEADER + resp[5:], addr)
-                resp = sock.recv(4096)
-            
-            if resp.startswith(b'\xff\xff\xff\xff\x44'):
-                num = resp[5]
-                pos = 6
-                slot = 0
-                for _ in range(num):
-                    if pos >= len(resp): break
-                    pos += 1 # Skip Index
-                    
-                    p_name, pos = read_string(resp, pos)
-                    
-                    if pos + 8 > len(resp): break
-                    score, dur = struct.unpack('<if', resp[pos:pos+8])
-                    pos += 8
-                    
-                    # Handle Ghost Players
-                    clean = p_name.strip() if p_name else ""
-                    if not clean:
-                        clean = f"[UNNAMED:{ip}:{query_port}:{slot}]"
-                    
-                    results["player_list"].append({"name":clean,"score":score,"dur":dur})
-                    slot += 1
-        except: pass
-        
-    return results if results["name"] else None
+            st = os.stat(GEOIP_BINARY)
+            version = ('file', st.st_ino, st.st_mtime_ns, st.st_size)
+            if version != state.geoip_version:
+                state.geoip = GeoIPIndex.from_file(GEOIP_BINARY)
+                state.geoip_version = version
+                print(f"[*] GeoIP index mapped from {GEOIP_BINARY}: {len(state.geoip)} ranges")
+            return
+        except (OSError, ValueError) as e:
+            print(f"[WARN] GeoIP index file unusable ({e}), falling back to ip_ranges table")
+
+    # Check if ip_ranges table exists for GeoIP functionality
+    try:
+        with db.cursor() as cur:
+            cur.execute("""
+                SELECT EXISTS (
+                    SELECT FROM information_schema.tables
+                    WHERE table_name = 'ip_ranges'
+                ) as table_exists
+            """)
+            row = cur.fetchone()
+            if row and row['table_exists']:
+                version = ('table', _kv_get(cur, GEOIP_VERSION_KEY))
+                if version != state.geoip_version:
+                    state.geoip = GeoIPIndex.load(cur)
+                    state.geoip_version = version
+                    print(f"[*] GeoIP index loaded: {len(state.geoip)} ranges, {len(state.geoip.names)} locations")
+            else:
+                state.geoip = state.geoip_version = None
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"[WARN] GeoIP index not loaded: {e}")
+
+    if state.geoip is None:
+        print("[WARN] ip_ranges table not found. GeoIP location will be set to 'Unknown'")
+
+def query_server(server_addr):
+    """Query a single server (kept for ad-hoc use; scans go through the async engine)."""
+    return get_query_engine().run([server_addr]).get(server_addr)
+
 def _kv_get(cur, key):
     cur.execute("SELECT value FROM meta_kv WHERE key = %s", (key,))
     row = cur.fetchone()
@@ -333,101 +236,307 @@ def _kv_set(cur, key, value):
         ON CONFLICT(key) DO UPDATE SET value=excluded.value
     """, (key, value))
 
-def backfill_rollups(cur):
+def resolve_dimension_ids(cur, table, names, cache):
     """
-    One-time backfill over all history.
-    This can take a while depending on fact_history size, but you only do it once.
+    Resolve every name missing from cache to its id in dim_maps / dim_players with
+    one array upsert plus one lookup for names that already existed (DO NOTHING
+    rows are not RETURNed). Names are sorted so concurrent writers lock in the same order.
+    Returns the number of names that were not cached.
     """
-    done = _kv_get(cur, "rollups_backfilled")
-    if done == "1":
-        return
+    missing = sorted({n for n in names if n not in cache})
+    if not missing:
+        return 0
+    cur.execute(f"""
+        INSERT INTO {table} (name)
+        SELECT unnest(%s::text[])
+        ON CONFLICT (name) DO NOTHING
+        RETURNING id, name
+    """, (missing,))
+    for row in cur.fetchall():
+        cache[row['name']] = row['id']
+    existing = [n for n in missing if n not in cache]
+    if existing:
+        cur.execute(f"SELECT id, name FROM {table} WHERE name = ANY(%s::text[])", (existing,))
+        for row in cur.fetchall():
+            cache[row['name']] = row['id']
+    return len(missing)
 
-    # Operator daily (factions)
-    cur.execute("DELETE FROM fact_operator_daily")
+def upsert_fact_active(cur, rows, scan_time, prune_limit=None):
+    """
+    Merge one scan's player observations into fact_active with a single set-based upsert.
+    rows: iterable of (server_id, player_id, map_id, score, duration, session_uuid),
+    at most one per (server_id, player_id) since ON CONFLICT cannot touch a row twice.
+    New sessions start with first_seen = scan_time and calculated_duration = 0;
+    existing ones keep first_seen and get their duration recomputed from it.
+    With prune_limit, a row last seen before it (the player is back after a collector outage
+    or a gap longer than PRUNE_THRESHOLD) is deleted first so a new session starts, instead
+    of its first_seen stretching the old session over the gap.
+    Returns the deleted sessions as fact_history tuples (server_id, player_id, map_id,
+    final_score, total_time, session_start, session_end, session_uuid, calculated_duration)
+    for the caller to archive.
+    """
     cur.execute("""
-        INSERT INTO fact_operator_daily (day, operator_name, server_count, unique_players, total_playtime_seconds, last_contact)
-        SELECT
-            date(h.session_start) AS day,
-            s.operator_name,
-            COUNT(DISTINCT h.server_id) AS server_count,
-            COUNT(DISTINCT h.player_id) AS unique_players,
-            COALESCE(SUM(h.calculated_duration), 0) AS total_playtime_seconds,
-            MAX(h.session_end) AS last_contact
-        FROM fact_history h
-        JOIN dim_servers s ON h.server_id = s.id
-        WHERE s.operator_name IS NOT NULL
-          AND s.operator_name != 'Unknown'
-        GROUP BY day, s.operator_name
+        CREATE TEMP TABLE IF NOT EXISTS stage_fact_active (
+            server_id INTEGER,
+            player_id INTEGER,
+            map_id INTEGER,
+            score INTEGER,
+            duration REAL,
+            session_uuid VARCHAR(36)
+        ) ON COMMIT DELETE ROWS
     """)
+    cur.execute("TRUNCATE stage_fact_active")
+    staged = copy_rows(cur, "stage_fact_active",
+                       ("server_id", "player_id", "map_id", "score", "duration", "session_uuid"), rows)
+    if not staged:
+        return []
+    ended = []
+    if prune_limit is not None:
+        cur.execute("""
+            DELETE FROM fact_active a
+            USING stage_fact_active s
+            WHERE a.server_id = s.server_id AND a.player_id = s.player_id AND a.last_seen < %s
+            RETURNING a.server_id, a.player_id, a.map_id, a.score, a.duration, a.first_seen, a.last_seen,
+                      a.session_uuid, a.calculated_duration
+        """, (prune_limit,))
+        ended = [(row['server_id'], row['player_id'], row['map_id'], row['score'], row['duration'],
+                  row['first_seen'], row['last_seen'], row['session_uuid'], row['calculated_duration'])
+                 for row in cur.fetchall()]
+    cur.execute("""
+        INSERT INTO fact_active (server_id, player_id, map_id, score, duration, calculated_duration, first_seen, last_seen, session_uuid)
+        SELECT server_id, player_id, map_id, score, duration, 0, %s, %s, session_uuid
+        FROM stage_fact_active
+        ON CONFLICT(server_id, player_id) DO UPDATE SET
+            score=excluded.score,
+            duration=excluded.duration,
+            calculated_duration=EXTRACT(EPOCH FROM (excluded.last_seen - fact_active.first_seen))::INTEGER,
+            map_id=excluded.map_id,
+            last_seen=excluded.last_seen,
+            session_uuid=excluded.session_uuid
+    """, (scan_time, scan_time))
+    return ended
 
-    # Map daily (stats) from fact_server_history
-    cur.execute("DELETE FROM fact_map_daily")
+# Downsampled tiers of fact_global_stats (migrations/V006): (table, bucket width, retention or None = forever).
+# Raw rows are kept for GLOBAL_STATS_RAW_RETENTION; each chart on /stats reads the coarsest tier it needs.
+GLOBAL_STATS_RAW_RETENTION = timedelta(hours=48)
+GLOBAL_STATS_TIERS = (
+    ("fact_global_stats_5m", timedelta(minutes=5), timedelta(days=30)),
+    ("fact_global_stats_hourly", timedelta(hours=1), None),
+    ("fact_global_stats_daily", timedelta(days=1), None),
+)
+
+def _bucket_start(value, width):
+    return datetime.min + (value - datetime.min) // width * width
+
+def record_global_stats(cur, scan_time, active_servers, active_players):
+    """
+    Store this scan's totals as a raw row, add them to every tier bucket with an upsert,
+    and trim the raw table and the bounded tiers to their retention windows.
+    """
     cur.execute("""
-        INSERT INTO fact_map_daily (day, map_id, session_count, total_seconds)
-        SELECT
-            date(f.session_start) AS day,
-            f.map_id,
-            COUNT(f.id) AS session_count,
-            COALESCE(SUM(f.calculated_duration), 0) AS total_seconds
-        FROM fact_server_history f
-        WHERE f.map_id IS NOT NULL
-        GROUP BY day, f.map_id
-    """)
+        INSERT INTO fact_global_stats (scan_time, active_servers, active_players)
+        VALUES (%s, %s, %s)
+    """, (scan_time, active_servers, active_players))
+    for table, width, retention in GLOBAL_STATS_TIERS:
+        cur.execute(f"""
+            INSERT INTO {table} (bucket, samples, sum_players, max_players, sum_servers, max_servers)
+            VALUES (%(bucket)s, 1, %(players)s, %(players)s, %(servers)s, %(servers)s)
+            ON CONFLICT (bucket) DO UPDATE SET
+                samples = {table}.samples + 1,
+                sum_players = {table}.sum_players + excluded.sum_players,
+                max_players = GREATEST({table}.max_players, excluded.max_players),
+                sum_servers = {table}.sum_servers + excluded.sum_servers,
+                max_servers = GREATEST({table}.max_servers, excluded.max_servers)
+        """, {"bucket": _bucket_start(scan_time, width), "players": active_players, "servers": active_servers})
+        if retention:
+            cur.execute(f"DELETE FROM {table} WHERE bucket < %s", (_bucket_start(scan_time - retention, width),))
+    cur.execute("DELETE FROM fact_global_stats WHERE scan_time < %s", (scan_time - GLOBAL_STATS_RAW_RETENTION,))
+
+def prune_active_sessions(db, cur, prune_limit, batch_size):
+    """
+    Move sessions not seen since prune_limit from fact_active to fact_history.
+    Each batch is one statement: the DELETE ... RETURNING feeds the INSERT, so the table is
+    read once and no row can change between being copied and being deleted. Batches of at
+    most batch_size rows (oldest first, via the last_seen index) are committed one by one,
+    together with their rollup deltas, so row locks and WAL are released per batch and a
+    committed batch is always counted in the rollups exactly once.
+    Must be called with no other uncommitted work on this thread's connection.
+    Returns the archived fact_history rows (id, server_id, player_id, map_id, session_start,
+    session_end, calculated_duration) for the downstream steps.
+    """
+    batch_size = max(1, int(batch_size))
+    moved = []
+    while True:
+        cur.execute("""
+            WITH expired AS (
+                SELECT server_id, player_id FROM fact_active
+                WHERE last_seen < %(limit)s
+                ORDER BY last_seen
+                LIMIT %(batch)s
+                FOR UPDATE
+            ),
+            moved AS (
+                DELETE FROM fact_active a
+                USING expired e
+                WHERE a.server_id = e.server_id AND a.player_id = e.player_id
+                RETURNING a.server_id, a.player_id, a.map_id, a.score, a.duration, a.first_seen, a.last_seen,
+                          a.session_uuid, a.calculated_duration
+            )
+            INSERT INTO fact_history (server_id, player_id, map_id, final_score, total_time, session_start, session_end, session_uuid, calculated_duration)
+            SELECT server_id, player_id, map_id, score, duration, first_seen, last_seen, session_uuid, calculated_duration
+            FROM moved
+            RETURNING id, server_id, player_id, map_id, session_start, session_end, calculated_duration
+        """, {"limit": prune_limit, "batch": batch_size})
+        rows = cur.fetchall()
+        if rows:
+            lock_rollups(cur)
+            apply_rollup_deltas(cur, [row['id'] for row in rows], [],
+                                min((row['session_start'] for row in rows if row['session_start']), default=None))
+        db.commit()
+        moved += rows
+        if len(rows) < batch_size:
+            return moved
 
-    # Server daily (stats) from fact_history
-    cur.execute("DELETE FROM fact_server_daily")
+def record_scan_stats(cur, scan_time, net_stats):
+    """Persist the query engine's per-scan network statistics."""
     cur.execute("""
-        INSERT INTO fact_server_daily (day, server_id, session_count, total_seconds)
-        SELECT
-            date(h.session_start) AS day,
-            h.server_id,
-            COUNT(h.id) AS session_count,
-            COALESCE(SUM(h.calculated_duration), 0) AS total_seconds
-        FROM fact_history h
-        WHERE h.server_id IS NOT NULL
-        GROUP BY day, h.server_id
-    """)
+        INSERT INTO fact_scan_stats (scan_time, targets, responded, packets_sent, replies, lost_packets, retries,
+                                     avg_rtt_ms, p50_rtt_ms, p95_rtt_ms, duration_ms, send_pps, reply_pps)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    """, (scan_time, net_stats['targets'], net_stats['responded'], net_stats['packets_sent'], net_stats['replies'],
+          net_stats['lost_packets'], net_stats['retries'], net_stats['avg_rtt_ms'], net_stats['p50_rtt_ms'],
+          net_stats['p95_rtt_ms'], net_stats['duration_ms'], net_stats['send_pps'], net_stats['reply_pps']))
+
+# Tables range-partitioned by month on session_start (migrations/V005)
+HISTORY_TABLES = ("fact_history", "fact_server_history")
 
-    # Player daily (stats) from fact_history
-    cur.execute("DELETE FROM fact_player_daily")
+def _month_start(value, offset=0):
+    """Midnight on the first day of the month `offset` months after value's month."""
+    index = value.year * 12 + value.month - 1 + offset
+    return datetime(index // 12, index % 12 + 1, 1)
+
+def partitioned_history_tables(cur):
     cur.execute("""
-        INSERT INTO fact_player_daily (day, player_id, session_count, total_seconds)
-        SELECT
-            date(h.session_start) AS day,
-            h.player_id,
-            COUNT(h.id) AS session_count,
-            COALESCE(SUM(h.calculated_duration), 0) AS total_seconds
-        FROM fact_history h
-        WHERE h.player_id IS NOT NULL
-        GROUP BY day, h.player_id
-    """)
+        SELECT c.relname FROM pg_partitioned_table p
+        JOIN pg_class c ON c.oid = p.partrelid
+        WHERE c.relname = ANY(%s) AND pg_table_is_visible(c.oid)
+    """, (list(HISTORY_TABLES),))
+    return [row['relname'] for row in cur.fetchall()]
 
-    # Daily traffic (unique players/day)
-    cur.execute("DELETE FROM fact_traffic_daily")
+def history_partition_bounds(cur):
+    """
+    Attached range partitions of the history tables as (partition, parent, lower, upper);
+    lower is None for MINVALUE (the legacy partition). The DEFAULT partition is left out.
+    """
     cur.execute("""
-        INSERT INTO fact_traffic_daily (day, unique_players)
-        SELECT
-            date(h.session_start) AS day,
-            COUNT(DISTINCT h.player_id) AS unique_players
-        FROM fact_history h
-        WHERE h.player_id IS NOT NULL
-        GROUP BY day
-    """)
+        SELECT c.relname AS partition, p.relname AS parent, pg_get_expr(c.relpartbound, c.oid) AS bound
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        WHERE p.relname = ANY(%s) AND pg_table_is_visible(p.oid)
+    """, (list(HISTORY_TABLES),))
+    bounds = []
+    for row in cur.fetchall():
+        # e.g. "FOR VALUES FROM ('2025-01-01 00:00:00') TO ('2025-02-01 00:00:00')"; DEFAULT has no bound
+        upper = re.search(r"TO \('([^']+)'\)", row['bound'])
+        if not upper:
+            continue
+        lower = re.search(r"FROM \('([^']+)'\)", row['bound'])
+        bounds.append((row['partition'], row['parent'],
+                       datetime.fromisoformat(lower.group(1)) if lower else None,
+                       datetime.fromisoformat(upper.group(1))))
+    return bounds
+
+def ensure_history_partitions(cur, scan_time, months_ahead):
+    """
+    Create the monthly partitions <table>_pYYYYMM from the current month through
+    months_ahead months ahead. No-op while the tables are not partitioned.
+    A month already covered by an attached range (the legacy partition during the
+    migration month) is skipped silently; one whose rows already landed in the default
+    partition is skipped with a warning and keeps being served by that partition.
+    Returns the names of the partitions created.
+    """
+    created = []
+    tables = partitioned_history_tables(cur)
+    if not tables:
+        return created
+    covered = {}
+    for _, parent, lower, upper in history_partition_bounds(cur):
+        covered.setdefault(parent, []).append((lower, upper))
+    for table in tables:
+        for offset in range(months_ahead + 1):
+            start = _month_start(scan_time, offset)
+            end = _month_start(scan_time, offset + 1)
+            if any((lower is None or lower < end) and start < upper for lower, upper in covered.get(table, ())):
+                continue
+            name = f"{table}_p{start:%Y%m}"
+            cur.execute("SELECT to_regclass(%s) IS NOT NULL AS present", (name,))
+            if cur.fetchone()['present']:
+                continue
+            cur.execute("SAVEPOINT history_partition")
+            try:
+                cur.execute(f"CREATE TABLE {name} PARTITION OF {table} FOR VALUES FROM (%s) TO (%s)",
+                            (start, end))
+                # No unique id key on the parent; rollup deltas look rows up by id per partition
+                cur.execute(f"CREATE INDEX IF NOT EXISTS {name}_id_idx ON {name} (id)")
+                cur.execute("RELEASE SAVEPOINT history_partition")
+                created.append(name)
+            except Exception as e:
+                cur.execute("ROLLBACK TO SAVEPOINT history_partition")
+                print(f"[WARN] Partition {name} not created: {str(e).strip()}")
+    return created
+
+def detach_old_history_partitions(cur, scan_time, keep_months):
+    """
+    Detach the partitions that end before the retention window (the current month and
+    the keep_months - 1 before it). Detached tables keep their rows and can be archived
+    or dropped by hand. Returns their names.
+    """
+    cutoff = _month_start(scan_time, 1 - keep_months)
+    detached = []
+    for partition, parent, _, upper in history_partition_bounds(cur):
+        if upper <= cutoff:
+            cur.execute(f"ALTER TABLE {parent} DETACH PARTITION {partition}")
+            detached.append(partition)
+    return detached
 
-    _kv_set(cur, "rollups_backfilled", "1")
+# Advisory lock serializing rollup writers: the collector (exclusive) vs. rebuild_rollups.py chunks (shared)
+ROLLUP_LOCK_KEY = 0x4B463252
 
-def refresh_recent_rollups(cur, scan_time, days_back=1):
+def lock_rollups(cur, shared=False):
+    """Take the rollup advisory lock until the end of the current transaction."""
+    if shared:
+        cur.execute("SELECT pg_advisory_xact_lock_shared(%s)", (ROLLUP_LOCK_KEY,))
+    else:
+        cur.execute("SELECT pg_advisory_xact_lock(%s)", (ROLLUP_LOCK_KEY,))
+
+def backfill_rollups(cur, exclude_ids=()):
     """
-    Recompute rollups for today and the previous day (default),
-    because new history rows only arrive for recent timestamps.
+    First-run check for the rollup tables.
+    An empty history needs no backfill: the incremental deltas build the rollups from here on.
+    Existing history is backfilled out of band by rebuild_rollups.py (chunked, parallel, resumable)
+    rather than inside the scan transaction. exclude_ids are this scan's own fact_history rows.
     """
-    # We refresh for [today - days_back, today]
-    # Example days_back=1 -> yesterday + today
-    start_day = (scan_time - timedelta(days=days_back)).strftime("%Y-%m-%d")
-    end_day = scan_time.strftime("%Y-%m-%d")
+    done = _kv_get(cur, "rollups_backfilled")
+    if done == "1":
+        return
+    cur.execute("SELECT EXISTS (SELECT 1 FROM fact_history WHERE NOT (id = ANY(%s))) AS has_history",
+                (list(exclude_ids),))
+    if not cur.fetchone()['has_history']:
+        _kv_set(cur, "rollups_backfilled", "1")
+        return
+    print("[WARN] Rollups are not backfilled for existing history. Run: python rebuild_rollups.py")
 
-    # Operator daily
-    cur.execute("DELETE FROM fact_operator_daily WHERE day BETWEEN %s AND %s", (start_day, end_day))
+def rebuild_operator_rollups(cur, operators):
+    """
+    Recompute fact_operator_daily over all history, but only for the given operators
+    (e.g. after their servers were reassigned by reclassify.py).
+    """
+    operators = [o for o in operators if o and o != 'Unknown']
+    if not operators:
+        return
+    lock_rollups(cur)
+    cur.execute("DELETE FROM fact_operator_daily WHERE operator_name = ANY(%s)", (operators,))
     cur.execute("""
         INSERT INTO fact_operator_daily (day, operator_name, server_count, unique_players, total_playtime_seconds, last_contact)
         SELECT
@@ -439,392 +548,802 @@ def refresh_recent_rollups(cur, scan_time, days_back=1):
             MAX(h.session_end) AS last_contact
         FROM fact_history h
         JOIN dim_servers s ON h.server_id = s.id
-        WHERE date(h.session_start) BETWEEN %s AND %s
-          AND s.operator_name IS NOT NULL
-          AND s.operator_name != 'Unknown'
+        WHERE s.operator_name = ANY(%s)
         GROUP BY day, s.operator_name
-    """, (start_day, end_day))
+    """, (operators,))
 
-    # Map daily
-    cur.execute("DELETE FROM fact_map_daily WHERE day BETWEEN %s AND %s", (start_day, end_day))
-    cur.execute("""
-        INSERT INTO fact_map_daily (day, map_id, session_count, total_seconds)
-        SELECT
-            date(f.session_start) AS day,
-            f.map_id,
-            COUNT(f.id) AS session_count,
-            COALESCE(SUM(f.calculated_duration), 0) AS total_seconds
-        FROM fact_server_history f
-        WHERE date(f.session_start) BETWEEN %s AND %s
-          AND f.map_id IS NOT NULL
-        GROUP BY day, f.map_id
-    """, (start_day, end_day))
-
-    # Server daily
-    cur.execute("DELETE FROM fact_server_daily WHERE day BETWEEN %s AND %s", (start_day, end_day))
-    cur.execute("""
-        INSERT INTO fact_server_daily (day, server_id, session_count, total_seconds)
-        SELECT
-            date(h.session_start) AS day,
-            h.server_id,
-            COUNT(h.id) AS session_count,
-            COALESCE(SUM(h.calculated_duration), 0) AS total_seconds
-        FROM fact_history h
-        WHERE date(h.session_start) BETWEEN %s AND %s
-          AND h.server_id IS NOT NULL
-        GROUP BY day, h.server_id
-    """, (start_day, end_day))
+# Rollup definitions shared by the windowed rebuild and the reconciliation check.
+# Sources filter on a half-open session_start range so the session_start indexes apply.
+ROLLUP_SPECS = (
+    {
+        "table": "fact_operator_daily",
+        "keys": ("day", "operator_name"),
+        "values": ("server_count", "unique_players", "total_playtime_seconds", "last_contact"),
+        "source": """
+            SELECT
+                date(h.session_start) AS day,
+                s.operator_name,
+                COUNT(DISTINCT h.server_id) AS server_count,
+                COUNT(DISTINCT h.player_id) AS unique_players,
+                COALESCE(SUM(h.calculated_duration), 0) AS total_playtime_seconds,
+                MAX(h.session_end) AS last_contact
+            FROM fact_history h
+            JOIN dim_servers s ON h.server_id = s.id
+            WHERE h.session_start >= %(start)s AND h.session_start < %(end)s
+              AND s.operator_name IS NOT NULL
+              AND s.operator_name != 'Unknown'
+            GROUP BY day, s.operator_name
+        """,
+    },
+    {
+        "table": "fact_map_daily",
+        "keys": ("day", "map_id"),
+        "values": ("session_count", "total_seconds"),
+        "source": """
+            SELECT
+                date(f.session_start) AS day,
+                f.map_id,
+                COUNT(f.id) AS session_count,
+                COALESCE(SUM(f.calculated_duration), 0) AS total_seconds
+            FROM fact_server_history f
+            WHERE f.session_start >= %(start)s AND f.session_start < %(end)s
+              AND f.map_id IS NOT NULL
+            GROUP BY day, f.map_id
+        """,
+    },
+    {
+        "table": "fact_server_daily",
+        "keys": ("day", "server_id"),
+        "values": ("session_count", "total_seconds"),
+        "source": """
+            SELECT
+                date(h.session_start) AS day,
+                h.server_id,
+                COUNT(h.id) AS session_count,
+                COALESCE(SUM(h.calculated_duration), 0) AS total_seconds
+            FROM fact_history h
+            WHERE h.session_start >= %(start)s AND h.session_start < %(end)s
+              AND h.server_id IS NOT NULL
+            GROUP BY day, h.server_id
+        """,
+    },
+    {
+        "table": "fact_player_daily",
+        "keys": ("day", "player_id"),
+        "values": ("session_count", "total_seconds"),
+        "source": """
+            SELECT
+                date(h.session_start) AS day,
+                h.player_id,
+                COUNT(h.id) AS session_count,
+                COALESCE(SUM(h.calculated_duration), 0) AS total_seconds
+            FROM fact_history h
+            WHERE h.session_start >= %(start)s AND h.session_start < %(end)s
+              AND h.player_id IS NOT NULL
+            GROUP BY day, h.player_id
+        """,
+    },
+    {
+        "table": "fact_traffic_daily",
+        "keys": ("day",),
+        "values": ("unique_players",),
+        "source": """
+            SELECT
+                date(h.session_start) AS day,
+                COUNT(DISTINCT h.player_id) AS unique_players
+            FROM fact_history h
+            WHERE h.session_start >= %(start)s AND h.session_start < %(end)s
+              AND h.player_id IS NOT NULL
+            GROUP BY day
+        """,
+    },
+)
 
-    # Player daily
-    cur.execute("DELETE FROM fact_player_daily WHERE day BETWEEN %s AND %s", (start_day, end_day))
-    cur.execute("""
-        INSERT INTO fact_player_daily (day, player_id, session_count, total_seconds)
-        SELECT
-            date(h.session_start) AS day,
-            h.player_id,
-            COUNT(h.id) AS session_count,
-            COALESCE(SUM(h.calculated_duration), 0) AS total_seconds
-        FROM fact_history h
-        WHERE date(h.session_start) BETWEEN %s AND %s
-          AND h.player_id IS NOT NULL
-        GROUP BY day, h.player_id
-    """, (start_day, end_day))
+def _rollup_window(scan_time, days_back):
+    """[start, end) covering the days from scan_time - days_back through scan_time."""
+    start = (scan_time - timedelta(days=days_back)).date()
+    end = scan_time.date() + timedelta(days=1)
+    return start, end
 
-    # Daily traffic
-    cur.execute("DELETE FROM fact_traffic_daily WHERE day BETWEEN %s AND %s", (start_day, end_day))
-    cur.execute("""
-        INSERT INTO fact_traffic_daily (day, unique_players)
-        SELECT
-            date(h.session_start) AS day,
-            COUNT(DISTINCT h.player_id) AS unique_players
-        FROM fact_history h
-        WHERE date(h.session_start) BETWEEN %s AND %s
-          AND h.player_id IS NOT NULL
-        GROUP BY day
-    """, (start_day, end_day))
+def rebuild_rollup_window(cur, spec, start, end):
+    """Delete and re-aggregate one rollup table for days in [start, end)."""
+    columns = ", ".join(spec["keys"] + spec["values"])
+    cur.execute(f"DELETE FROM {spec['table']} WHERE day >= %(start)s AND day < %(end)s", {"start": start, "end": end})
+    cur.execute(f"INSERT INTO {spec['table']} ({columns}) {spec['source']}", {"start": start, "end": end})
 
+def count_rollup_drift(cur, spec, start, end):
+    """Number of rollup rows in [start, end) that differ from a fresh aggregate of the source."""
+    keys = ", ".join(spec["keys"])
+    differs = " OR ".join(f"src.{v} IS DISTINCT FROM dst.{v}" for v in spec["values"])
+    cur.execute(f"""
+        SELECT COUNT(*) AS drift
+        FROM ({spec['source']}) src
+        FULL JOIN (SELECT * FROM {spec['table']} WHERE day >= %(start)s AND day < %(end)s) dst USING ({keys})
+        WHERE {differs}
+    """, {"start": start, "end": end})
+    return cur.fetchone()['drift']
 
-def main():
+def reconcile_rollups(cur, scan_time, days_back=1):
+    """
+    Verify the incrementally maintained rollups against fact_history / fact_server_history
+    for the recent window and rebuild any table that drifted.
+    Returns {table: drifted_rows} for the tables that were rebuilt.
+    """
+    start, end = _rollup_window(scan_time, days_back)
+    repaired = {}
+    for spec in ROLLUP_SPECS:
+        drift = count_rollup_drift(cur, spec, start, end)
+        if drift:
+            rebuild_rollup_window(cur, spec, start, end)
+            repaired[spec["table"]] = drift
+    _kv_set(cur, "rollups_reconciled_at", scan_time.strftime('%Y-%m-%d %H:%M:%S'))
+    return repaired
+
+def reconcile_due(cur, scan_time):
+    last = _kv_get(cur, "rollups_reconciled_at")
+    if not last:
+        return True
+    return (scan_time - datetime.strptime(last, '%Y-%m-%d %H:%M:%S')).total_seconds() >= ROLLUP_RECONCILE_INTERVAL
+
+def apply_rollup_deltas(cur, history_ids, server_history_ids, history_since=None, server_history_since=None):
+    """
+    Add the sessions inserted into fact_history / fact_server_history during this scan
+    to the daily rollups with upserts, instead of re-aggregating whole days.
+    history_since / server_history_since are the earliest session_start among the new rows;
+    the id lookups are bounded by them so only the recent monthly partitions are scanned.
+
+    Sums and counts are plain additions. Distinct counts (servers / players per operator-day,
+    players per day) only count a new row if no earlier fact_history row already covered that
+    server or player on the same day, checked through the (server_id|player_id, session_start) indexes.
+    """
+    if history_ids:
+        params = {"ids": list(history_ids), "since": history_since or datetime.min}
+
+        for table, key in (("fact_server_daily", "server_id"), ("fact_player_daily", "player_id")):
+            cur.execute(f"""
+                INSERT INTO {table} (day, {key}, session_count, total_seconds)
+                SELECT date(session_start), {key}, COUNT(*), COALESCE(SUM(calculated_duration), 0)
+                FROM fact_history
+                WHERE id = ANY(%(ids)s) AND session_start >= %(since)s AND {key} IS NOT NULL
+                GROUP BY 1, 2
+                ON CONFLICT (day, {key}) DO UPDATE SET
+                    session_count = {table}.session_count + excluded.session_count,
+                    total_seconds = {table}.total_seconds + excluded.total_seconds
+            """, params)
+
+        cur.execute("""
+            INSERT INTO fact_traffic_daily (day, unique_players)
+            SELECT day, COUNT(*)
+            FROM (
+                SELECT DISTINCT date(n.session_start) AS day, n.player_id
+                FROM fact_history n
+                WHERE n.id = ANY(%(ids)s) AND n.session_start >= %(since)s AND n.player_id IS NOT NULL
+                  AND NOT EXISTS (
+                      SELECT 1 FROM fact_history h
+                      WHERE h.player_id = n.player_id
+                        AND h.session_start >= date(n.session_start)
+                        AND h.session_start < date(n.session_start) + 1
+                        AND NOT (h.id = ANY(%(ids)s))
+                  )
+            ) first_seen
+            GROUP BY day
+            ON CONFLICT (day) DO UPDATE SET
+                unique_players = fact_traffic_daily.unique_players + excluded.unique_players
+        """, params)
+
+        cur.execute("""
+            WITH n AS (
+                SELECT h.server_id, h.player_id, h.session_end, h.calculated_duration,
+                       date(h.session_start) AS day, s.operator_name
+                FROM fact_history h
+                JOIN dim_servers s ON h.server_id = s.id
+                WHERE h.id = ANY(%(ids)s) AND h.session_start >= %(since)s
+                  AND s.operator_name IS NOT NULL
+                  AND s.operator_name != 'Unknown'
+            ),
+            new_servers AS (
+                SELECT day, operator_name, COUNT(DISTINCT server_id) AS servers
+                FROM n
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM fact_history h
+                    WHERE h.server_id = n.server_id
+                      AND h.session_start >= n.day AND h.session_start < n.day + 1
+                      AND NOT (h.id = ANY(%(ids)s))
+                )
+                GROUP BY day, operator_name
+            ),
+            new_players AS (
+                SELECT day, operator_name, COUNT(DISTINCT player_id) AS players
+                FROM n
+                WHERE player_id IS NOT NULL AND NOT EXISTS (
+                    SELECT 1 FROM fact_history h
+                    JOIN dim_servers s ON h.server_id = s.id
+                    WHERE h.player_id = n.player_id
+                      AND h.session_start >= n.day AND h.session_start < n.day + 1
+                      AND s.operator_name = n.operator_name
+                      AND NOT (h.id = ANY(%(ids)s))
+                )
+                GROUP BY day, operator_name
+            ),
+            totals AS (
+                SELECT day, operator_name, COALESCE(SUM(calculated_duration), 0) AS seconds, MAX(session_end) AS last_contact
+                FROM n
+                GROUP BY day, operator_name
+            )
+            INSERT INTO fact_operator_daily (day, operator_name, server_count, unique_players, total_playtime_seconds, last_contact)
+            SELECT t.day, t.operator_name, COALESCE(ns.servers, 0), COALESCE(np.players, 0), t.seconds, t.last_contact
+            FROM totals t
+            LEFT JOIN new_servers ns USING (day, operator_name)
+            LEFT JOIN new_players np USING (day, operator_name)
+            ON CONFLICT (day, operator_name) DO UPDATE SET
+                server_count = fact_operator_daily.server_count + excluded.server_count,
+                unique_players = fact_operator_daily.unique_players + excluded.unique_players,
+                total_playtime_seconds = fact_operator_daily.total_playtime_seconds + excluded.total_playtime_seconds,
+                last_contact = GREATEST(fact_operator_daily.last_contact, excluded.last_contact)
+        """, params)
+
+    if server_history_ids:
+        cur.execute("""
+            INSERT INTO fact_map_daily (day, map_id, session_count, total_seconds)
+            SELECT date(session_start), map_id, COUNT(*), COALESCE(SUM(calculated_duration), 0)
+            FROM fact_server_history
+            WHERE id = ANY(%(ids)s) AND session_start >= %(since)s AND map_id IS NOT NULL
+            GROUP BY 1, 2
+            ON CONFLICT (day, map_id) DO UPDATE SET
+                session_count = fact_map_daily.session_count + excluded.session_count,
+                total_seconds = fact_map_daily.total_seconds + excluded.total_seconds
+        """, {"ids": list(server_history_ids), "since": server_history_since or datetime.min})
+
+
+SERVER_CACHE_COLUMNS = "id, ip_address, query_port, game_port, current_map_id, map_start, player_count, last_seen, name, current_session_uuid, operator_name, location"
+
+# --- GENERIC NAME BLACKLIST ---
+# These names are too common. Never merge them.
+GENERIC_NAMES = frozenset({
+    "killing floor 2 server", "kf2 server", "kf2", "killing floor 2",
+    "server", "dedicated server", "public server", "survival",
+    "endless", "hard", "suicidal", "hoe", "hell on earth",
+    "gameservers.com", "linuxgsm", "nitrado.net",
+    "kf2 server endless", "kf2 server hard and long",
+    "kf2 server long and hard", "kf2 server the zone",
+    "kf2 server very hard and long", "mgga make gaming great again"
+})
+
+def is_generic_name(server_name):
+    # Also blacklist purely numeric names or very short names
+    return len(server_name) < 4 or server_name.isdigit() or server_name.lower().strip() in GENERIC_NAMES
+
+def build_name_index(server_cache):
+    """
+    name -> ["ip:query_port", ...] over server_cache, built once per cycle for moved-server
+    recovery. Generic names are left out since they are never merged.
+    """
+    index = {}
+    for cache_key, sdata in server_cache.items():
+        name = sdata['name']
+        if name and not is_generic_name(name):
+            index.setdefault(name, []).append(cache_key)
+    return index
+
+def recover_moved_server(cur, server_name, current_ip, current_qport, server_cache, live_keys, name_index):
+    """
+    Dynamic IP recovery: adopt an existing dim_servers row with the same (non-generic) name.
+    Only a single candidate that is not itself answering in this scan is treated as moved.
+    Candidates come from name_index (see build_name_index), not from a scan of dim_servers.
+    Returns True when the row was migrated to the new address (and re-keyed in server_cache / name_index).
+    """
+    if is_generic_name(server_name):
+        return False
+
+    candidates = [key for key in name_index.get(server_name, ()) if key not in live_keys and key in server_cache]
+    if len(candidates) != 1:
+        return False
+
+    # Found exactly one match. Assume it moved.
+    old_key = candidates[0]
+    sdata = server_cache[old_key]
+    old_ip = old_key.rsplit(':', 1)[0]
+    new_key = f"{current_ip}:{current_qport}"
+    print(f"[!] Dynamic IP: {server_name} moved from {old_ip} to {current_ip}")
+    cur.execute("SAVEPOINT server_move")
+    try:
+        # Migrate record to new IP
+        cur.execute("UPDATE dim_servers SET ip_address=%s, query_port=%s WHERE id=%s", (current_ip, current_qport, sdata['id']))
+        cur.execute("RELEASE SAVEPOINT server_move")
+    except Exception as e:
+        # Collision (Rare): Just make a new ID
+        print(f"[!] Collision during IP migration: {e}")
+        cur.execute("ROLLBACK TO SAVEPOINT server_move")
+        return False
+
+    server_cache[new_key] = server_cache.pop(old_key)
+    keys = name_index[server_name]
+    keys[keys.index(old_key)] = new_key
+    return True
+
+def _server_cache_entry(row):
+    return {
+        'id': row['id'], 
+        'game_port': row['game_port'],
+        'map_id': row['current_map_id'], 
+        'map_start': parse_iso_time(row['map_start']), 
+        'count': row['player_count'], 
+        'last_seen': row['last_seen'],
+        'name': row['name'],
+        'session_uuid': row['current_session_uuid'],
+        'operator_name': row['operator_name'],
+        'location': row['location']
+    }
+
+class CollectorState:
+    """
+    Caches carried from one scan cycle to the next.
+    A fresh instance reproduces a one-shot run (everything loaded from the DB);
+    the daemon keeps one instance warm and only pulls rows added since the last cycle.
+    """
+    def __init__(self):
+        self.map_cache = {}
+        self.player_cache = {}
+        # New Cache Key Format: "IP:QueryPort"
+        self.server_cache = {}
+        self.public_ip = None
+        # Public "ip:port" -> LOCAL_LOOPBACK_IP target, built for loopback_ip
+        self.loopback_targets = {}
+        self.loopback_ip = None
+        # GeoIP index and the version it was loaded from (binary file identity or the
+        # geoip_version that import_geoip.py bumps in meta_kv), reloaded when either changes
+        self.geoip = None
+        self.geoip_version = None
+        # Month (YYYYMM) whose history partitions were last checked
+        self.partition_month = None
+        self.loaded = False
+        self.max_map_id = 0
+        self.max_player_id = 0
+        self.cycles = 0
+        self.last_timings = {}
+
+    def invalidate(self):
+        """Force a full reload next cycle (e.g. after a rolled back transaction)."""
+        self.loaded = False
+
+    def refresh(self, cur):
+        if not self.loaded:
+            self.map_cache.clear()
+            self.player_cache.clear()
+            self.server_cache.clear()
+            self.max_map_id = 0
+            self.max_player_id = 0
+
+            cur.execute(f"SELECT {SERVER_CACHE_COLUMNS} FROM dim_servers")
+            for row in cur.fetchall():
+                cache_key = f"{row['ip_address']}:{row['query_port']}" # IP:QueryPort
+                self.server_cache[cache_key] = _server_cache_entry(row)
+
+        # Incremental: ids are SERIAL, so anything newer than the watermark is unseen
+        cur.execute("SELECT id, name FROM dim_maps WHERE id > %s", (self.max_map_id,))
+        for row in cur.fetchall():
+            self.map_cache[row['name']] = row['id']
+            self.max_map_id = max(self.max_map_id, row['id'])
+
+        cur.execute("SELECT id, name FROM dim_players WHERE id > %s", (self.max_player_id,))
+        for row in cur.fetchall():
+            self.player_cache[row['name']] = row['id']
+            self.max_player_id = max(self.max_player_id, row['id'])
+
+        self.loaded = True
+
+def main(state=None):
+    """Run one scan cycle. Pass a CollectorState to reuse caches across cycles."""
+    if state is None:
+        state = CollectorState()
+    state.cycles += 1
+    timings = {}
     start_time = time.time()
+    phase_start = time.perf_counter()
     scan_time = datetime.utcnow()
     print(f"--- [ SCAN STARTED: {scan_time.strftime('%H:%M:%S')} ] ---")
 
     public_ip = get_public_ip()
-    if public_ip:
-        print(f"[*] Identity Confirmed: {public_ip}")
+    if public_ip != state.public_ip:
+        state.public_ip = public_ip
+        if public_ip:
+            print(f"[*] Identity Confirmed: {public_ip}")
 
     try:
-        r = requests.get(API_URL, timeout=10)
-        addrs = [s['addr'] for s in r.json().get("response", {}).get("servers", [])]
-        print(f"[*] Targets Acquired: {len(addrs)}")
-    except Exception as e:
+        master = get_master_list().refresh()
+    except MasterListUnavailable as e:
         print(f"[!] Steam API Error: {e}")
         return
+    addrs = master['addrs']
+    if master['source'] == 'cache':
+        print(f"[WARN] Steam API Error: {master['error']} | using cached master list ({master['age']:.0f}s old)")
+    print(f"[*] Targets Acquired: {len(addrs)} (+{len(master['added'])} / -{len(master['removed'])})")
+    timings['master_list'] = time.perf_counter() - phase_start
+    phase_start = time.perf_counter()
 
-    valid_results = []
-    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        futures = {}
-        for public_addr in addrs:
-            target_ip_port = public_addr
-            if public_ip and public_addr.startswith(public_ip):
-                try:
-                    _, port = public_addr.split(':')
-                    target_ip_port = f"{LOCAL_LOOPBACK_IP}:{port}"
-                except: pass
-
-            future = executor.submit(query_server, target_ip_port)
-            futures[future] = public_addr
-
-        for f in concurrent.futures.as_completed(futures):
-            original_public_addr = futures[f] # <--- This is the Real Public IP
-            try:
-                res = f.result()
-                if res:
-                    # FIX: The query used 127.0.0.1, but the Database needs the Public IP.
-                    # We overwrite the 'addr' field in the result with the original target.
-                    res['addr'] = original_public_addr 
-                    
-                    valid_results.append(res)
-            except: pass
-    
-    print(f"[*] Processing {len(valid_results)} responses...")
+    # --- TIERED SCHEDULING ---
+    # Only probe servers that are due; skipped servers keep their last known state.
+    scheduler = get_scheduler() if TIERED_SCAN else None
+    if scheduler:
+        # A freshly seeded scheduler holds every server in dim_servers, so compare it with
+        # the full list once; after that only the servers that left the list are dropped.
+        seeded_now = not scheduler.seeded
+        if seeded_now:
+            seed_scheduler(scheduler, scan_time)
+        due_addrs, skipped_addrs = scheduler.split(
+            addrs, scan_time, removed=None if seeded_now or master['initial'] else master['removed'])
+        print(f"[*] Scheduled: {len(due_addrs)} due, {len(skipped_addrs)} skipped | tiers {scheduler.tier_counts()}")
+    else:
+        due_addrs, skipped_addrs = addrs, []
 
-    # --- CALC TOTALS ---
-    total_active_servers = len(valid_results)
-    total_active_players = sum(s["header_count"] for s in valid_results)
-    # -------------------
+    # Map query target -> public address (locally hosted servers are probed via loopback)
+    update_loopback_targets(state, public_ip, master)
+    loopback = state.loopback_targets
+    if loopback:
+        targets = {loopback.get(addr, addr): addr for addr in due_addrs}
+    else:
+        targets = {addr: addr for addr in due_addrs}
 
     # 使用数据库抽象层
     db = get_database()
-    
-    # Check if ip_ranges table exists for GeoIP functionality
-    has_geoip = False
-    try:
-        with db.cursor() as cur:
-            cur.execute("""
-                SELECT EXISTS (
-                    SELECT FROM information_schema.tables 
-                    WHERE table_name = 'ip_ranges'
-                ) as table_exists
-            """)
-            row = cur.fetchone()
-            has_geoip = row['table_exists'] if row else False
-        db.commit()
-    except Exception:
-        pass
-    
-    if not has_geoip:
-        print("[WARN] ip_ranges table not found. GeoIP location will be set to 'Unknown'")
-    
+
+    # GeoIP: prefer the shared memory-mapped index file, fall back to the ip_ranges table
+    refresh_geoip(state, db)
+
+    # Monthly history partitions: created ahead of time (and expired ones detached) once per
+    # month in their own short transaction, since DDL on the parent blocks readers briefly
+    partition_month = scan_time.strftime('%Y%m')
+    if state.partition_month != partition_month:
+        try:
+            with db.cursor() as cur:
+                created = ensure_history_partitions(cur, scan_time, HISTORY_PARTITION_MONTHS_AHEAD)
+                detached = (detach_old_history_partitions(cur, scan_time, HISTORY_RETENTION_MONTHS)
+                            if HISTORY_RETENTION_MONTHS > 0 else [])
+            db.commit()
+            state.partition_month = partition_month
+            if created or detached:
+                print(f"[*] History partitions: created {created or 'none'}, detached {detached or 'none'}")
+        except Exception as e:
+            db.rollback()
+            print(f"[WARN] History partition maintenance failed: {e}")
+
+    # --- STREAMING PIPELINE ---
+    # The probe runs in a background thread and hands every reply over through a bounded queue.
+    # This thread writes the replies in micro-batches while probing continues, then runs the
+    # scan-global steps (pruning, dead-server cleanup, rollups) once the stream has ended.
+    engine = get_query_engine()
+    stream = ResultStream(PIPELINE_QUEUE_SIZE)
+    network = {}
+
+    def probe(stream):
+        async def on_result(target, res):
+            # FIX: The query used 127.0.0.1, but the Database needs the Public IP.
+            # We overwrite the 'addr' field in the result with the original target.
+            res['addr'] = targets[target]
+            await stream.put(res)
+
+        engine.run(list(targets), on_result)
+        network['elapsed'] = time.perf_counter() - phase_start
+
+    phase_start = time.perf_counter()
+    producer = start_producer(stream, probe)
+    writer = None
+
     try:
         with db.cursor() as cur:
-            cur.execute("SELECT id, name FROM dim_maps")
-            map_cache = {row['name']: row['id'] for row in cur.fetchall()}
-            
-            cur.execute("SELECT id, name FROM dim_players")
-            player_cache = {row['name']: row['id'] for row in cur.fetchall()}
-        
-            server_cache = {}
-            # New Cache Key Format: "IP:QueryPort"
-            # FIX: Loop is correctly indented
-            cur.execute("SELECT id, ip_address, query_port, game_port, current_map_id, map_start, player_count, last_seen, name, current_session_uuid, operator_name FROM dim_servers")
-            for row in cur.fetchall():
-                cache_key = f"{row['ip_address']}:{row['query_port']}" # IP:QueryPort
-                server_cache[cache_key] = {
-                    'id': row['id'], 
-                    'game_port': row['game_port'],
-                    'map_id': row['current_map_id'], 
-                    'map_start': parse_iso_time(row['map_start']), 
-                    'count': row['player_count'], 
-                    'last_seen': row['last_seen'],
-                    'name': row['name'],
-                    'session_uuid': row['current_session_uuid'],
-                    'operator_name': row['operator_name']
-                }
-
-            def get_map_id(m_name):
-                if m_name in map_cache: return map_cache[m_name]
-                # PostgreSQL: INSERT ... ON CONFLICT DO NOTHING
-                cur.execute("INSERT INTO dim_maps (name) VALUES (%s) ON CONFLICT (name) DO NOTHING", (m_name,))
-                cur.execute("SELECT id FROM dim_maps WHERE name = %s", (m_name,))
-                mid = cur.fetchone()['id']
-                map_cache[m_name] = mid
-                return mid
-
-            def get_player_id(p_name):
-                if p_name in player_cache: return player_cache[p_name]
-                # PostgreSQL: INSERT ... ON CONFLICT DO NOTHING
-                cur.execute("INSERT INTO dim_players (name) VALUES (%s) ON CONFLICT (name) DO NOTHING", (p_name,))
-                cur.execute("SELECT id FROM dim_players WHERE name = %s", (p_name,))
-                pid = cur.fetchone()['id']
-                player_cache[p_name] = pid
-                return pid
+            state.refresh(cur)
+            geoip = state.geoip
+            map_cache = state.map_cache
+            player_cache = state.player_cache
+            server_cache = state.server_cache
+            timings['db_load'] = time.perf_counter() - phase_start
 
             prune_limit = (scan_time - timedelta(minutes=PRUNE_THRESHOLD)).strftime('%Y-%m-%d %H:%M:%S')
-            
-            # --- [PRUNING UPDATE] Transfer calculated_duration from fact_active to fact_history ---
-            cur.execute("""
-                INSERT INTO fact_history (server_id, player_id, map_id, final_score, total_time, session_start, session_end, session_uuid, calculated_duration)
-                SELECT server_id, player_id, map_id, score, duration, first_seen, last_seen, session_uuid, calculated_duration
-                FROM fact_active
-                WHERE last_seen < %s
-            """, (prune_limit,))
-            
-            cur.execute("DELETE FROM fact_active WHERE last_seen < %s", (prune_limit,))
-        
-            for s in valid_results:
-                current_ip = s["addr"].split(':')[0]
-                current_qport = s["query_port"]
-                cache_key = f"{current_ip}:{current_qport}"
-                
-                map_id = get_map_id(s["map"])
-                
-                # --- CALCULATE OPERATOR ---
-                operator_name = clean_server_name(s["name"], current_ip)
-
-                # --- GET LOCATION FROM DB ---
-                # Use the helper to resolve against ip_ranges
-                location_val = resolve_geo_db(cur, current_ip, has_geoip)
-                
-                # --- ATOMIC UPSERT ---
-                # 1. Ensure server record exists (Using Identity: IP + QueryPort)
-                # Added operator_name and location to INSERT statement
-                # PostgreSQL: INSERT ... ON CONFLICT DO NOTHING
+
+            valid_results = []
+            counts = {'maps': 0, 'players': 0, 'servers': 0, 'new': 0, 'changed': 0, 'heartbeat': 0, 'batches': 0,
+                      'returned': 0}
+
+            def prepare(results):
+                """Resolve names and locations for a batch; returns (known servers, cache misses)."""
+                # Resolve all unseen map / player names before the per-server loop
+                counts['maps'] += resolve_dimension_ids(cur, "dim_maps", (s["map"] for s in results), map_cache)
+                counts['players'] += resolve_dimension_ids(
+                    cur, "dim_players", (name for s in results for name, _, _ in s["player_list"]), player_cache)
+
+                # --- 1. SERVER IDENTITY ---
+                prepared = []
+                for s in results:
+                    current_ip = s["addr"].split(':')[0]
+                    current_qport = s["query_port"]
+                    cache_key = f"{current_ip}:{current_qport}"
+
+                    map_id = map_cache[s["map"]]
+
+                    # --- CALCULATE OPERATOR ---
+                    operator_name = clean_server_name(s["name"], current_ip)
+
+                    # --- GET LOCATION ---
+                    # In-memory lookup against the ip_ranges index
+                    location_val = geoip.lookup(current_ip) if geoip else "Unknown"
+
+                    prepared.append((s, current_ip, current_qport, cache_key, map_id, operator_name, location_val))
+
+                misses = [item for item in prepared if item[3] not in server_cache]
+                if misses:
+                    # Cache miss (New IP or Cold Start).
+                    # 1. Try DB lookup by IP (one query for all misses)
+                    load_servers_by_address(misses)
+                return ([item for item in prepared if item[3] in server_cache],
+                        [item for item in prepared if item[3] not in server_cache])
+
+            def load_servers_by_address(items):
+                cur.execute(f"""
+                    SELECT {SERVER_CACHE_COLUMNS} FROM dim_servers
+                    WHERE (ip_address, query_port) IN (SELECT * FROM unnest(%s::text[], %s::int[]))
+                """, ([item[1] for item in items], [item[2] for item in items]))
+                for row in cur.fetchall():
+                    server_cache[f"{row['ip_address']}:{row['query_port']}"] = _server_cache_entry(row)
+
+            def create_servers(misses, live_keys):
+                """Moved and truly new servers; needs every address answering in this scan."""
+                new_servers = []
+                # 2. Try lookup by Exact Name (Dynamic IP Recovery), against an index built once per cycle
+                name_index = build_name_index(server_cache)
+                for item in misses:
+                    s, current_ip, current_qport, cache_key = item[:4]
+                    if cache_key in server_cache:
+                        continue
+                    if not recover_moved_server(cur, s["name"], current_ip, current_qport, server_cache, live_keys, name_index):
+                        new_servers.append(item)
+
+                if new_servers:
+                    # 3. Truly New Servers. Create IDs in bulk; the inserted row already holds the current state.
+                    inserted = execute_values(cur, f"""
+                        INSERT INTO dim_servers (ip_address, query_port, game_port, name, current_map_id, player_count, last_seen, map_start, current_session_uuid, operator_name, location)
+                        VALUES %s
+                        ON CONFLICT (ip_address, query_port) DO NOTHING
+                        RETURNING {SERVER_CACHE_COLUMNS}
+                    """, [(current_ip, current_qport, s["game_port"], s["name"], map_id, s["header_count"], scan_time, scan_time,
+                           str(uuid.uuid4()), operator_name, location_val)
+                          for s, current_ip, current_qport, _, map_id, operator_name, location_val in new_servers],
+                        fetch=True)
+                    for row in inserted:
+                        server_cache[f"{row['ip_address']}:{row['query_port']}"] = _server_cache_entry(row)
+                    # ON CONFLICT skipped rows (created concurrently elsewhere): read them back
+                    conflicted = [item for item in new_servers if item[3] not in server_cache]
+                    if conflicted:
+                        load_servers_by_address(conflicted)
+                counts['new'] += len(new_servers)
+
+            def write_servers(cur, prepared):
+                """
+                Server state and fact_active for one shard's part of a batch, plus the map history
+                and the stale sessions of returning players it ended (archived by finish_servers).
+                Runs on the shard's own connection;
+                rows are written in server_id / player_id order so that lock acquisition order is deterministic.
+                """
+                prepared = sorted(prepared, key=lambda item: server_cache[item[3]]['id'])
+                result = {'servers': len(prepared), 'history_rows': [], 'ended_sessions': []}
+                # Previous scan's aggregate score per server, for restart detection. Rows older than
+                # prune_limit are stale sessions that did not belong to the previous scan.
                 cur.execute("""
-                    INSERT INTO dim_servers (ip_address, query_port, game_port, name, current_map_id, last_seen, map_start, current_session_uuid, operator_name, location) 
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    ON CONFLICT (ip_address, query_port) DO NOTHING
-                """, (current_ip, current_qport, s["game_port"], s["name"], map_id, scan_time, scan_time, str(uuid.uuid4()), operator_name, location_val))
-            
-                # 2. Retrieve authoritative ID from DB (or Cache if confident)
-                if cache_key in server_cache:
+                    SELECT server_id, SUM(score) AS total FROM fact_active
+                    WHERE server_id = ANY(%s) AND last_seen >= %s
+                    GROUP BY server_id
+                """, ([server_cache[item[3]]['id'] for item in prepared], prune_limit))
+                prev_scores = {row['server_id']: row['total'] for row in cur.fetchall()}
+
+                # --- 2. SERVER STATE ---
+                # (server_id, player_id) -> staged fact_active row; duplicate names on a server keep the last one
+                active_rows = {}
+                history_rows = []
+                state_updates = []
+                heartbeat_ids = []
+                for s, current_ip, current_qport, cache_key, map_id, operator_name, location_val in prepared:
                     sdata = server_cache[cache_key]
                     sid = sdata['id']
                     db_game_port = sdata['game_port']
                     db_map_id = sdata['map_id']
                     db_map_start = sdata['map_start']
                     db_session_uuid = sdata['session_uuid']
-                else:
-                    # Cache miss (New IP or Cold Start). 
-                    # 1. Try DB lookup by IP
-                    cur.execute("SELECT id, game_port, current_session_uuid, current_map_id, map_start FROM dim_servers WHERE ip_address=%s AND query_port=%s", (current_ip, current_qport))
-                    row = cur.fetchone()
-                    
-                    if row:
-                        sid = row['id']
-                        db_game_port = row['game_port']
-                        db_session_uuid = row['current_session_uuid']
-                        db_map_id = row['current_map_id']
-                        db_map_start = parse_iso_time(row['map_start'])
-                    else:
-                        # 2. Try DB lookup by Exact Name (Dynamic IP Recovery)
-                        
-                        # --- GENERIC NAME BLACKLIST ---
-                        # These names are too common. Never merge them.
-                        GENERIC_NAMES = {
-                            "killing floor 2 server", "kf2 server", "kf2", "killing floor 2", 
-                            "server", "dedicated server", "public server", "survival", 
-                            "endless", "hard", "suicidal", "hoe", "hell on earth",
-                            "gameservers.com", "linuxgsm", "nitrado.net", 
-                            "kf2 server endless", "kf2 server hard and long",
-                            "kf2 server long and hard", "kf2 server the zone",
-                            "kf2 server very hard and long", "mgga make gaming great again"
-                        }
-                        
-                        is_generic = s["name"].lower().strip() in GENERIC_NAMES
-                        
-                        # Also blacklist purely numeric names or very short names
-                        if len(s["name"]) < 4 or s["name"].isdigit():
-                            is_generic = True
-                        # ------------------------------
-
-                        candidates = []
-                        if not is_generic:
-                            cur.execute("SELECT id, game_port, current_session_uuid, current_map_id, map_start, ip_address FROM dim_servers WHERE name=%s", (s["name"],))
-                            candidates = cur.fetchall()
-                        
-                        if len(candidates) >= 1:
-                            # Found exactly one match. Assume it moved.
-                            row = candidates[0]
-                            sid = row['id']
-                            db_game_port = row['game_port']
-                            db_session_uuid = row['current_session_uuid']
-                            db_map_id = row['current_map_id']
-                            db_map_start = parse_iso_time(row['map_start'])
-                            old_ip = row['ip_address']
-                            
-                            print(f"[!] Dynamic IP: {s['name']} moved from {old_ip} to {current_ip}")
-                            try:
-                                # Migrate record to new IP
-                                cur.execute("UPDATE dim_servers SET ip_address=%s, query_port=%s WHERE id=%s", (current_ip, current_qport, sid))
-                            except Exception as e:
-                                # Collision (Rare): Just make a new ID
-                                print(f"[!] Collision during IP migration: {e}")
-                                sid = None
-                        else:
-                            sid = None
-
-                    if sid is None:
-                        # 3. Truly New Server. Create ID.
-                        cur.execute("""
-                            INSERT INTO dim_servers (ip_address, query_port, game_port, name, current_map_id, last_seen, map_start, current_session_uuid, operator_name, location) 
-                            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                            ON CONFLICT (ip_address, query_port) DO NOTHING
-                        """, (current_ip, current_qport, s["game_port"], s["name"], map_id, scan_time, scan_time, str(uuid.uuid4()), operator_name, location_val))
-                        
-                        # Fetch ID again
-                        cur.execute("SELECT id FROM dim_servers WHERE ip_address=%s AND query_port=%s", (current_ip, current_qport))
-                        sid = cur.fetchone()['id']
-                        
-                        # Default values for new server
-                        db_game_port = s["game_port"]
-                        db_map_id = map_id
-                        db_map_start = scan_time
-                        db_session_uuid = str(uuid.uuid4())
-
-                # 3. Resolve Dynamic Data
-                final_game_port = s["game_port"] if s["game_port"] else db_game_port
-                
-                # Logic: Determine if we need a NEW session UUID
-                current_session_uuid = db_session_uuid            
-                
-                # 4. Map Rotation History
-                if map_id != db_map_id:
-                    # --- UPDATE: Calculate duration in Python for server history ---
-                    duration_sec = int((scan_time - db_map_start).total_seconds())
-                    
-                    cur.execute("""
-                        INSERT INTO fact_server_history (server_id, map_id, session_start, session_end, reason, session_uuid, calculated_duration)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s)
-                    """, (sid, db_map_id, db_map_start, scan_time, "Map Rotation", db_session_uuid, duration_sec))
-                    
-                    db_map_start = scan_time
-                    current_session_uuid = str(uuid.uuid4()) # New Match = New ID
-                    
-                # --- [NEW] SECTION 4.5: MATCH RESTART DETECTION ---
-                # Logic: If map is the same, but scores dropped from "High" to "Near Zero", it's a wipe.
-                elif map_id == db_map_id:
-                    # 1. Get the aggregate score from the PREVIOUS scan (DB State)
-                    # We need to know what the score was before we overwrite it.
-                    cur.execute("SELECT SUM(score) as total FROM fact_active WHERE server_id=%s", (sid,))
-                    row = cur.fetchone()
-                    prev_total_score = row['total'] if row and row['total'] else 0
-                    
-                    # 2. Calculate the aggregate score from the CURRENT scan (Live State)
-                    curr_total_score = sum(p['score'] for p in s['player_list'])
-
-                    # 3. The "Wipe" Thresholds
-                    # prev_total > 500: Ensures we don't log restarts for empty/idle servers.
-                    # curr_total < 200: Allows for starting cash/points, but implies a hard reset.
-                    if prev_total_score > 500 and curr_total_score < 200:
+
+                    # 3. Resolve Dynamic Data
+                    final_game_port = s["game_port"] if s["game_port"] else db_game_port
+
+                    # Logic: Determine if we need a NEW session UUID
+                    current_session_uuid = db_session_uuid
+
+                    # 4. Map Rotation History
+                    if map_id != db_map_id:
                         # --- UPDATE: Calculate duration in Python for server history ---
                         duration_sec = int((scan_time - db_map_start).total_seconds())
-                        
-                        cur.execute("""
-                            INSERT INTO fact_server_history (server_id, map_id, session_start, session_end, reason, session_uuid, calculated_duration)
-                            VALUES (%s, %s, %s, %s, %s, %s, %s)
-                        """, (sid, db_map_id, db_map_start, scan_time, "Match Restart", db_session_uuid, duration_sec))
-                        
-                        # CRITICAL: Reset the timer. 
-                        # If we don't do this, the next "session" will look like it lasted 4 hours 
-                        # instead of the 20 minutes it actually took them to fail.
+                        history_rows.append((sid, db_map_id, db_map_start, scan_time, "Map Rotation", db_session_uuid, duration_sec))
+
                         db_map_start = scan_time
-                        current_session_uuid = str(uuid.uuid4()) # Restart = New ID
-                # --------------------------------------------------
-                
-                # 5. Update Server State
-                # Added operator_name=%s and location=%s to SET clause
-                cur.execute("""
-                    UPDATE dim_servers 
-                    SET name=%s, current_map_id=%s, player_count=%s, map_start=%s, last_seen=%s, game_port=%s, current_session_uuid=%s, operator_name=%s, location=%s
-                    WHERE id=%s
-                """, (s["name"], map_id, s["header_count"], db_map_start, scan_time, final_game_port, current_session_uuid, operator_name, location_val, sid)) 
-                
-                # 6. Update Sessions
-                for p in s["player_list"]:
-                    pid = get_player_id(p["name"])
-                    
-                    # --- UPDATE: Added calculated_duration math to fact_active ---
-                    # PostgreSQL: UPSERT with EXTRACT(EPOCH FROM ...)
-                    cur.execute("""
-                        INSERT INTO fact_active (server_id, player_id, map_id, score, duration, calculated_duration, first_seen, last_seen, session_uuid)
-                        VALUES (%s, %s, %s, %s, %s, 0, %s, %s, %s)
-                        ON CONFLICT(server_id, player_id) DO UPDATE SET
-                            score=excluded.score,
-                            duration=excluded.duration,
-                            calculated_duration=EXTRACT(EPOCH FROM (excluded.last_seen - fact_active.first_seen))::INTEGER,
-                            map_id=excluded.map_id,
-                            last_seen=excluded.last_seen,
-                            session_uuid=excluded.session_uuid
-                    """, (sid, pid, map_id, p["score"], p["dur"], scan_time, scan_time, current_session_uuid))
+                        current_session_uuid = str(uuid.uuid4()) # New Match = New ID
 
-            cur.execute("""
-                INSERT INTO fact_global_stats (scan_time, active_servers, active_players)
-                VALUES (%s, %s, %s)
-            """, (scan_time, total_active_servers, total_active_players))
+                    # --- [NEW] SECTION 4.5: MATCH RESTART DETECTION ---
+                    # Logic: If map is the same, but scores dropped from "High" to "Near Zero", it's a wipe.
+                    elif map_id == db_map_id:
+                        # 1. Get the aggregate score from the PREVIOUS scan (DB State)
+                        # We need to know what the score was before we overwrite it.
+                        prev_total_score = prev_scores.get(sid) or 0
+
+                        # 2. Calculate the aggregate score from the CURRENT scan (Live State)
+                        curr_total_score = sum(score for _, score, _ in s['player_list'])
+
+                        # 3. The "Wipe" Thresholds
+                        # prev_total > 500: Ensures we don't log restarts for empty/idle servers.
+                        # curr_total < 200: Allows for starting cash/points, but implies a hard reset.
+                        if prev_total_score > 500 and curr_total_score < 200:
+                            # --- UPDATE: Calculate duration in Python for server history ---
+                            duration_sec = int((scan_time - db_map_start).total_seconds())
+                            history_rows.append((sid, db_map_id, db_map_start, scan_time, "Match Restart", db_session_uuid, duration_sec))
+
+                            # CRITICAL: Reset the timer.
+                            # If we don't do this, the next "session" will look like it lasted 4 hours
+                            # instead of the 20 minutes it actually took them to fail.
+                            db_map_start = scan_time
+                            current_session_uuid = str(uuid.uuid4()) # Restart = New ID
+                    # --------------------------------------------------
+
+                    # 5. Update Server State (only when something other than last_seen changed)
+                    new_state = {
+                        'game_port': final_game_port,
+                        'map_id': map_id,
+                        'map_start': db_map_start,
+                        'count': s["header_count"],
+                        'name': s["name"],
+                        'session_uuid': current_session_uuid,
+                        'operator_name': operator_name,
+                        'location': location_val
+                    }
+                    if any(sdata.get(k) != v for k, v in new_state.items()):
+                        state_updates.append((sid, s["name"], map_id, s["header_count"], db_map_start, scan_time, final_game_port,
+                                              current_session_uuid, operator_name, location_val))
+                        sdata.update(new_state)
+                        sdata['last_seen'] = scan_time
+                    elif sdata['last_seen'] is None or (scan_time - sdata['last_seen']).total_seconds() >= LAST_SEEN_REFRESH:
+                        heartbeat_ids.append(sid)
+                        sdata['last_seen'] = scan_time
+
+                    # 6. Stage Sessions (merged into fact_active in one statement after the loop)
+                    for name, score, dur in s["player_list"]:
+                        pid = player_cache[name]
+                        active_rows[(sid, pid)] = (sid, pid, map_id, score, dur, current_session_uuid)
+
+                result['history_rows'] = history_rows
+
+                if state_updates:
+                    execute_values(cur, """
+                        UPDATE dim_servers AS d
+                        SET name=v.name, current_map_id=v.current_map_id, player_count=v.player_count, map_start=v.map_start,
+                            last_seen=v.last_seen, game_port=v.game_port, current_session_uuid=v.current_session_uuid,
+                            operator_name=v.operator_name, location=v.location
+                        FROM (VALUES %s) AS v(id, name, current_map_id, player_count, map_start, last_seen, game_port,
+                                              current_session_uuid, operator_name, location)
+                        WHERE d.id = v.id
+                    """, state_updates,
+                        template="(%s::int, %s::text, %s::int, %s::int, %s::timestamp, %s::timestamp, %s::int, %s::varchar, %s::text, %s::text)",
+                        page_size=1000)
+
+                if heartbeat_ids:
+                    cur.execute("UPDATE dim_servers SET last_seen = %s WHERE id = ANY(%s)", (scan_time, heartbeat_ids))
+
+                result['ended_sessions'] = upsert_fact_active(cur, sorted(active_rows.values()), scan_time, prune_limit)
+                result['changed'] = len(state_updates)
+                result['heartbeat'] = len(heartbeat_ids)
+                return result
+
+            def finish_servers(cur, results):
+                """
+                Map Rotation / Match Restart history and the ended stale sessions of every shard,
+                inserted together with their rollup deltas in shard 0's transaction, so they commit
+                with the shards or not at all. Runs once all shards are done writing, so the shared
+                rollup rows cannot make the shards wait on each other.
+                """
+                history_rows = [row for result in results for row in result['history_rows']]
+                ended = [row for result in results for row in result['ended_sessions']]
+                if not history_rows and not ended:
+                    return
+                server_history_ids = history_ids = []
+                if history_rows:
+                    server_history_ids = [row['id'] for row in execute_values(cur, """
+                        INSERT INTO fact_server_history (server_id, map_id, session_start, session_end, reason, session_uuid, calculated_duration)
+                        VALUES %s
+                        RETURNING id
+                    """, history_rows, fetch=True)]
+                if ended:
+                    history_ids = [row['id'] for row in execute_values(cur, """
+                        INSERT INTO fact_history (server_id, player_id, map_id, final_score, total_time, session_start, session_end, session_uuid, calculated_duration)
+                        VALUES %s
+                        RETURNING id
+                    """, ended, fetch=True)]
+                lock_rollups(cur)
+                apply_rollup_deltas(cur, history_ids, server_history_ids,
+                                    history_since=min((row[5] for row in ended if row[5]), default=None),
+                                    server_history_since=min((row[2] for row in history_rows if row[2]), default=None))
+
+            # Known servers are handed to the shard writers as their batch arrives. Names and new
+            # servers are committed on this connection first, so the shards can reference them.
+            # Cache misses wait for the end of the stream: a moved server may only adopt a row
+            # whose address is not answering in this scan.
+            writer = ShardedWriter(db, DB_WRITERS, write_servers, key=lambda item: server_cache[item[3]]['id'],
+                                   finalize=finish_servers)
+            deferred = []
+            for batch in stream.batches(PIPELINE_BATCH_SIZE, PIPELINE_BATCH_WAIT):
+                counts['batches'] += 1
+                valid_results.extend(batch)
+                known, misses = prepare(batch)
+                db.commit()
+                deferred.extend(misses)
+                writer.submit(known)
+                writer.check()
+            producer.join()
+            timings['network'] = network['elapsed']
+
+            if deferred:
+                create_servers(deferred, {f"{s['addr'].split(':')[0]}:{s['query_port']}" for s in valid_results})
+                db.commit()
+                writer.submit(deferred)
+            # All shards commit together, or all roll back
+            shard_results = writer.finish()
+            timings['db_stream'] = time.perf_counter() - phase_start - timings['network']
+            phase_start = time.perf_counter()
+
+            # Connection Lost rows are inserted and rolled up in the final transaction below
+            server_history_ids = []
+            server_history_starts = []
+            for result in shard_results:
+                for k in ('servers', 'changed', 'heartbeat'):
+                    counts[k] += result[k]
+                counts['returned'] += len(result['ended_sessions'])
+
+            net_stats = engine.stats.summary()
+            print(f"[*] Network: {net_stats['responded']}/{net_stats['targets']} replied in {net_stats['duration_ms']}ms | "
+                  f"RTT avg {net_stats['avg_rtt_ms']}ms p95 {net_stats['p95_rtt_ms']}ms | "
+                  f"lost {net_stats['lost_packets']} retries {net_stats['retries']} | "
+                  f"sent {net_stats['send_pps']}pps replies {net_stats['reply_pps']}pps")
+            print(f"[*] Streamed {len(valid_results)} responses in {counts['batches']} batches "
+                  f"({stream.stalls} queue stalls)")
+            if counts['maps'] or counts['players']:
+                print(f"[*] Resolved {counts['maps']} new maps, {counts['players']} new players")
+            if counts['returned']:
+                print(f"[*] Archived {counts['returned']} stale sessions of players who came back after a gap")
+            print(f"[*] dim_servers: {counts['new']} new, {counts['changed']} changed, "
+                  f"{counts['heartbeat']} last_seen only, "
+                  f"{counts['servers'] - counts['changed'] - counts['heartbeat'] - counts['new']} untouched")
+
+            # --- CALC TOTALS ---
+            total_active_servers = len(valid_results)
+            total_active_players = sum(s["header_count"] for s in valid_results)
+            if scheduler:
+                scheduler.record(due_addrs, {s["addr"]: s["header_count"] for s in valid_results}, scan_time)
+                carried_servers, carried_players = scheduler.carried_totals(skipped_addrs)
+                total_active_servers += carried_servers
+                total_active_players += carried_players
+            # -------------------
+
+            # --- [PRUNING UPDATE] Transfer calculated_duration from fact_active to fact_history ---
+            # Every server answering in this scan was just written with last_seen = scan_time,
+            # so only sessions that really ended are archived (stale sessions of players who came
+            # back were already ended by the shard writers). Each batch commits on its own,
+            # with its rollup deltas, ahead of the scan's final transaction.
+            moved = prune_active_sessions(db, cur, prune_limit, PRUNE_BATCH_SIZE)
+            if len(moved) >= PRUNE_BATCH_SIZE:
+                print(f"[*] Pruned {len(moved)} ended sessions in batches of {PRUNE_BATCH_SIZE}")
+            moved_history_ids = [row['id'] for row in moved]
+
+            record_global_stats(cur, scan_time, total_active_servers, total_active_players)
+            record_scan_stats(cur, scan_time, net_stats)
             # --- DEAD SERVER CLEANUP ---
             # 1. Define the cutoff (15 minutes ago)
             server_timeout = (scan_time - timedelta(minutes=15))
+            # Skipped servers whose last reply is still inside their tier's probe interval were not
+            # probed, so they cannot be declared lost. Unreachable servers on backoff already failed
+            # a probe and are declared lost at the usual cutoff, even while they are skipped.
+            skipped_keys = scheduler.fresh(skipped_addrs) if scheduler else []
             
             # 2. Move "Missing in Action" servers to history
             # We only archive them if they aren't already marked as empty/processed 
@@ -837,7 +1356,13 @@ def main():
                        EXTRACT(EPOCH FROM (last_seen - map_start))::INTEGER
                 FROM dim_servers
                 WHERE last_seen < %s AND player_count > 0
-            """, (server_timeout,))
+                  AND NOT ((ip_address || ':' || query_port) = ANY(%s::text[]))
+                RETURNING id, session_start
+            """, (server_timeout, skipped_keys))
+            for row in cur.fetchall():
+                server_history_ids.append(row['id'])
+                if row['session_start']:
+                    server_history_starts.append(row['session_start'])
 
             # 3. Mark them as empty so they stop showing up as active
             # We also reset map_start to prevent duplicate history entries if it stays dead
@@ -845,24 +1370,86 @@ def main():
                 UPDATE dim_servers
                 SET player_count = 0, map_start = %s
                 WHERE last_seen < %s AND player_count > 0
-            """, (scan_time, server_timeout))
+                  AND NOT ((ip_address || ':' || query_port) = ANY(%s::text[]))
+                RETURNING ip_address, query_port
+            """, (scan_time, server_timeout, skipped_keys))
+            for row in cur.fetchall():
+                sdata = server_cache.get(f"{row['ip_address']}:{row['query_port']}")
+                if sdata:
+                    sdata['count'] = 0
+                    sdata['map_start'] = scan_time
             # ---------------------------    
+            timings['db_write'] = time.perf_counter() - phase_start
+            phase_start = time.perf_counter()
+
             # --- ROLLUPS ---
-            backfill_rollups(cur)              # runs once, then becomes a no-op
-            refresh_recent_rollups(cur, scan_time, days_back=1)  # yesterday + today
+            lock_rollups(cur)
+            backfill_rollups(cur, moved_history_ids)
+            # fact_history deltas were applied with each prune batch, Map Rotation / Match Restart
+            # deltas with the shard commit; only this transaction's Connection Lost rows are left
+            apply_rollup_deltas(cur, [], server_history_ids,
+                                server_history_since=min(server_history_starts, default=None))
+            if reconcile_due(cur, scan_time):
+                repaired = reconcile_rollups(cur, scan_time, days_back=ROLLUP_RECONCILE_DAYS)
+                if repaired:
+                    print("[WARN] Rollup drift repaired: " + ", ".join(f"{t} ({n} rows)" for t, n in repaired.items()))
             
             db.commit()
+            timings['rollups'] = time.perf_counter() - phase_start
     except Exception as e:
         print(f"[!] 数据库错误: {e}")
         import traceback
         traceback.print_exc()
+        # Let the probe finish (its remaining replies are dropped) before the engine is reused
+        stream.abort()
+        if writer is not None:
+            writer.abort()
+        producer.join()
         db.rollback()
+        # The in-memory caches may now reference rows that were rolled back
+        state.invalidate()
         return
     finally:
         # 注意：不需要关闭连接，因为 get_database() 返回的是全局连接
         pass
     
+    timings['total'] = time.time() - start_time
+    state.last_timings = timings
+    print("[*] Timings: " + " | ".join(f"{k} {v:.2f}s" for k, v in timings.items()))
     print(f"--- [ CYCLE COMPLETE: {time.time() - start_time:.2f}s | Players: {total_active_players} ] ---")
+    return timings
+
+def run_daemon(interval=None):
+    """
+    Long-running collector: one scan every `interval` seconds with warm caches.
+    SIGTERM/SIGINT stop the loop after the current cycle.
+    """
+    interval = interval or COLLECTOR_INTERVAL
+    stop = threading.Event()
+
+    def _stop(signum, frame):
+        print(f"[*] Signal {signum} received, stopping after this cycle...")
+        stop.set()
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    state = CollectorState()
+    print(f"[*] Collector daemon started (interval {interval}s)")
+    while not stop.is_set():
+        cycle_start = time.monotonic()
+        try:
+            main(state)
+        except Exception as e:
+            print(f"[!] Cycle failed: {e}")
+            import traceback
+            traceback.print_exc()
+            state.invalidate()
+        stop.wait(max(0.0, interval - (time.monotonic() - cycle_start)))
+    print("[*] Collector daemon stopped")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    if '--daemon' in sys.argv:
+        run_daemon()
+    else:
+        main()
\ No newline at end of file
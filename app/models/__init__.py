@@ -2,7 +2,9 @@
 from app.models.database import (
     Database,
     DatabaseConfig,
-    get_database
+    get_database,
+    copy_rows,
+    stream_copy_rows
 )
 from app.models.migrations import (
     Migration,
@@ -13,6 +15,8 @@ __all__ = [
     'Database',
     'DatabaseConfig',
     'get_database',
+    'copy_rows',
+    'stream_copy_rows',
     'Migration',
     'MigrationManager'
 ]
@@ -1,6 +1,7 @@
 """
 数据库抽象层 - PostgreSQL (with connection pooling)
 """
+import io
 import os
 import threading
 from contextlib import contextmanager
@@ -128,6 +129,78 @@ class Database:
             self._local.connection.rollback()
 
 
+def _copy_text(value):
+    """将 Python 值转换为 COPY 文本格式的字段"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, str):
+        return (value.replace('\\', '\\\\').replace('\t', '\\t')
+                     .replace('\n', '\\n').replace('\r', '\\r'))
+    return str(value)
+
+
+def copy_rows(cur, table, columns, rows):
+    """
+    使用 COPY FROM STDIN 批量写入（单次往返）
+
+    Args:
+        cur: 游标
+        table: 目标表（通常是临时暂存表）
+        columns: 列名列表
+        rows: 可迭代的元组序列
+    Returns:
+        int: 写入的行数
+    """
+    buf = io.StringIO()
+    count = 0
+    for row in rows:
+        buf.write('\t'.join(_copy_text(v) for v in row))
+        buf.write('\n')
+        count += 1
+    if count:
+        buf.seek(0)
+        cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buf)
+    return count
+
+
+class _CopyReader:
+    """把行迭代器包装成 copy_expert 可读取的类文件对象，按需生成 COPY 文本"""
+
+    def __init__(self, rows):
+        self.rows = iter(rows)
+        self.pending = ''
+        self.count = 0
+
+    def read(self, size=-1):
+        chunks = [self.pending]
+        length = len(self.pending)
+        for row in self.rows:
+            line = '\t'.join(_copy_text(v) for v in row) + '\n'
+            chunks.append(line)
+            length += len(line)
+            self.count += 1
+            if 0 <= size <= length:
+                break
+        data = ''.join(chunks)
+        if size < 0:
+            self.pending = ''
+            return data
+        self.pending = data[size:]
+        return data[:size]
+
+
+def stream_copy_rows(cur, table, columns, rows, chunk_size=1 << 20):
+    """
+    流式 COPY FROM STDIN：边迭代边发送，内存占用与总行数无关（适合百万行级导入）
+
+    Returns:
+        int: 写入的行数
+    """
+    reader = _CopyReader(rows)
+    cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", reader, size=chunk_size)
+    return reader.count
+
+
 # 全局数据库实例
 _db_instance = None
 
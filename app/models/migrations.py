@@ -10,6 +10,57 @@ from pathlib import Path
 from typing import List, Tuple
 
 
+_DOLLAR_QUOTE = re.compile(r'\$[A-Za-z_]*\$')
+
+
+def split_sql_statements(sql: str) -> List[str]:
+    """
+    清理并分割 SQL：移除纯注释行和空行，按分号分割语句。
+    单引号字符串与 $$ / $tag$ 美元引用块（DO 块、函数体）内的分号不会分割语句。
+    """
+    lines = [line for line in sql.split('\n') if line.strip() and not line.strip().startswith('--')]
+    cleaned_sql = '\n'.join(lines)
+
+    statements = []
+    current = []
+    i = 0
+    quote = None  # "'" or the active dollar-quote tag
+    while i < len(cleaned_sql):
+        ch = cleaned_sql[i]
+        if quote is None:
+            if ch == "'":
+                quote = "'"
+            elif ch == '$':
+                match = _DOLLAR_QUOTE.match(cleaned_sql, i)
+                if match:
+                    quote = match.group(0)
+                    current.append(quote)
+                    i += len(quote)
+                    continue
+            elif ch == ';':
+                stmt = ''.join(current).strip()
+                if stmt:
+                    statements.append(stmt)
+                current = []
+                i += 1
+                continue
+        elif quote == "'":
+            if ch == "'":
+                quote = None
+        elif cleaned_sql.startswith(quote, i):
+            current.append(quote)
+            i += len(quote)
+            quote = None
+            continue
+        current.append(ch)
+        i += 1
+
+    stmt = ''.join(current).strip()
+    if stmt:
+        statements.append(stmt)
+    return statements
+
+
 class Migration:
     """单个迁移文件"""
     
@@ -71,21 +122,8 @@ class MigrationManager:
         with open(v000_file, 'r', encoding='utf-8') as f:
             sql = f.read()
         
-        # 清理 SQL
-        lines = []
-        for line in sql.split('\n'):
-            stripped = line.strip()
-            if stripped and not stripped.startswith('--'):
-                lines.append(line)
-        
-        cleaned_sql = '\n'.join(lines)
-        
-        # 分割语句
-        statements = []
-        for s in cleaned_sql.split(';'):
-            stmt = s.strip()
-            if stmt:
-                statements.append(stmt)
+        # 清理并分割语句
+        statements = split_sql_statements(sql)
         
         if not statements:
             print("[WARN] V000 contains no executable statements")
@@ -285,23 +323,8 @@ class MigrationManager:
             # 读取并执行 SQL
             sql = migration.read_sql()
             
-            # 清理 SQL：移除纯注释行和空行
-            lines = []
-            for line in sql.split('\n'):
-                stripped = line.strip()
-                # 跳过空行和纯注释行
-                if stripped and not stripped.startswith('--'):
-                    lines.append(line)
-            
-            cleaned_sql = '\n'.join(lines)
-            
-            # 分割为多个语句（以分号分隔）
-            statements = []
-            for s in cleaned_sql.split(';'):
-                stmt = s.strip()
-                # 只保留非空且不是纯注释的语句
-                if stmt and not stmt.startswith('--'):
-                    statements.append(stmt)
+            # 清理并分割语句（支持 DO $$ ... $$ 块）
+            statements = split_sql_statements(sql)
             
             if not statements:
                 print(f"[WARN] Migration V{migration.version} contains no executable statements")
@@ -96,14 +96,15 @@ def statistics():
             """)
             chart_24h = cur.fetchall()
 
+        # 24h 图读取原始表（保留 48 小时），30 天图读取 5 分钟桶，全历史图读取日桶
         with StepTimer("Query: Chart 30d"):
             cur.execute("""
                 SELECT 
-                    TO_TIMESTAMP(FLOOR(EXTRACT(EPOCH FROM scan_time) / 14400) * 14400) as time_bucket,
-                    ROUND(AVG(active_players), 1) as avg_players,
-                    ROUND(AVG(active_servers), 1) as avg_servers
-                FROM fact_global_stats
-                WHERE scan_time > NOW() - INTERVAL '30 days'
+                    TO_TIMESTAMP(FLOOR(EXTRACT(EPOCH FROM bucket) / 14400) * 14400) as time_bucket,
+                    ROUND(SUM(sum_players)::NUMERIC / SUM(samples), 1) as avg_players,
+                    ROUND(SUM(sum_servers)::NUMERIC / SUM(samples), 1) as avg_servers
+                FROM fact_global_stats_5m
+                WHERE bucket > NOW() - INTERVAL '30 days'
                 GROUP BY time_bucket
                 ORDER BY time_bucket ASC
             """)
@@ -112,12 +113,11 @@ def statistics():
         with StepTimer("Query: Chart History"):
             cur.execute("""
                 SELECT 
-                    scan_time::DATE as day,
-                    ROUND(AVG(active_players), 1) as avg_players,
-                    MAX(active_players) as max_players
-                FROM fact_global_stats
-                GROUP BY day
-                ORDER BY day ASC
+                    bucket::DATE as day,
+                    ROUND(sum_players::NUMERIC / samples, 1) as avg_players,
+                    max_players
+                FROM fact_global_stats_daily
+                ORDER BY bucket ASC
             """)
             chart_history = cur.fetchall()
         
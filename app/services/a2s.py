@@ -0,0 +1,383 @@
+"""
+A2S 异步查询引擎
+所有 A2S_INFO / A2S_PLAYER 交换复用少量 UDP 套接字，按来源地址分发回包；
+多包分片回包在交换内重组后再解析（解析见 a2s_parser）
+"""
+import asyncio
+import socket
+import time
+import zlib
+
+from .a2s_parser import SPLIT_HEADER, add_split_packet, parse_info, parse_players
+
+A2S_INFO = b"\xff\xff\xff\xff\x54\x53\x6f\x75\x72\x63\x65\x20\x45\x6e\x67\x69\x6e\x65\x20\x51\x75\x65\x72\x79\x00"
+A2S_PLAYER_CHALLENGE = b"\xff\xff\xff\xff\x55\xff\xff\xff\xff"
+A2S_PLAYER_HEADER = b"\xff\xff\xff\xff\x55"
+
+S2C_CHALLENGE = b"\xff\xff\xff\xff\x41"
+S2A_INFO = b"\xff\xff\xff\xff\x49"
+S2A_PLAYER = b"\xff\xff\xff\xff\x44"
+
+# 单次交换中最多响应的 challenge 次数（防止异常服务器无限循环）
+MAX_CHALLENGES = 3
+
+# 套接字接收缓冲区：数千个并发回包同时到达时避免内核丢包
+RECV_BUFFER_BYTES = 4 * 1024 * 1024
+
+
+def new_result(server_addr, query_port):
+    """创建与 Query.query_server 相同结构的结果字典"""
+    return {
+        "addr": server_addr,
+        "name": None,
+        "map": "",
+        "player_list": [],
+        "header_count": 0,
+        "query_port": query_port,
+        "game_port": None
+    }
+
+
+class RttEstimator:
+    """单个服务器的平滑 RTT 与方差（RFC 6298 的 RTO 估计方法）"""
+    ALPHA = 0.125
+    BETA = 0.25
+    K = 4
+
+    def __init__(self, sample):
+        self.srtt = sample
+        self.rttvar = sample / 2
+
+    def update(self, sample):
+        self.rttvar = (1 - self.BETA) * self.rttvar + self.BETA * abs(self.srtt - sample)
+        self.srtt = (1 - self.ALPHA) * self.srtt + self.ALPHA * sample
+
+    def rto(self, lower, upper):
+        """由 SRTT/RTTVAR 推导的超时时间，限制在 [lower, upper] 内"""
+        return min(upper, max(lower, self.srtt + self.K * self.rttvar))
+
+
+class TokenBucket:
+    """
+    发包限速器（令牌桶）
+
+    按预约时间片发放令牌：每个包占用 1/rate 秒，空闲时最多积累 burst 个令牌。
+    rate <= 0 时不限速。
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = max(1, int(burst))
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+
+    def reserve(self):
+        """预约下一个发送时间片，返回需要等待的秒数"""
+        if self.interval == 0.0:
+            return 0.0
+        now = time.monotonic()
+        start = max(self._next, now - (self.burst - 1) * self.interval)
+        self._next = start + self.interval
+        return max(0.0, start - now)
+
+    async def acquire(self):
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class ScanStats:
+    """单次扫描的网络统计（RTT、丢包、重传）"""
+
+    def __init__(self, targets=0):
+        self.targets = targets
+        self.responded = 0
+        self.packets_sent = 0
+        self.replies = 0
+        self.lost = 0
+        self.retries = 0
+        self.rtt_samples = []
+        self.started = time.monotonic()
+        self.duration = 0.0
+
+    def finish(self):
+        self.duration = time.monotonic() - self.started
+
+    def summary(self):
+        """汇总为可直接写入 fact_scan_stats 的字典（时间单位：毫秒）"""
+        samples = sorted(self.rtt_samples)
+        if samples:
+            avg_rtt = sum(samples) / len(samples) * 1000
+            p50_rtt = samples[len(samples) // 2] * 1000
+            p95_rtt = samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000
+        else:
+            avg_rtt = p50_rtt = p95_rtt = None
+        return {
+            "targets": self.targets,
+            "responded": self.responded,
+            "packets_sent": self.packets_sent,
+            "replies": self.replies,
+            "lost_packets": self.lost,
+            "retries": self.retries,
+            "avg_rtt_ms": round(avg_rtt, 1) if avg_rtt is not None else None,
+            "p50_rtt_ms": round(p50_rtt, 1) if p50_rtt is not None else None,
+            "p95_rtt_ms": round(p95_rtt, 1) if p95_rtt is not None else None,
+            "duration_ms": int(self.duration * 1000),
+            "send_pps": round(self.packets_sent / self.duration, 1) if self.duration else None,
+            "reply_pps": round(self.replies / self.duration, 1) if self.duration else None,
+        }
+
+
+class _Exchange:
+    """单个服务器的回包队列，元素为 (data, 到达时间)"""
+
+    def __init__(self):
+        self.packets = asyncio.Queue()
+
+    async def recv(self, timeout):
+        return await asyncio.wait_for(self.packets.get(), timeout)
+
+
+class A2SProtocol(asyncio.DatagramProtocol):
+    """一个 UDP 套接字，按 (ip, port) 将回包分发给进行中的交换"""
+
+    def __init__(self):
+        self.transport = None
+        self.exchanges = {}
+
+    def connection_made(self, transport):
+        self.transport = transport
+        sock = transport.get_extra_info('socket')
+        if sock is not None:
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECV_BUFFER_BYTES)
+            except OSError:
+                pass
+
+    def datagram_received(self, data, addr):
+        exchange = self.exchanges.get(addr[:2])
+        if exchange is not None:
+            exchange.packets.put_nowait((data, time.monotonic()))
+
+    def error_received(self, exc):
+        # ICMP 端口不可达等错误：对应的交换会自然超时
+        pass
+
+    def sendto(self, data, addr):
+        self.transport.sendto(data, addr)
+
+
+class A2SQueryEngine:
+    """
+    asyncio A2S 查询引擎
+
+    Args:
+        timeout: 单个服务器查询的总超时预算（秒），也是 RTO 的上限
+        max_in_flight: 同时进行中的服务器查询数上限
+        sockets: 复用的 UDP 套接字数量
+        retries: 单次扫描内丢包后的最大重传次数
+        min_timeout: RTO 下限（秒）
+        initial_timeout: 尚无 RTT 历史的服务器使用的初始 RTO（秒）
+        send_rate: 发包速率上限（包/秒），<= 0 表示不限速
+        send_burst: 允许的突发包数
+
+    引擎实例可跨多次扫描复用，challenges（"ip:query_port" -> token）
+    与 rtt（"ip:query_port" -> RttEstimator）缓存随之保留。
+    """
+
+    def __init__(self, timeout=3.0, max_in_flight=2048, sockets=4,
+                 retries=2, min_timeout=0.2, initial_timeout=1.0,
+                 send_rate=5000, send_burst=250):
+        self.timeout = timeout
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.socket_count = max(1, int(sockets))
+        self.retries = max(0, int(retries))
+        self.min_timeout = min(min_timeout, timeout)
+        self.initial_timeout = min(initial_timeout, timeout)
+        self.pacer = TokenBucket(send_rate, send_burst)
+        self.challenges = {}
+        self.rtt = {}
+        self.stats = ScanStats()
+        self._protocols = []
+
+    async def _open(self):
+        loop = asyncio.get_running_loop()
+        self._protocols = []
+        for _ in range(self.socket_count):
+            _, protocol = await loop.create_datagram_endpoint(
+                A2SProtocol, local_addr=('0.0.0.0', 0), family=socket.AF_INET
+            )
+            self._protocols.append(protocol)
+
+    def _close(self):
+        for protocol in self._protocols:
+            if protocol.transport is not None:
+                protocol.transport.close()
+        self._protocols = []
+
+    def _protocol_for(self, addr):
+        key = f"{addr[0]}:{addr[1]}".encode()
+        return self._protocols[zlib.crc32(key) % len(self._protocols)]
+
+    async def query(self, server_addr):
+        """
+        查询单个服务器，返回结果字典（无响应时返回 None）
+
+        A2S_INFO 与 A2S_PLAYER 同时发出；若缓存中有该服务器上次的 challenge，
+        A2S_PLAYER 直接携带该 token，只有被服务器拒绝时才重新获取。
+        等待时间由该服务器的 RTT 历史推导，超时后重传未应答的请求（指数退避），
+        总耗时不超过 timeout。
+        """
+        try:
+            ip, query_port = server_addr.split(':')
+            query_port = int(query_port)
+            addr = (ip, query_port)
+        except: return None
+
+        results = new_result(server_addr, query_port)
+        protocol = self._protocol_for(addr)
+        exchange = _Exchange()
+        protocol.exchanges[addr] = exchange
+
+        loop = asyncio.get_running_loop()
+        stats = self.stats
+        cache_key = f"{ip}:{query_port}"
+        token = self.challenges.get(cache_key)
+        estimator = self.rtt.get(cache_key)
+        rto = estimator.rto(self.min_timeout, self.timeout) if estimator else self.initial_timeout
+        retries_left = self.retries
+        challenges_seen = 0
+        timeouts = 0
+
+        # Outstanding requests: kind -> [packet, sent_at, retransmitted]
+        pending = {}
+        # Split responses being reassembled: packet id -> parts
+        splits = {}
+
+        async def send(kind, packet, retransmitted=False):
+            await self.pacer.acquire()
+            pending[kind] = [packet, time.monotonic(), retransmitted]
+            protocol.sendto(packet, addr)
+            stats.packets_sent += 1
+
+        def answered(kind, received_at):
+            nonlocal estimator
+            request = pending.pop(kind, None)
+            # Karn's rule: a reply to a retransmitted request is not an RTT sample
+            if request is None or request[2]:
+                return
+            sample = max(0.0, received_at - request[1])
+            stats.rtt_samples.append(sample)
+            if estimator is None:
+                estimator = self.rtt[cache_key] = RttEstimator(sample)
+            else:
+                estimator.update(sample)
+
+        try:
+            await send("info", A2S_INFO)
+            await send("player", A2S_PLAYER_HEADER + token if token else A2S_PLAYER_CHALLENGE)
+            # The budget starts once our packets are on the wire, not while queued in the pacer
+            deadline = loop.time() + self.timeout
+
+            while pending:
+                wait = min(rto, deadline - loop.time())
+                if wait <= 0:
+                    break
+                try:
+                    resp, received_at = await exchange.recv(wait)
+                except asyncio.TimeoutError:
+                    timeouts += len(pending)
+                    if retries_left <= 0 or loop.time() >= deadline:
+                        break
+                    retries_left -= 1
+                    stats.retries += 1
+                    if "info" not in pending and token and challenges_seen == 0:
+                        # Cached token silently ignored: fall back to a fresh challenge
+                        self.challenges.pop(cache_key, None)
+                        token = None
+                        pending["player"][0] = A2S_PLAYER_CHALLENGE
+                    for kind, request in list(pending.items()):
+                        await send(kind, request[0], retransmitted=True)
+                    rto = min(rto * 2, self.timeout)
+                    continue
+
+                stats.replies += 1
+                if resp.startswith(SPLIT_HEADER):
+                    try:
+                        resp = add_split_packet(splits, resp)
+                    except ValueError:
+                        resp = None
+                    if resp is None:
+                        continue
+                if resp.startswith(S2A_INFO):
+                    info = parse_info(resp)
+                    if info is not None:
+                        results["name"], results["map"], results["header_count"], results["game_port"] = info
+                    answered("info", received_at)
+                elif resp.startswith(S2A_PLAYER):
+                    results["player_list"] = parse_players(resp, ip, query_port)
+                    answered("player", received_at)
+                elif resp.startswith(S2C_CHALLENGE) and len(resp) >= 9:
+                    # A server may challenge INFO as well as PLAYER and both use the
+                    # same token. Without a cached token the first challenge answers
+                    # our PLAYER challenge request, so only a later one can be for INFO.
+                    challenges_seen += 1
+                    if challenges_seen > MAX_CHALLENGES:
+                        break
+                    sent_with_token = token is not None
+                    token = resp[5:9]
+                    self.challenges[cache_key] = token
+                    if "player" in pending:
+                        answered("player", received_at)
+                        await send("player", A2S_PLAYER_HEADER + token)
+                    if "info" in pending and (sent_with_token or challenges_seen > 1):
+                        await send("info", A2S_INFO + token)
+        except OSError:
+            pass
+        finally:
+            if protocol.exchanges.get(addr) is exchange:
+                del protocol.exchanges[addr]
+
+        # Counted for every exchange, including servers that never answered
+        stats.lost += timeouts
+        if not results["name"]:
+            return None
+        stats.responded += 1
+        return results
+
+    async def scan(self, targets, on_result=None):
+        """
+        并发查询所有目标
+
+        Args:
+            targets: "ip:query_port" 字符串列表
+            on_result: 可选的协程函数 on_result(target, result)，每个服务器应答后立即 await，
+                       供调用方边探测边消费结果（可在其中施加背压）
+        Returns:
+            dict: {target: result}，仅包含有响应的服务器
+        """
+        targets = list(dict.fromkeys(targets))
+        semaphore = asyncio.Semaphore(self.max_in_flight)
+        found = {}
+        self.stats = ScanStats(len(targets))
+
+        async def worker(target):
+            async with semaphore:
+                res = await self.query(target)
+            if res:
+                found[target] = res
+                if on_result is not None:
+                    await on_result(target, res)
+
+        await self._open()
+        try:
+            # 同一地址只能有一个进行中的交换，否则回包无法区分（已在上方去重）
+            await asyncio.gather(*(worker(t) for t in targets))
+        finally:
+            self._close()
+            self.stats.finish()
+        return found
+
+    def run(self, targets, on_result=None):
+        """同步入口：在新的事件循环中执行一次完整扫描"""
+        return asyncio.run(self.scan(targets, on_result))
@@ -0,0 +1,152 @@
+"""
+A2S 回包解析
+定长字段用预编译的 struct.Struct 直接从原缓冲区读取（unpack_from，不切片），
+每个字符串字段只做一次 find 与一次 decode，用不到的字符串字段只定位不解码；
+结果为紧凑的普通元组（比字典小，创建也比具名元组快）。另含多包分片（split packet）回包的重组
+"""
+import bz2
+import struct
+import zlib
+
+SINGLE_HEADER = b"\xff\xff\xff\xff"
+SPLIT_HEADER = b"\xfe\xff\xff\xff"
+
+S2A_INFO_TYPE = 0x49
+S2A_PLAYER_TYPE = 0x44
+
+# Extra Data Flag：回包末尾带有游戏端口
+EDF_PORT = 0x80
+
+_PLAYER_FIELDS = struct.Struct('<lf')   # score, duration
+_U16 = struct.Struct('<H')
+_SPLIT = struct.Struct('<LBBH')         # id, total, number, max packet size（紧跟在 FE FF FF FF 之后）
+_COMPRESSED = struct.Struct('<LL')      # 解压后长度, CRC32（仅压缩回包的第一个分片）
+_SPLIT_PAYLOAD = len(SPLIT_HEADER) + _SPLIT.size
+
+# 分片重组的上限，防止异常回包占用内存
+MAX_SPLIT_PACKETS = 32
+MAX_DECOMPRESSED = 1 << 20
+
+
+def parse_info(data):
+    """
+    解析 S2A_INFO 回包
+
+    Args:
+        data: 完整的单包回包（bytes）
+    Returns:
+        tuple: (name, map, players, game_port)；回包被截断时缺失的字段为 ''、0 或 None，
+               不是 S2A_INFO 或连服务器名都不完整时返回 None
+    """
+    size = len(data)
+    if size < 6 or data[4] != S2A_INFO_TYPE or not data.startswith(SINGLE_HEADER):
+        return None
+    find = data.find
+
+    # 协议版本 1 字节，之后依次是 name / map / folder / game
+    end = find(0, 6)
+    if end < 0:
+        return None
+    name = data[6:end].decode('utf-8', 'ignore')
+
+    map_name = ''
+    players = 0
+    game_port = None
+    pos = end + 1
+    end = find(0, pos)
+    if end >= 0:
+        map_name = data[pos:end].decode('utf-8', 'ignore')
+        # folder 与 game 用不到，只定位不解码
+        end = find(0, end + 1)
+        if end >= 0:
+            end = find(0, end + 1)
+        # app id 2 字节之后是 players
+        pos = end + 3
+        if end >= 0 and pos < size:
+            players = data[pos]
+            # max players, bots, server type, environment, visibility, VAC 之后是 version 字符串与 EDF
+            end = find(0, pos + 7)
+            pos = end + 1
+            if end >= 0 and pos + 1 + _U16.size <= size and data[pos] & EDF_PORT:
+                game_port = _U16.unpack_from(data, pos + 1)[0]
+
+    return name, map_name, players, game_port
+
+
+def parse_players(data, ip, query_port):
+    """
+    解析 S2A_PLAYER 回包
+
+    Args:
+        data: 完整的单包回包（bytes）
+        ip, query_port: 用于给无名玩家生成占位名
+    Returns:
+        list: (name, score, dur) 元组；回包被截断时只包含完整的玩家记录
+    """
+    size = len(data)
+    if size < 6 or data[4] != S2A_PLAYER_TYPE or not data.startswith(SINGLE_HEADER):
+        return []
+    find = data.find
+    unpack_fields = _PLAYER_FIELDS.unpack_from
+    fields_size = _PLAYER_FIELDS.size
+
+    player_list = []
+    append = player_list.append
+    pos = 6
+    for slot in range(data[5]):
+        # 每条记录：index 1 字节，name，score，duration
+        end = find(0, pos + 1)
+        if end < 0 or end + 1 + fields_size > size:
+            break
+        name = data[pos + 1:end].decode('utf-8', 'ignore').strip()
+        score, dur = unpack_fields(data, end + 1)
+        pos = end + 1 + fields_size
+
+        # Handle Ghost Players
+        if not name:
+            name = f"[UNNAMED:{ip}:{query_port}:{slot}]"
+        append((name, score, dur))
+    return player_list
+
+
+def add_split_packet(pending, data):
+    """
+    收下一个分片（Source 格式：FE FF FF FF, id, total, number, size）
+
+    Args:
+        pending: dict，分片 ID -> 已收到的分片，由调用方为每次交换保存
+        data: 以 SPLIT_HEADER 开头的数据报
+    Returns:
+        bytes: 全部分片到齐后重组出的单包回包（以 FF FF FF FF 开头），否则 None
+    Raises:
+        ValueError: 分片头不合法，或压缩载荷解压 / 校验失败
+    """
+    if len(data) < _SPLIT_PAYLOAD or not data.startswith(SPLIT_HEADER):
+        raise ValueError("short split packet")
+    packet_id, total, number, _ = _SPLIT.unpack_from(data, len(SPLIT_HEADER))
+    if not 0 < total <= MAX_SPLIT_PACKETS or number >= total:
+        raise ValueError(f"bad split packet {number}/{total}")
+
+    parts = pending.get(packet_id)
+    if parts is None or len(parts) != total:
+        parts = pending[packet_id] = [None] * total
+    # 只记录去掉分片头后的视图，重组时一次拷贝完成
+    parts[number] = memoryview(data)[_SPLIT_PAYLOAD:]
+    if any(part is None for part in parts):
+        return None
+    del pending[packet_id]
+    payload = b''.join(parts)
+
+    if packet_id & 0x80000000:
+        if len(payload) < _COMPRESSED.size:
+            raise ValueError("short compressed split payload")
+        expected, crc = _COMPRESSED.unpack_from(payload)
+        if expected > MAX_DECOMPRESSED:
+            raise ValueError(f"compressed split payload too large ({expected} bytes)")
+        try:
+            payload = bz2.BZ2Decompressor().decompress(memoryview(payload)[_COMPRESSED.size:], expected + 1)
+        except OSError as e:
+            raise ValueError(f"bad compressed split payload: {e}") from e
+        if len(payload) != expected or zlib.crc32(payload) != crc:
+            raise ValueError("compressed split payload failed its checksum")
+    return payload
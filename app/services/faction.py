@@ -0,0 +1,193 @@
+"""
+派系（运营方）识别
+将服务器名归并为运营方名称：所有正则在构造时编译一次，结果按 (服务器名, IP) 做有界 LRU 缓存
+"""
+import re
+from functools import lru_cache
+
+# 优先级从高到低：第一个命中的模式决定派系
+VIP_PATTERNS = (
+    (r'simpleserver', "SimpleServer (TH)"),
+    (r'valeria', "Valeria & Friends"),
+    (r'nekoha', "Nekoha Club"),
+    (r'\bbaz\b', "BAz"),
+    (r'\bkf-?fr\b', "KF-FR"),
+    (r'\bkf-?br\b', "KF-BR"),
+    (r'jp\s?\|', "JP Server"),
+    (r'\bsg-?servers?\b', "SG-Servers"),
+    (r'\bhuwhyte\b', "Huwhyte"),
+    (r'\btripwire\b', "Tripwire Official"),
+    (r'\bbloodhounds\b', "Bloodhounds"),
+    (r'\bkog\b', "KoG Clan"),
+    (r'\bcyxc\b', "Cyxc"),
+    (r'\bamursk\b', "Amursk"),
+    (r'\bmadhouse\b', "MadHouse"),
+    (r'\bamerica latina brasil\b', "America Latina Brasil"),
+    (r'\blarge\s?farva\b', "Large Farva"),
+    (r'\bpunchguts\b', "Punchguts"),
+    (r'\bspb-?gs\b', "SPB-GS"),
+    (r'\bextreme\s?server\b', "Extreme Server"),
+    (r'\bpowerbits\b', "Powerbits"),
+    (r'\bwilnet\b', "Wilnet Gaming"),
+    (r'\bnerdit\b', "Nerdit"),
+    (r'\bmod-?eu\b', "Mod-EU"),
+    (r'\bnfo(?:servers)?\b', "NFO Servers"),
+    (r'\bdslive\b', "DSLive"),
+    (r'\bzgaming\b', "ZGaming"),
+    (r'\[kr\]\s+public\s+server', "[KR] Public Server"),
+    (r'\bkf2\.eu\b', "KF2.eu SuperPerkTraining"),
+    (r'\btwilight realm\b', "Twilight Realm"),
+    (r'\bthe alley\b', "The Alley"),
+    (r'^cd\s?#\d+', "Legs CD"),
+    (r'the\s?outpost', "The Outpost"),
+    (r'sora-?iro', "Sora-Iro (JP)"),
+
+    # --- ASIAN / SPECIAL CHARACTER FACTIONS ---
+    (r'뽀이뿨이\s?poi', "POI (Korea)"),
+    (r'猛男妙妙屋', "Mengnan (CN)"),
+    (r'烂番茄菜篮子', "Rotten Tomato (CN)"),
+    (r'孤风娱乐', "Gufeng Entertainment"),
+    (r'禁忌边境线', "Forbidden Borderline"),
+    (r'医疗大小姐', "Medical Miss"),
+    (r'土豆服务器', "Potato Server (CN)"),
+    (r'ナツ', "Natsu"),
+    (r'诗人\s?rpg', "Poet RPG"),
+    (r'缅北腰花', "Myanmar Kidney Assoc"),
+    (r'大布笑传', "Dabu Laughing"),
+    (r'柚子', "Youzi"),
+    (r'离离原上咪', "Lili Plain"),
+)
+
+# 命中即删除的噪声词（地区、模式、难度、配置描述等）
+KILL_PATTERNS = (
+    r'\b(us|eu|cn|ru|de|au|uk|fr|jp|kr|tw|sg|br|es|th|vn|nl)\b',
+    r'\b(east|west|north|south|central|global|international)\b',
+    r'\b(dallas|seattle|miami|chicago|new\s?york|london|tokyo|santiago|montreal|sydney|paris|frankfurt|singapore|los\s?angeles)\b',
+    r'\btakeover\b', r'\bstandby\b', r'\bidle\b', r'\bafk\b',
+    r'\branked\b', r'\bunranked\b', r'\bwhitelist(?:ed)?\b', r'\bprivate\b',
+    r'\bpassword(?:ed)?\b', r'\bpublic\b', r'\bdedicated\b', r'\bofficial\b',
+    r'\bby\b',
+    r'\bendless\b', r'\bsurvival\b', r'\bobjective\b', r'\bholdout\b', r'\bversus\b',
+    r'\bweekly\b', r'\boutbreak\b', r'\bwave\b', r'\bclassic\b',
+    r'\bcd\b', r'\bcontrolled\s?difficulty\b', r'\bprecision\b', r'\bspam\b',
+    r'\bzerg\s?mode\b',
+    r'\bhoe\+{0,4}\b', r'\bhell\s?on\s?earth\b', r'\bsuicidal\b', r'\bhard\b',
+    r'\bnormal\b', r'\bbeginner\b', r'\bgod\s?mode\b', r'\bdifficulty\b',
+    r'\bextreme\b', r'\binsane\b', r'\bvery\b',
+    r'\btick(?:rate)?\b', r'\bhz\b', r'\bfps\b', r'\bm\.2\b', r'\bssd\b', r'\bnvme\b',
+    r'\blow\s?ping\b', r'\bfast\s?dl\b', r'\bredirect\b', r'\blatency\b',
+    r'\bslot\b', r'\bplayer\b', r'\b\d{1,3}p\b',
+    r'\bcustom\b', r'\bmap(?:s)?\b', r'\bvanilla\b', r'\bworkshop\b',
+    r'\brpg(?:mod)?\b', r'\bzedternal(?:reborn)?\b', r'\breborn\b',
+    r'\bno\s?edars?\b', r'\bno\s?qps?\b', r'\bmax\s?spawn\b',
+    r'\bweapon(?:s)?\b', r'\bzed(?:s)?\b', r'\bdlc\b', r'\bshared\b',
+    r'\bperk(?:s)?\b', r'\blevel(?:s)?\b', r'\blvl\b', r'\bxp\b', r'\bprestige\b',
+    r'\bdosh\b', r'\bvault\b', r'\bfriendly\s?fire\b', r'\bff\b',
+    r'\brampage(?:mod)?\b', r'\band\s?more\b',
+    r'\bkilling floor 2(?: server)?\b', r'\bkf2(?: server)?\b', r'\bserver\b',
+    r'\blong\b', r'\bshort\b', r'\bmedium\b', r'\bauto\b', r'\breset\b', r'\bnew\b'
+)
+
+GEO_PATTERN = re.compile(r'\b(us|eu|cn|ru|de|au|uk|fr|jp|kr|tw|sg|br|es|th|vn|nl)\b', re.IGNORECASE)
+DOMAIN_PATTERN = re.compile(r'([a-zA-Z0-9-]{2,})\.(com|net|org|tk|ru|de|eu|gg|host|cloud|xyz|info)\b')
+WEB_TRASH_PATTERN = re.compile(r'https?://\S+|www\.\S+|discord\.gg/\S+')
+TLD_PATTERN = re.compile(r'\.(com|net|org|tk|ru|de|eu|gg|host|cloud|xyz|info)\b')
+QQ_PATTERN = re.compile(r'\bqq\d+\b')
+UUID_PATTERN = re.compile(r'#[a-f0-9-]{10,}')
+HASH_NUMBER_PATTERN = re.compile(r'#\d+')
+NUMBER_PATTERN = re.compile(r'\b\d+\b')
+PUNCT_PATTERN = re.compile(r'[^\w\s]')
+SPACE_PATTERN = re.compile(r'\s+')
+PIPE_TABLE = str.maketrans({'¦': '|', '｜': '|', '│': '|'})
+
+
+def get_fallback_country(raw_name):
+    match = GEO_PATTERN.search(raw_name)
+    if match:
+        return f"Unknown [{match.group(1).upper()}]"
+    return "Unknown"
+
+
+def extract_domain_name(raw_name):
+    match = DOMAIN_PATTERN.search(raw_name.lower())
+    if match:
+        return match.group(1).title()
+    return None
+
+
+class FactionClassifier:
+    """
+    服务器名 -> 运营方名称
+
+    VIP 模式合并为一个交替正则做单次预筛：绝大多数服务器名一次 search 即可排除，
+    只有命中时才按优先级逐个确认，保证与逐条匹配的结果完全一致。
+
+    Args:
+        vip_patterns: (正则, 派系名) 序列，按优先级排列
+        kill_patterns: 噪声词正则序列
+        memo_size: LRU 缓存条目上限（0 表示不缓存）
+    """
+
+    def __init__(self, vip_patterns=VIP_PATTERNS, kill_patterns=KILL_PATTERNS, memo_size=16384):
+        self.vip = [(re.compile(pattern), faction) for pattern, faction in vip_patterns]
+        self.vip_any = re.compile("|".join(f"(?:{pattern})" for pattern, _ in vip_patterns))
+        self.kill = re.compile("|".join(kill_patterns))
+        self.classify = lru_cache(maxsize=memo_size)(self._classify) if memo_size else self._classify
+
+    def cache_info(self):
+        """LRU 命中统计（未启用缓存时为 None）"""
+        return self.classify.cache_info() if hasattr(self.classify, 'cache_info') else None
+
+    def _match_vip(self, name):
+        if not self.vip_any.search(name):
+            return None
+        for pattern, faction in self.vip:
+            if pattern.search(name):
+                return faction
+        return None
+
+    def _classify(self, raw_name, ip_address):
+        if not raw_name: return ip_address
+        name = raw_name.lower()
+
+        # --- 0. VIP LIST ---
+        faction = self._match_vip(name)
+        if faction:
+            return faction
+
+        # --- 0.5 DOMAIN RESCUE ---
+        domain_faction = extract_domain_name(raw_name)
+        if domain_faction:
+            return domain_faction
+
+        # --- 1. REMOVE WEB TRASH ---
+        name = WEB_TRASH_PATTERN.sub('', name)
+        name = TLD_PATTERN.sub('', name)
+        name = QQ_PATTERN.sub('', name)
+
+        # --- 2. REMOVE UUIDs ---
+        name = UUID_PATTERN.sub('', name)
+
+        # --- 2.5 EARLY PIPE SPLIT (ENHANCED) ---
+        # Normalize weird pipes to standard pipe
+        name = name.translate(PIPE_TABLE)
+        if '|' in name:
+            name = name.split('|')[0]
+
+        # --- 3. THE KILL LIST ---
+        name = self.kill.sub(' ', name)
+
+        # --- 4. CLEANUP ---
+        name = HASH_NUMBER_PATTERN.sub(' ', name)
+        name = NUMBER_PATTERN.sub(' ', name)
+        name = PUNCT_PATTERN.sub(' ', name)
+        name = SPACE_PATTERN.sub(' ', name).strip()
+
+        # --- 5. THE FAILSAFE ---
+        if len(name) < 2:
+            fallback = get_fallback_country(raw_name)
+            if fallback != "Unknown":
+                return fallback
+            return f"{ip_address}"
+
+        return name.title()
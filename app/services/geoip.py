@@ -0,0 +1,190 @@
+"""
+GeoIP 区间索引
+将 ip_ranges 一次性载入内存中的有序数组，用二分查找代替每台服务器一次的数据库查询
+
+二进制文件格式（小端序，由 import_geoip.py 生成，可被多个进程以 mmap 共享）：
+  header  : magic(8s) range_count(I) name_count(I)
+  ends    : range_count × uint32   ip_to，升序
+  labels  : range_count × uint32   names 下标
+  offsets : (name_count + 1) × uint32   names 在 blob 中的起止偏移
+  blob    : UTF-8 编码的位置字符串
+"""
+import ipaddress
+import mmap
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+
+UNKNOWN_LOCATION = "Unknown"
+
+BINARY_MAGIC = b'KFGEOIP1'
+BINARY_HEADER = struct.Struct('<8sII')
+
+# meta_kv 中 ip_ranges 的版本号，每次导入时更新，常驻的采集器据此重新载入索引
+GEOIP_VERSION_KEY = 'geoip_version'
+
+
+def format_location(city_name, country_code):
+    """与原 SQL 查询相同的显示格式：'City, CC' / 'CC' / 'Unknown'"""
+    if city_name and country_code:
+        return f"{city_name}, {country_code}"
+    if country_code:
+        return country_code
+    return UNKNOWN_LOCATION
+
+
+def _swapped(buf):
+    """大端机器上将小端 uint32 缓冲区转换为本机 array"""
+    arr = array('I')
+    arr.frombytes(buf)
+    arr.byteswap()
+    return arr
+
+
+class GeoIPIndex:
+    """
+    内存 GeoIP 索引
+
+    ends 为按升序排列的 ip_to（array('I')，每个区间 4 字节），
+    labels 为对应区间在 names 中的下标，names 中每个位置字符串只保存一份。
+    查找语义与原 SQL 相同：取第一个 ip_to >= ip 的区间。
+    """
+
+    def __init__(self, ends, labels, names):
+        self.ends = ends
+        self.labels = labels
+        self.names = names
+        self.memo = {}
+
+    def __len__(self):
+        return len(self.ends)
+
+    @classmethod
+    def from_rows(cls, rows):
+        """由 (ip_to, city_name, country_code) 行构建索引"""
+        builder = GeoIPBuilder()
+        for ip_to, city_name, country_code in rows:
+            builder.add(ip_to, city_name, country_code)
+        return builder.build()
+
+    @classmethod
+    def load(cls, cur, batch_size=50000):
+        """从 ip_ranges 表分批读取并构建索引"""
+        cur.execute("SELECT ip_to, city_name, country_code FROM ip_ranges ORDER BY ip_to")
+
+        def rows():
+            while True:
+                batch = cur.fetchmany(batch_size)
+                if not batch:
+                    return
+                for row in batch:
+                    yield row['ip_to'], row['city_name'], row['country_code']
+
+        return cls.from_rows(rows())
+
+    @classmethod
+    def from_file(cls, path):
+        """
+        以 mmap 方式打开二进制索引文件
+
+        区间数组直接引用映射页（只读、进程间共享），不会复制到各进程堆内存中；
+        只有体积很小的 names 表会被解码。
+        """
+        with open(path, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, range_count, name_count = BINARY_HEADER.unpack_from(mm, 0)
+        if magic != BINARY_MAGIC:
+            mm.close()
+            raise ValueError(f"{path}: not a GeoIP index file")
+
+        view = memoryview(mm)
+        pos = BINARY_HEADER.size
+        size = range_count * 4
+        ends = view[pos:pos + size]
+        labels = view[pos + size:pos + 2 * size]
+        pos += 2 * size
+        offsets = array('I')
+        offsets.frombytes(view[pos:pos + (name_count + 1) * 4])
+        pos += (name_count + 1) * 4
+        if sys.byteorder == 'little':
+            ends = ends.cast('I')
+            labels = labels.cast('I')
+        else:
+            ends, labels = _swapped(ends), _swapped(labels)
+            offsets.byteswap()
+        names = [bytes(view[pos + offsets[i]:pos + offsets[i + 1]]).decode('utf-8') for i in range(name_count)]
+        return cls(ends, labels, names)
+
+    def to_file(self, path):
+        """写出二进制索引文件（先写临时文件再原子替换，读取方不会看到半成品）"""
+        blobs = [name.encode('utf-8') for name in self.names]
+        offsets = array('I', [0])
+        for blob in blobs:
+            offsets.append(offsets[-1] + len(blob))
+        ends = array('I', self.ends)
+        labels = array('I', self.labels)
+        if sys.byteorder != 'little':
+            for arr in (ends, labels, offsets):
+                arr.byteswap()
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(BINARY_HEADER.pack(BINARY_MAGIC, len(ends), len(self.names)))
+            ends.tofile(f)
+            labels.tofile(f)
+            offsets.tofile(f)
+            f.write(b''.join(blobs))
+        os.replace(tmp_path, path)
+
+    def lookup(self, ip_str):
+        """
+        解析 IP 的位置，结果按 IP 缓存
+
+        Returns:
+            str: 'City, CC' / 'CC' / 'Unknown'
+        """
+        location = self.memo.get(ip_str)
+        if location is not None:
+            return location
+        try:
+            ip_int = int(ipaddress.IPv4Address(ip_str))
+        except ValueError:
+            location = UNKNOWN_LOCATION
+        else:
+            pos = bisect_left(self.ends, ip_int)
+            location = self.names[self.labels[pos]] if pos < len(self.ends) else UNKNOWN_LOCATION
+        self.memo[ip_str] = location
+        return location
+
+
+class GeoIPBuilder:
+    """逐行累积区间并构建 GeoIPIndex（导入时可一边 COPY 一边构建，无需保留原始行）"""
+
+    def __init__(self):
+        self.ends = array('I')
+        self.labels = array('I')
+        self.names = []
+        self.interned = {}
+        self.ordered = True
+
+    def add(self, ip_to, city_name, country_code):
+        name = format_location(city_name, country_code)
+        idx = self.interned.get(name)
+        if idx is None:
+            idx = self.interned[name] = len(self.names)
+            self.names.append(name)
+        ip_to = int(ip_to)
+        if self.ends and ip_to < self.ends[-1]:
+            self.ordered = False
+        self.ends.append(ip_to)
+        self.labels.append(idx)
+
+    def build(self):
+        ends, labels = self.ends, self.labels
+        if not self.ordered:
+            order = sorted(range(len(ends)), key=ends.__getitem__)
+            ends = array('I', (ends[i] for i in order))
+            labels = array('I', (labels[i] for i in order))
+        return GeoIPIndex(ends, labels, self.names)
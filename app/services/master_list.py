@@ -0,0 +1,166 @@
+"""
+Steam 主服务器列表
+流式下载 IGameServersService/GetServerList 的响应，边接收边提取 "addr" 字段，
+不把整份 JSON 解码进内存；最近一次成功的列表缓存在磁盘上（带 TTL），
+接口失败或超时时回退到缓存，并与上一份列表比较，给出新增与消失的地址
+"""
+import json
+import os
+import re
+import time
+
+import requests
+
+# JSON 字符串中的引号一定被转义为 \"，所以服务器名等字段里不可能出现未转义的 "addr":"
+ADDR_PATTERN = re.compile(rb'"addr"\s*:\s*"([^"\\]+)"')
+# 跨块保留的尾部长度，须大于一次完整匹配的最大长度
+_TAIL = 64
+# 完整响应的结尾：{"response":{"servers":[...]}} 或没有服务器时的 {"response":{}}
+_COMPLETE_ENDINGS = (b']}}', b'{}}')
+_WHITESPACE = re.compile(rb'\s+')
+
+
+class MasterListUnavailable(Exception):
+    """接口失败，且没有在 TTL 内的缓存可用"""
+
+
+def iter_addresses(chunks):
+    """
+    从响应的原始字节块中逐个产出地址
+
+    Args:
+        chunks: bytes 块的可迭代对象（如 Response.iter_content()）
+    Yields:
+        str: "ip:query_port"
+    Raises:
+        ValueError: 响应不完整（JSON 未闭合）
+    """
+    tail = b''
+    for chunk in chunks:
+        if not chunk:
+            continue
+        buf = tail + chunk
+        end = 0
+        for match in ADDR_PATTERN.finditer(buf):
+            yield match.group(1).decode('ascii', 'replace')
+            end = match.end()
+        # 保留可能延续到下一块的不完整匹配
+        tail = buf[max(end, len(buf) - _TAIL):]
+    if not _WHITESPACE.sub(b'', tail).endswith(_COMPLETE_ENDINGS):
+        raise ValueError("truncated master list response")
+
+
+class MasterList:
+    """
+    主服务器列表
+
+    Args:
+        url: GetServerList 的完整 URL（含 key、limit 与 filter）
+        cache_path: 磁盘缓存文件路径，None 表示不缓存
+        cache_ttl: 缓存可作为回退的最长时间（秒）
+        timeout: 整个下载的时间预算（秒），超出即视为失败
+
+    实例在多次扫描之间复用，保存上一份列表用于比较；进程内还没有上一份列表时
+    （单次运行的 cron / 容器模式每次都是如此）与磁盘缓存中的列表比较。
+    """
+
+    def __init__(self, url, cache_path=None, cache_ttl=1800, timeout=20):
+        self.url = url
+        self.cache_path = cache_path
+        self.cache_ttl = cache_ttl
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.addrs = None
+
+    def fetch(self):
+        """
+        下载并解析完整列表
+
+        Returns:
+            list: 去重后的地址，保持接口返回的顺序
+        """
+        deadline = time.monotonic() + self.timeout
+        with self.session.get(self.url, stream=True, timeout=(5, self.timeout)) as r:
+            r.raise_for_status()
+
+            def chunks():
+                for chunk in r.iter_content(chunk_size=65536):
+                    if time.monotonic() > deadline:
+                        raise TimeoutError(f"master list download exceeded {self.timeout}s")
+                    yield chunk
+
+            return list(dict.fromkeys(iter_addresses(chunks())))
+
+    def load_cache(self):
+        """
+        Returns:
+            tuple: (addrs, fetched_at)；没有缓存或缓存损坏时为 None
+        """
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return None
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return data['addrs'], data['fetched_at']
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def save_cache(self, addrs):
+        """原子写入缓存文件（先写临时文件再替换）"""
+        if not self.cache_path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.cache_path)), exist_ok=True)
+        tmp_path = f"{self.cache_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'fetched_at': time.time(), 'addrs': addrs}, f)
+        os.replace(tmp_path, self.cache_path)
+
+    def refresh(self):
+        """
+        获取本周期的列表（接口优先，失败时回退到缓存）并与上一份比较
+
+        Returns:
+            dict: addrs（完整列表）、added / removed（相对上一份的变化）、
+                  source（'api' 或 'cache'）、age（列表的年龄，秒）、error（回退原因）、
+                  initial（内存与磁盘中都没有上一份列表，此时 removed 无参考价值）
+        Raises:
+            MasterListUnavailable: 接口失败且缓存不存在或已超过 TTL
+        """
+        previous = self.addrs
+        if previous is None:
+            # 须在下载成功覆盖缓存之前读取
+            cached = self.load_cache()
+            if cached is not None:
+                previous = set(cached[0])
+
+        source, age, error = 'api', 0.0, None
+        try:
+            addrs = self.fetch()
+        except (requests.RequestException, OSError, ValueError) as e:
+            cached = self.load_cache()
+            if cached is None:
+                raise MasterListUnavailable(str(e)) from e
+            addrs, fetched_at = cached
+            age = time.time() - fetched_at
+            if age > self.cache_ttl:
+                raise MasterListUnavailable(f"{e} (cached list is {age:.0f}s old)") from e
+            source, error = 'cache', str(e)
+        else:
+            try:
+                self.save_cache(addrs)
+            except OSError as e:
+                print(f"[WARN] Master list cache not written: {e}")
+
+        initial = previous is None
+        previous = previous or set()
+        current = set(addrs)
+        self.addrs = current
+        return {
+            'addrs': addrs,
+            'added': [a for a in addrs if a not in previous],
+            'removed': [a for a in previous if a not in current],
+            'source': source,
+            'age': age,
+            'error': error,
+            'initial': initial,
+        }
@@ -0,0 +1,221 @@
+"""
+扫描流水线
+探测线程中的事件循环把应答逐个放入有界队列，采集主线程按微批次取出，
+再按 server_id 分片交给多个写库线程并行写入，网络探测与数据库写入因此可以重叠进行
+"""
+import asyncio
+import queue
+import threading
+import time
+
+
+class ResultStream:
+    """
+    有界的生产者/消费者通道
+
+    Args:
+        maxsize: 队列容量；写入端跟不上时，生产者在 put() 中等待（背压），
+                 等待期间其他探测照常进行
+
+    生产者（事件循环）调用 await put(item)，结束时调用 close()；
+    消费者迭代 batches()。消费者出错时调用 abort()，此后放入的结果被丢弃，生产者不会被阻塞。
+    """
+
+    _DONE = object()
+    STALL_POLL = 0.005
+
+    def __init__(self, maxsize=1000):
+        self._queue = queue.Queue(max(1, int(maxsize)))
+        self._aborted = threading.Event()
+        self.error = None
+        self.stalls = 0
+
+    async def put(self, item):
+        stalled = False
+        while not self._aborted.is_set():
+            try:
+                self._queue.put_nowait(item)
+                return
+            except queue.Full:
+                # 轮询而不是占用线程阻塞在 put() 上，保证 abort() 总能释放生产者
+                if not stalled:
+                    stalled = True
+                    self.stalls += 1
+                await asyncio.sleep(self.STALL_POLL)
+
+    def close(self, error=None):
+        """生产者结束（error 为探测线程中的异常，由 batches() 重新抛出）"""
+        self.error = error
+        if not self._aborted.is_set():
+            self._queue.put(self._DONE)
+
+    def abort(self):
+        """消费者放弃：丢弃已排队的结果，并让后续 put() 直接返回"""
+        self._aborted.set()
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                return
+
+    def batches(self, size, max_wait):
+        """
+        按微批次产出结果
+
+        每批在第一个结果到达后最多再等 max_wait 秒，或凑满 size 个即交付；
+        生产者结束后返回，若探测失败则抛出其异常。
+        """
+        done = False
+        while not done:
+            item = self._queue.get()
+            if item is self._DONE:
+                break
+            batch = [item]
+            deadline = time.monotonic() + max_wait
+            while len(batch) < size:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is self._DONE:
+                    done = True
+                    break
+                batch.append(item)
+            yield batch
+        if self.error is not None:
+            raise self.error
+
+
+def start_producer(stream, produce, name="a2s-probe"):
+    """
+    在后台线程中运行 produce(stream)，结束（或出错）时关闭 stream
+
+    Returns:
+        threading.Thread: 已启动的线程，调用方负责 join()
+    """
+    def run():
+        error = None
+        try:
+            produce(stream)
+        except Exception as e:
+            error = e
+        finally:
+            stream.close(error)
+
+    thread = threading.Thread(target=run, name=name, daemon=True)
+    thread.start()
+    return thread
+
+
+class ShardedWriter:
+    """
+    按分片键并行写库：每个分片一个线程、一个连接池连接、一个事务
+
+    Args:
+        db: Database 实例（线程本地连接，每个分片线程各取一个）
+        shards: 分片数
+        write: write(cur, items) -> 任意结果，在分片线程中按提交顺序调用
+        key: key(item) -> int，同一个键总是落在同一分片
+        finalize: 可选的 finalize(cur, results)，finish() 时在所有分片写完之后、提交之前，
+                  于 0 号分片的事务中调用一次（results 为所有分片 write() 的返回值），
+                  用于跨分片的收尾写入，使其与各分片一起提交
+
+    一致性模型：所有分片在 finish() 时一起决定——全部分片的写入（及 finalize）都成功才各自 COMMIT，
+    任一分片失败则全部 ROLLBACK。唯一的非原子窗口是 COMMIT 本身失败（此时已提交的分片保留）。
+    分片之间的键互不相交，分片内部由调用方按键排序写入，因此分片之间不会互相等待行锁；
+    finalize 在其余分片都写完后才执行，可以写入各分片共享的行。
+    """
+
+    _DONE = object()
+
+    def __init__(self, db, shards, write, key, finalize=None):
+        self.db = db
+        self.write = write
+        self.key = key
+        self.finalize = finalize
+        self.shards = max(1, int(shards))
+        self._queues = [queue.Queue() for _ in range(self.shards)]
+        self._ready = [threading.Event() for _ in range(self.shards)]
+        self._decided = threading.Event()
+        self._commit = False
+        self._finishing = False
+        self._results = [[] for _ in range(self.shards)]
+        self._errors = [None] * self.shards
+        self._threads = [threading.Thread(target=self._run, args=(i,), name=f"db-shard-{i}", daemon=True)
+                         for i in range(self.shards)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, items):
+        """按键分发一批条目（不阻塞）"""
+        parts = [[] for _ in range(self.shards)]
+        for item in items:
+            parts[self.key(item) % self.shards].append(item)
+        for index, part in enumerate(parts):
+            if part:
+                self._queues[index].put(part)
+
+    def _run(self, index):
+        db = self.db
+        try:
+            with db.cursor() as cur:
+                while True:
+                    items = self._queues[index].get()
+                    if items is self._DONE:
+                        break
+                    if self._errors[index] is None and not self._decided.is_set():
+                        self._results[index].append(self.write(cur, items))
+                if index == 0 and self.finalize is not None and self._finishing:
+                    for ready in self._ready[1:]:
+                        ready.wait()
+                    if not any(self._errors):
+                        self.finalize(cur, [result for results in self._results for result in results])
+        except Exception as e:
+            self._errors[index] = e
+        finally:
+            self._ready[index].set()
+            self._decided.wait()
+            try:
+                if self._commit and self._errors[index] is None:
+                    db.commit()
+                else:
+                    db.rollback()
+            except Exception as e:
+                self._errors[index] = self._errors[index] or e
+            finally:
+                db.close()
+
+    def _decide(self, commit):
+        for q in self._queues:
+            q.put(self._DONE)
+        for ready in self._ready:
+            ready.wait()
+        self._commit = commit and not any(self._errors)
+        self._decided.set()
+        for thread in self._threads:
+            thread.join()
+
+    def check(self):
+        """若已有分片失败则立即抛出其异常（供调用方尽早放弃本次扫描）"""
+        for error in self._errors:
+            if error is not None:
+                raise error
+
+    def finish(self):
+        """
+        等待所有分片写完（并执行 finalize）后一起提交
+
+        Returns:
+            list: 所有分片 write() 的返回值
+        Raises:
+            第一个分片异常（此时所有分片均已回滚，或在 COMMIT 阶段失败）
+        """
+        self._finishing = True
+        self._decide(True)
+        self.check()
+        return [result for results in self._results for result in results]
+
+    def abort(self):
+        """放弃本次扫描：未写完的条目被丢弃，所有分片回滚"""
+        if not self._decided.is_set():
+            self._decide(False)
@@ -0,0 +1,98 @@
+"""
+公网 IP 识别
+用于把本机托管的服务器改为经由回环地址探测。配置了固定 IP 时从不发起外部请求；
+否则结果缓存到磁盘（带 TTL），过期或缺失时在后台线程中刷新，扫描从不等待外部请求
+"""
+import ipaddress
+import json
+import os
+import threading
+import time
+
+import requests
+
+DEFAULT_URL = 'https://ifconfig.me/ip'
+
+
+class PublicIPResolver:
+    """
+    Args:
+        configured: 配置中固定的公网 IP，非空时直接使用
+        cache_path: 磁盘缓存文件路径，None 表示只缓存在内存中
+        ttl: 缓存有效期（秒），过期后仍先返回旧值，同时在后台刷新
+        url: 返回纯文本 IP 的查询地址
+        timeout: 外部请求超时（秒）
+    """
+
+    def __init__(self, configured=None, cache_path=None, ttl=86400, url=DEFAULT_URL, timeout=5):
+        self.configured = (configured or '').strip() or None
+        self.cache_path = cache_path
+        self.ttl = ttl
+        self.url = url
+        self.timeout = timeout
+        self.ip = None
+        self.resolved_at = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = None
+        if not self.configured:
+            self._load_cache()
+
+    @staticmethod
+    def _valid(ip):
+        """规范化的 IP 字符串；不是合法 IP（如错误页、门户页面）时返回 None"""
+        try:
+            return str(ipaddress.ip_address(ip.strip()))
+        except (AttributeError, ValueError):
+            return None
+
+    def _load_cache(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            ip, resolved_at = self._valid(data['ip']), float(data['resolved_at'])
+        except (OSError, ValueError, KeyError, TypeError):
+            return
+        # 损坏或写入了非 IP 内容的缓存视为不存在
+        if ip:
+            self.ip, self.resolved_at = ip, resolved_at
+
+    def _save_cache(self):
+        if not self.cache_path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.cache_path)), exist_ok=True)
+        tmp_path = f"{self.cache_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'ip': self.ip, 'resolved_at': self.resolved_at}, f)
+        os.replace(tmp_path, self.cache_path)
+
+    def _refresh(self):
+        try:
+            r = requests.get(self.url, timeout=self.timeout)
+            r.raise_for_status()
+            ip = self._valid(r.text)
+            if ip is None:
+                print(f"[WARN] Public IP lookup returned no IP address: {r.text[:80]!r}")
+                return
+            with self._lock:
+                self.ip, self.resolved_at = ip, time.time()
+            self._save_cache()
+        except Exception as e:
+            print(f"[WARN] Public IP lookup failed: {e}")
+
+    def current(self):
+        """
+        立即返回已知的公网 IP（可能为 None），缓存缺失或过期时启动后台刷新
+
+        Returns:
+            str: 公网 IP，尚未识别时为 None
+        """
+        if self.configured:
+            return self.configured
+        with self._lock:
+            stale = self.ip is None or time.time() - self.resolved_at >= self.ttl
+            if stale and (self._refreshing is None or not self._refreshing.is_alive()):
+                self._refreshing = threading.Thread(target=self._refresh, name="public-ip", daemon=True)
+                self._refreshing.start()
+            return self.ip
@@ -0,0 +1,155 @@
+"""
+分层扫描调度器
+按服务器最近的玩家数与可达性决定探测频率：
+有玩家的服务器频繁探测，空服较少探测，不可达的服务器指数退避
+"""
+from datetime import timedelta
+
+TIER_POPULATED = 'populated'
+TIER_EMPTY = 'empty'
+TIER_UNREACHABLE = 'unreachable'
+
+
+class _Entry:
+    """单个服务器（"ip:query_port"）的调度状态"""
+    __slots__ = ('tier', 'next_due', 'failures', 'player_count')
+
+    def __init__(self, tier, next_due, failures=0, player_count=0):
+        self.tier = tier
+        self.next_due = next_due
+        self.failures = failures
+        self.player_count = player_count
+
+
+class ScanScheduler:
+    """
+    分层扫描调度器
+
+    Args:
+        populated_interval: 有玩家服务器的探测间隔（秒）
+        empty_interval: 空服的探测间隔（秒）
+        backoff_base: 不可达服务器首次退避时间（秒），之后每次失败翻倍
+        backoff_max: 退避时间上限（秒）
+        slack: 提前量（秒），避免与扫描周期对齐时因毫秒误差错过一个周期
+    """
+
+    def __init__(self, populated_interval=60, empty_interval=600,
+                 backoff_base=120, backoff_max=21600, slack=5):
+        self.populated_interval = timedelta(seconds=populated_interval)
+        self.empty_interval = timedelta(seconds=empty_interval)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.slack = timedelta(seconds=slack)
+        self.entries = {}
+        self.seeded = False
+
+    def seed(self, rows, now):
+        """
+        用 dim_servers 的已知状态初始化（冷启动时调用一次）
+
+        Args:
+            rows: 包含 ip_address, query_port, player_count, last_seen 的行
+            now: 当前扫描时间
+        """
+        for row in rows:
+            addr = f"{row['ip_address']}:{row['query_port']}"
+            last_seen = row['last_seen']
+            player_count = row['player_count'] or 0
+            if player_count > 0 or last_seen is None:
+                continue  # due immediately, same as an unknown server
+            next_due = last_seen + self.empty_interval
+            if next_due > now:
+                self.entries[addr] = _Entry(TIER_EMPTY, next_due)
+        self.seeded = True
+
+    def split(self, addrs, now, removed=None):
+        """
+        将主列表地址分为本周期需要探测与跳过的两组
+
+        Args:
+            removed: 自上次以来离开主列表的地址；为 None 时与完整列表比对
+        Returns:
+            tuple: (due, skipped)，均为地址列表
+        """
+        # Forget servers that have left the master list
+        if removed is None:
+            listed = set(addrs)
+            removed = [a for a in self.entries if a not in listed]
+        for addr in removed:
+            self.entries.pop(addr, None)
+
+        horizon = now + self.slack
+        due, skipped = [], []
+        for addr in addrs:
+            entry = self.entries.get(addr)
+            if entry is None or entry.next_due <= horizon:
+                due.append(addr)
+            else:
+                skipped.append(addr)
+        return due, skipped
+
+    def record(self, probed, responses, now):
+        """
+        记录本周期的探测结果并安排下一次探测时间
+
+        Args:
+            probed: 本周期探测的地址列表
+            responses: {addr: player_count}，仅包含有响应的服务器
+            now: 本次扫描时间
+        """
+        for addr in probed:
+            entry = self.entries.get(addr)
+            if addr in responses:
+                player_count = responses[addr]
+                if player_count > 0:
+                    tier, interval = TIER_POPULATED, self.populated_interval
+                else:
+                    tier, interval = TIER_EMPTY, self.empty_interval
+                if entry is None:
+                    self.entries[addr] = _Entry(tier, now + interval, 0, player_count)
+                else:
+                    entry.tier = tier
+                    entry.next_due = now + interval
+                    entry.failures = 0
+                    entry.player_count = player_count
+            else:
+                failures = entry.failures + 1 if entry else 1
+                backoff = min(self.backoff_max, self.backoff_base * 2 ** (failures - 1))
+                self.entries[addr] = _Entry(TIER_UNREACHABLE, now + timedelta(seconds=backoff), failures, 0)
+
+    def carried_totals(self, skipped):
+        """
+        跳过的服务器中仍视为在线的部分（空服层），用于全局统计
+
+        Returns:
+            tuple: (servers, players)
+        """
+        servers = players = 0
+        for addr in skipped:
+            entry = self.entries.get(addr)
+            if entry is not None and entry.tier != TIER_UNREACHABLE:
+                servers += 1
+                players += entry.player_count
+        return servers, players
+
+    def fresh(self, skipped):
+        """
+        跳过的服务器中最近一次应答仍在所属层探测间隔内的部分（有玩家层与空服层），
+        这些服务器本周期未探测，不能判定为失联；不可达层已探测失败，不在其中
+
+        Returns:
+            list: 地址列表
+        """
+        fresh = []
+        for addr in skipped:
+            entry = self.entries.get(addr)
+            if entry is not None and entry.tier != TIER_UNREACHABLE:
+                fresh.append(addr)
+        return fresh
+
+    def tier_counts(self):
+        """各层的服务器数量"""
+        counts = {TIER_POPULATED: 0, TIER_EMPTY: 0, TIER_UNREACHABLE: 0}
+        for entry in self.entries.values():
+            counts[entry.tier] += 1
+        return counts
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+A2S 回包解析基准：逐字段切片的旧实现 vs. a2s_parser（unpack_from + 单次 find/decode）
+
+Usage:
+  python benchmarks/bench_a2s_parser.py [--file packets.txt] [--servers 5000] [--rounds 5]
+
+默认生成与线上相近的回包语料（每个服务器一个 S2A_INFO 与一个 S2A_PLAYER，0~12 名玩家，
+含中日韩名字与无名玩家）；也可用 --file 指定抓包得到的回包，每行一个数据报的十六进制。
+同时逐条校验新旧实现输出一致（旧实现读取 EDF 的位置有误，game_port 不参与比较）。
+"""
+import os
+import random
+import struct
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.a2s_parser import parse_info, parse_players
+
+S2A_INFO = b"\xff\xff\xff\xff\x49"
+S2A_PLAYER = b"\xff\xff\xff\xff\x44"
+NAMES = ["Player", "Zed Slayer", "醫療兵", "ナツ", "뽀이뿨이", "  ", "", "[KF]Berserker_99", "Σωτήρης"]
+
+
+# --- Reference: the parser as it was in app/services/a2s.py ---
+def legacy_read_string(data, pos):
+    try:
+        end = data.find(b'\x00', pos)
+        if end == -1: return "", pos
+        return data[pos:end].decode('utf-8', errors='ignore'), end + 1
+    except: return "Unknown", pos + 1
+
+
+def legacy_parse_info(resp, results):
+    if not resp.startswith(S2A_INFO):
+        return False
+
+    name, pos = legacy_read_string(resp, 6)
+    map_name, pos = legacy_read_string(resp, pos)
+    folder, pos = legacy_read_string(resp, pos)
+    game, pos = legacy_read_string(resp, pos)
+
+    pos += 2 # Skip ID
+    if pos < len(resp):
+        results["header_count"] = resp[pos]
+
+    pos += 1
+    if pos < len(resp):
+        edf = resp[pos]
+        pos += 1
+        if edf & 0x80:
+            if pos + 2 <= len(resp):
+                results["game_port"] = struct.unpack('<H', resp[pos:pos+2])[0]
+
+    results["name"] = name
+    results["map"] = map_name
+    return True
+
+
+def legacy_parse_players(resp, ip, query_port):
+    player_list = []
+    if not resp.startswith(S2A_PLAYER) or len(resp) < 6:
+        return player_list
+
+    num = resp[5]
+    pos = 6
+    slot = 0
+    for _ in range(num):
+        if pos >= len(resp): break
+        pos += 1 # Skip Index
+
+        p_name, pos = legacy_read_string(resp, pos)
+
+        if pos + 8 > len(resp): break
+        score, dur = struct.unpack('<if', resp[pos:pos+8])
+        pos += 8
+
+        # Handle Ghost Players
+        clean = p_name.strip() if p_name else ""
+        if not clean:
+            clean = f"[UNNAMED:{ip}:{query_port}:{slot}]"
+
+        player_list.append({"name":clean,"score":score,"dur":dur})
+        slot += 1
+    return player_list
+
+
+def make_corpus(servers, seed=1):
+    rng = random.Random(seed)
+    corpus = []
+    for i in range(servers):
+        players = rng.choice([0, 0, 0, 1, 2, 3, 4, 5, 6, 6, 12])
+        info = (S2A_INFO + b"\x11"
+                + f"KF2 Server #{i} | Hard | Long".encode() + b"\x00"
+                + rng.choice([b"KF-BurningParis", b"KF-Outpost", b"KF-BioticsLab"]) + b"\x00"
+                + b"KFGame\x00Killing Floor 2\x00"
+                + struct.pack('<HBBB', 0, players, 6, 0) + b"dl\x00\x01" + b"1094\x00"
+                + bytes([0x80]) + struct.pack('<H', 7777 + i % 100))
+        packet = bytearray(S2A_PLAYER + bytes([players]))
+        for slot in range(players):
+            name = rng.choice(NAMES) + (str(rng.randint(1, 999)) if rng.random() < 0.5 else "")
+            packet += bytes([slot]) + name.encode() + b"\x00"
+            packet += struct.pack('<if', rng.randint(0, 20000), rng.uniform(0, 7200))
+        corpus.append((f"10.0.{i // 256 % 256}.{i % 256}", 27015, info, bytes(packet)))
+    return corpus
+
+
+def load_corpus(path):
+    corpus = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                packet = bytes.fromhex(line)
+                corpus.append(("0.0.0.0", 0, packet, packet))
+    return corpus
+
+
+def run_legacy(corpus):
+    for ip, port, info, players in corpus:
+        legacy_parse_info(info, {})
+        legacy_parse_players(players, ip, port)
+
+
+def run_parser(corpus):
+    for ip, port, info, players in corpus:
+        parse_info(info)
+        parse_players(players, ip, port)
+
+
+def timed(fn, corpus, rounds):
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn(corpus)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def check(corpus):
+    mismatches = []
+    for ip, port, info, players in corpus:
+        legacy = {"name": None, "map": "", "header_count": 0}
+        if legacy_parse_info(info, legacy):
+            parsed = parse_info(info)
+            got = (parsed[0] or None, parsed[1], parsed[2]) if parsed else (None, "", 0)
+            if got != (legacy["name"] or None, legacy["map"], legacy["header_count"]):
+                mismatches.append(info)
+        expected = [(p["name"], p["score"], p["dur"]) for p in legacy_parse_players(players, ip, port)]
+        if expected != parse_players(players, ip, port):
+            mismatches.append(players)
+    return mismatches
+
+
+def run(corpus, rounds):
+    mismatches = check(corpus)
+    if mismatches:
+        print(f"[!] {len(mismatches)} mismatches, e.g. {[m.hex() for m in mismatches[:3]]}")
+
+    results = {
+        "legacy": timed(run_legacy, corpus, rounds),
+        "a2s_parser": timed(run_parser, corpus, rounds),
+    }
+    for label, timings in results.items():
+        print(f"[*] {label:<11} " + " | ".join(f"{t * 1000:8.1f}ms" for t in timings))
+
+    players = sum(players[5] for _, _, _, players in corpus if players.startswith(S2A_PLAYER) and len(players) > 5)
+    base = sum(results["legacy"]) / rounds
+    avg = sum(results["a2s_parser"]) / rounds
+    print(f"[*] {len(corpus)} servers / {players} players: a2s_parser {avg * 1000:.1f}ms "
+          f"vs legacy {base * 1000:.1f}ms, speedup x{base / avg:.1f}")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    path = args[args.index('--file') + 1] if '--file' in args else None
+    servers = int(args[args.index('--servers') + 1]) if '--servers' in args else 5000
+    rounds = int(args[args.index('--rounds') + 1]) if '--rounds' in args else 5
+    corpus = load_corpus(path) if path else make_corpus(servers)
+    if not corpus:
+        print("[!] Empty corpus")
+        sys.exit(1)
+    run(corpus, rounds)
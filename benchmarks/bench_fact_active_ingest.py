@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+fact_active 写入基准：逐行 UPSERT vs. COPY 暂存 + 单条集合 UPSERT
+
+Usage:
+  python benchmarks/bench_fact_active_ingest.py [--players 10000] [--rounds 3]
+
+在单个事务中用同名临时表遮蔽 fact_active（临时 schema 优先于 public），
+结束时回滚，不会修改真实数据。需要可连接的 PostgreSQL（config.py / 环境变量）。
+"""
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.database import get_database
+import Query
+
+ROW_SQL = """
+    INSERT INTO fact_active (server_id, player_id, map_id, score, duration, calculated_duration, first_seen, last_seen, session_uuid)
+    VALUES (%s, %s, %s, %s, %s, 0, %s, %s, %s)
+    ON CONFLICT(server_id, player_id) DO UPDATE SET
+        score=excluded.score,
+        duration=excluded.duration,
+        calculated_duration=EXTRACT(EPOCH FROM (excluded.last_seen - fact_active.first_seen))::INTEGER,
+        map_id=excluded.map_id,
+        last_seen=excluded.last_seen,
+        session_uuid=excluded.session_uuid
+"""
+
+
+def make_rows(players, players_per_server=12):
+    session = {}
+    rows = []
+    for i in range(players):
+        sid = i // players_per_server + 1
+        if sid not in session:
+            session[sid] = str(uuid.uuid4())
+        rows.append((sid, i + 1, sid % 40 + 1, i % 5000, float(i % 3600), session[sid]))
+    return rows
+
+
+def row_at_a_time(cur, rows, scan_time):
+    for sid, pid, map_id, score, dur, session_uuid in rows:
+        cur.execute(ROW_SQL, (sid, pid, map_id, score, dur, scan_time, scan_time, session_uuid))
+
+
+def bulk(cur, rows, scan_time):
+    Query.upsert_fact_active(cur, rows, scan_time)
+
+
+def run(players, rounds):
+    db = get_database()
+    rows = make_rows(players)
+    results = {}
+    try:
+        with db.cursor() as cur:
+            cur.execute("CREATE TEMP TABLE fact_active (LIKE public.fact_active INCLUDING ALL)")
+            for label, fn in (("row-at-a-time", row_at_a_time), ("bulk", bulk)):
+                timings = []
+                scan_time = datetime.utcnow()
+                cur.execute("TRUNCATE fact_active")
+                for r in range(rounds):
+                    # Round 0 inserts every session, later rounds hit ON CONFLICT DO UPDATE
+                    start = time.perf_counter()
+                    fn(cur, rows, scan_time + timedelta(minutes=r))
+                    timings.append(time.perf_counter() - start)
+                cur.execute("SELECT COUNT(*) AS n, SUM(calculated_duration) AS d FROM fact_active")
+                check = cur.fetchone()
+                results[label] = timings
+                print(f"[*] {label:<14} " + " | ".join(f"{t * 1000:8.1f}ms" for t in timings)
+                      + f"  (rows={check['n']}, sum_duration={check['d']})")
+    finally:
+        db.rollback()
+
+    base = sum(results["row-at-a-time"]) / rounds
+    fast = sum(results["bulk"]) / rounds
+    print(f"[*] {players} players: row-at-a-time {base * 1000:.1f}ms, bulk {fast * 1000:.1f}ms, speedup x{base / fast:.1f}")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    players = int(args[args.index('--players') + 1]) if '--players' in args else 10000
+    rounds = int(args[args.index('--rounds') + 1]) if '--rounds' in args else 3
+    run(players, rounds)
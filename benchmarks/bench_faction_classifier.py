@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+派系识别基准：逐次构建正则的旧实现 vs. 预编译 FactionClassifier（冷启动 / LRU 命中）
+
+Usage:
+  python benchmarks/bench_faction_classifier.py [--file names.tsv] [--rounds 5]
+
+默认从 dim_servers 读取真实服务器名作为语料（需要可连接的 PostgreSQL）；
+也可用 --file 指定语料文件，每行 "服务器名<TAB>IP"（IP 可省略）。
+同时逐条校验新旧实现输出一致。
+"""
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.faction import FactionClassifier
+
+
+# --- Reference: clean_server_name as it was before FactionClassifier ---
+def legacy_fallback_country(raw_name):
+    geo_pattern = r'\b(us|eu|cn|ru|de|au|uk|fr|jp|kr|tw|sg|br|es|th|vn|nl)\b'
+    match = re.search(geo_pattern, raw_name, re.IGNORECASE)
+    if match:
+        return f"Unknown [{match.group(1).upper()}]"
+    return "Unknown"
+
+def legacy_domain_name(raw_name):
+    match = re.search(r'([a-zA-Z0-9-]{2,})\.(com|net|org|tk|ru|de|eu|gg|host|cloud|xyz|info)\b', raw_name.lower())
+    if match:
+        return match.group(1).title()
+    return None
+
+def legacy_clean_server_name(raw_name, ip_address):
+
+    if not raw_name: return ip_address
+    name = raw_name.lower()
+
+    # --- 0. VIP LIST ---
+    VIP_PATTERNS = {
+        r'simpleserver': "SimpleServer (TH)",
+        r'valeria': "Valeria & Friends",
+        r'nekoha': "Nekoha Club",    
+        r'\bbaz\b': "BAz",
+        r'\bkf-?fr\b': "KF-FR",
+        r'\bkf-?br\b': "KF-BR",
+        r'jp\s?\|': "JP Server",
+        r'\bsg-?servers?\b': "SG-Servers",
+        r'\bhuwhyte\b': "Huwhyte",
+        r'\btripwire\b': "Tripwire Official",
+        r'\bbloodhounds\b': "Bloodhounds",
+        r'\bkog\b': "KoG Clan",
+        r'\bcyxc\b': "Cyxc",
+        r'\bamursk\b': "Amursk",
+        r'\bmadhouse\b': "MadHouse",
+        r'\bamerica latina brasil\b': "America Latina Brasil",
+        r'\blarge\s?farva\b': "Large Farva",
+        r'\bpunchguts\b': "Punchguts",
+        r'\bspb-?gs\b': "SPB-GS",
+        r'\bextreme\s?server\b': "Extreme Server",
+        r'\bpowerbits\b': "Powerbits",
+        r'\bwilnet\b': "Wilnet Gaming",
+        r'\bnerdit\b': "Nerdit",
+        r'\bmod-?eu\b': "Mod-EU",
+        r'\bnfo(?:servers)?\b': "NFO Servers",
+        r'\bdslive\b': "DSLive",
+        r'\bzgaming\b': "ZGaming",
+        r'\[kr\]\s+public\s+server': "[KR] Public Server",
+        r'\bkf2\.eu\b': "KF2.eu SuperPerkTraining",
+        r'\btwilight realm\b': "Twilight Realm",
+        r'\bthe alley\b': "The Alley",
+        r'^cd\s?#\d+': "Legs CD",
+        r'the\s?outpost': "The Outpost",
+        r'sora-?iro': "Sora-Iro (JP)", 
+        
+        # --- ASIAN / SPECIAL CHARACTER FACTIONS ---
+        r'뽀이뿨이\s?poi': "POI (Korea)",
+        r'猛男妙妙屋': "Mengnan (CN)",
+        r'烂番茄菜篮子': "Rotten Tomato (CN)",
+        r'孤风娱乐': "Gufeng Entertainment",
+        r'禁忌边境线': "Forbidden Borderline",
+        r'医疗大小姐': "Medical Miss",
+        r'土豆服务器': "Potato Server (CN)",
+        r'ナツ': "Natsu",
+        r'诗人\s?rpg': "Poet RPG",
+        r'缅北腰花': "Myanmar Kidney Assoc",
+        r'大布笑传': "Dabu Laughing",
+        r'柚子': "Youzi",
+        r'离离原上咪': "Lili Plain",
+    }
+
+    for pattern, faction in VIP_PATTERNS.items():
+        if re.search(pattern, name):
+            return faction
+
+    # --- 0.5 DOMAIN RESCUE ---
+    domain_faction = legacy_domain_name(raw_name)
+    if domain_faction:
+        return domain_faction
+
+    # --- 1. REMOVE WEB TRASH ---
+    name = re.sub(r'https?://\S+|www\.\S+|discord\.gg/\S+', '', name)
+    name = re.sub(r'\.(com|net|org|tk|ru|de|eu|gg|host|cloud|xyz|info)\b', '', name)
+    name = re.sub(r'\bqq\d+\b', '', name)
+
+    # --- 2. REMOVE UUIDs ---
+    name = re.sub(r'#[a-f0-9-]{10,}', '', name)
+
+    # --- 2.5 EARLY PIPE SPLIT (ENHANCED) ---
+    # Normalize weird pipes to standard pipe
+    name = name.replace('¦', '|').replace('｜', '|').replace('│', '|')
+    if '|' in name:
+        name = name.split('|')[0]
+
+    # --- 3. THE KILL LIST ---
+    KILL_PATTERNS = [
+        r'\b(us|eu|cn|ru|de|au|uk|fr|jp|kr|tw|sg|br|es|th|vn|nl)\b',
+        r'\b(east|west|north|south|central|global|international)\b',
+        r'\b(dallas|seattle|miami|chicago|new\s?york|london|tokyo|santiago|montreal|sydney|paris|frankfurt|singapore|los\s?angeles)\b',
+        r'\btakeover\b', r'\bstandby\b', r'\bidle\b', r'\bafk\b',
+        r'\branked\b', r'\bunranked\b', r'\bwhitelist(?:ed)?\b', r'\bprivate\b',
+        r'\bpassword(?:ed)?\b', r'\bpublic\b', r'\bdedicated\b', r'\bofficial\b',
+        r'\bby\b', 
+        r'\bendless\b', r'\bsurvival\b', r'\bobjective\b', r'\bholdout\b', r'\bversus\b',
+        r'\bweekly\b', r'\boutbreak\b', r'\bwave\b', r'\bclassic\b',
+        r'\bcd\b', r'\bcontrolled\s?difficulty\b', r'\bprecision\b', r'\bspam\b',
+        r'\bzerg\s?mode\b', 
+        r'\bhoe\+{0,4}\b', r'\bhell\s?on\s?earth\b', r'\bsuicidal\b', r'\bhard\b',
+        r'\bnormal\b', r'\bbeginner\b', r'\bgod\s?mode\b', r'\bdifficulty\b',
+        r'\bextreme\b', r'\binsane\b', r'\bvery\b',
+        r'\btick(?:rate)?\b', r'\bhz\b', r'\bfps\b', r'\bm\.2\b', r'\bssd\b', r'\bnvme\b',
+        r'\blow\s?ping\b', r'\bfast\s?dl\b', r'\bredirect\b', r'\blatency\b',
+        r'\bslot\b', r'\bplayer\b', r'\b\d{1,3}p\b',
+        r'\bcustom\b', r'\bmap(?:s)?\b', r'\bvanilla\b', r'\bworkshop\b',
+        r'\brpg(?:mod)?\b', r'\bzedternal(?:reborn)?\b', r'\breborn\b',
+        r'\bno\s?edars?\b', r'\bno\s?qps?\b', r'\bmax\s?spawn\b',
+        r'\bweapon(?:s)?\b', r'\bzed(?:s)?\b', r'\bdlc\b', r'\bshared\b',
+        r'\bperk(?:s)?\b', r'\blevel(?:s)?\b', r'\blvl\b', r'\bxp\b', r'\bprestige\b',
+        r'\bdosh\b', r'\bvault\b', r'\bfriendly\s?fire\b', r'\bff\b',
+        r'\brampage(?:mod)?\b', r'\band\s?more\b',
+        r'\bkilling floor 2(?: server)?\b', r'\bkf2(?: server)?\b', r'\bserver\b',
+        r'\blong\b', r'\bshort\b', r'\bmedium\b', r'\bauto\b', r'\breset\b', r'\bnew\b'
+    ]
+    
+    name = re.sub("|".join(KILL_PATTERNS), ' ', name)
+
+    # --- 4. CLEANUP ---
+    name = re.sub(r'#\d+', ' ', name) 
+    name = re.sub(r'\b\d+\b', ' ', name) 
+    name = re.sub(r'[^\w\s]', ' ', name) 
+    name = re.sub(r'\s+', ' ', name).strip()
+
+    # --- 5. THE FAILSAFE ---
+    if len(name) < 2:
+        fallback = legacy_fallback_country(raw_name)
+        if fallback != "Unknown":
+            return fallback
+        return f"{ip_address}"
+
+    return name.title()
+
+
+def load_corpus(path):
+    if path:
+        corpus = []
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                line = line.rstrip('\n')
+                if line:
+                    name, _, ip = line.partition('\t')
+                    corpus.append((name, ip or '0.0.0.0'))
+        return corpus
+
+    from app.models.database import get_database
+    db = get_database()
+    with db.cursor() as cur:
+        cur.execute("SELECT name, ip_address FROM dim_servers")
+        corpus = [(row['name'], row['ip_address']) for row in cur.fetchall()]
+    db.commit()
+    return corpus
+
+
+def timed(fn, corpus, rounds):
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for name, ip in corpus:
+            fn(name, ip)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def run(corpus, rounds):
+    cold = FactionClassifier(memo_size=0)
+    memo = FactionClassifier()
+
+    mismatches = [(name, ip) for name, ip in corpus
+                  if legacy_clean_server_name(name, ip) != cold.classify(name, ip)]
+    if mismatches:
+        print(f"[!] {len(mismatches)} mismatches, e.g. {mismatches[:5]}")
+
+    results = {
+        "legacy": timed(legacy_clean_server_name, corpus, rounds),
+        "compiled": timed(cold.classify, corpus, rounds),
+        # Every round after the first is what a scan sees once names have been classified before
+        "compiled+memo": timed(memo.classify, corpus, rounds),
+    }
+    for label, timings in results.items():
+        print(f"[*] {label:<14} " + " | ".join(f"{t * 1000:8.1f}ms" for t in timings))
+
+    base = sum(results["legacy"]) / rounds
+    for label in ("compiled", "compiled+memo"):
+        avg = sum(results[label]) / rounds
+        print(f"[*] {len(corpus)} names: {label} {avg * 1000:.1f}ms vs legacy {base * 1000:.1f}ms, speedup x{base / avg:.1f}")
+    print(f"[*] memo: {memo.cache_info()}")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    path = args[args.index('--file') + 1] if '--file' in args else None
+    rounds = int(args[args.index('--rounds') + 1]) if '--rounds' in args else 5
+    corpus = load_corpus(path)
+    if not corpus:
+        print("[!] Empty corpus")
+        sys.exit(1)
+    run(corpus, rounds)
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+fact_active 会话断档校验：玩家断档后重新出现时必须开始新会话，旧会话原样交给归档
+
+Usage:
+  python benchmarks/check_fact_active_gap.py
+
+在单个事务中用同名临时表遮蔽 fact_active（临时 schema 优先于 public），
+结束时回滚，不会修改真实数据。需要可连接的 PostgreSQL（config.py / 环境变量）。
+发现问题时打印不符的字段，并以状态码 1 退出。
+"""
+import os
+import sys
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.database import get_database
+import Query
+
+SERVER, PLAYER, OTHER, MAP = 1, 1, 2, 1
+
+
+def scan(cur, scan_time, player_ids, session_uuid):
+    """与采集器相同的调用方式：prune_limit = scan_time - PRUNE_THRESHOLD"""
+    prune_limit = scan_time - timedelta(minutes=Query.PRUNE_THRESHOLD)
+    rows = [(SERVER, pid, MAP, 100, 60.0, session_uuid) for pid in player_ids]
+    return Query.upsert_fact_active(cur, rows, scan_time, prune_limit)
+
+
+def active(cur, player_id):
+    cur.execute("""
+        SELECT first_seen, last_seen, calculated_duration, session_uuid FROM fact_active
+        WHERE server_id = %s AND player_id = %s
+    """, (SERVER, player_id))
+    return cur.fetchone()
+
+
+def run():
+    db = get_database()
+    failures = []
+
+    def expect(what, got, expected):
+        if got != expected:
+            failures.append(what)
+            print(f"[!] {what}: expected {expected!r}, got {got!r}")
+
+    t0 = datetime(2026, 1, 1, 20, 0, 0)
+    gap = timedelta(minutes=Query.PRUNE_THRESHOLD * 4)
+    first, second = str(uuid.uuid4()), str(uuid.uuid4())
+    try:
+        with db.cursor() as cur:
+            cur.execute("CREATE TEMP TABLE fact_active (LIKE public.fact_active INCLUDING ALL)")
+
+            # Two consecutive scans: one session of 60 s
+            expect("first scan ends nothing", scan(cur, t0, [PLAYER, OTHER], first), [])
+            expect("second scan ends nothing", scan(cur, t0 + timedelta(minutes=1), [PLAYER, OTHER], first), [])
+            row = active(cur, PLAYER)
+            expect("session duration before the gap", row['calculated_duration'], 60)
+
+            # The player comes back after an outage longer than PRUNE_THRESHOLD
+            back = t0 + timedelta(minutes=1) + gap
+            ended = scan(cur, back, [PLAYER], second)
+            expect("stale sessions ended", len(ended), 1)
+            if ended:
+                server_id, player_id, _, _, _, start, end, session_uuid, duration = ended[0]
+                expect("ended session key", (server_id, player_id), (SERVER, PLAYER))
+                expect("ended session span", (start, end), (t0, t0 + timedelta(minutes=1)))
+                expect("ended session keeps its duration", duration, 60)
+                expect("ended session keeps its match", session_uuid, first)
+
+            row = active(cur, PLAYER)
+            expect("new session starts at the return", row['first_seen'], back)
+            expect("new session does not count the gap", row['calculated_duration'], 0)
+            expect("new session belongs to the new match", row['session_uuid'], second)
+
+            # Seen again a minute later: still the new session
+            expect("next scan ends nothing", scan(cur, back + timedelta(minutes=1), [PLAYER], second), [])
+            expect("new session duration", active(cur, PLAYER)['calculated_duration'], 60)
+
+            # A stale player who did not come back is left to prune_active_sessions
+            expect("absent player untouched", active(cur, OTHER)['last_seen'], t0 + timedelta(minutes=1))
+    finally:
+        db.rollback()
+
+    if failures:
+        print(f"[!] {len(failures)} failures")
+        sys.exit(1)
+    print("[OK] Returning players start a new session")
+
+
+if __name__ == "__main__":
+    if '--help' in sys.argv or '-h' in sys.argv:
+        print(__doc__)
+        sys.exit(0)
+    run()
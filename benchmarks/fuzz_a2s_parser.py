@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+A2S 回包解析模糊测试：对样本回包做截断、字节变异与拼接，校验 a2s_parser 的错误约定
+
+Usage:
+  python benchmarks/fuzz_a2s_parser.py [--iterations 20000] [--seed 1] [--file packets.txt]
+
+样本为 KF2 服务器的 S2A_INFO（含与不含 EDF 扩展字段）、S2A_PLAYER 与 S2C_CHALLENGE 回包（十六进制），
+并由 PLAYER 样本生成多包分片回包（明文与 bzip2 压缩两种）。--file 可追加抓包得到的回包，
+格式同 bench_a2s_parser.py（每行一个数据报的十六进制），只参与变异，不校验字段。
+
+校验内容：
+  * 未变异的样本解析出预期字段，分片乱序、重复到达时仍能重组出原回包
+  * parse_info / parse_players 对任何输入都不抛异常
+  * add_split_packet 只抛出 ValueError
+发现问题时打印可复现的十六进制输入，并以状态码 1 退出。
+"""
+import bz2
+import os
+import random
+import struct
+import sys
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.a2s_parser import SPLIT_HEADER, add_split_packet, parse_info, parse_players
+
+IP, PORT = "203.0.113.5", 27015
+
+# S2A_INFO：EDF 0xB1 = 端口 + SteamID + 关键字 + GameID
+INFO_EDF = bytes.fromhex(
+    "ffffffff49115b4b465d20e78c9be794b7e5a699e5a699e5b18b207c2048617264207c204c6f6e67004b462d4275726e696e67"
+    "5061726973006b6667616d65004b696c6c696e6720466c6f6f722032000000030600647700013131353000b1611e0000000000"
+    "0040016b2c537572766976616c2c48617264009a8a030000000000")
+# S2A_INFO：EDF 为 0，没有游戏端口
+INFO_PLAIN = bytes.fromhex(
+    "ffffffff49115472697077697265204f6666696369616c004b462d4f7574706f7374006b6667616d65004b696c6c696e672046"
+    "6c6f6f722032000000000600646c0001313135300000")
+# S2A_PLAYER：4 名玩家，含无名玩家、日文名、负分与首尾空白
+PLAYERS = bytes.fromhex(
+    "ffffffff4404005a656420536c6179657200f00500000010e5440100000000000000404102e3838ae3838400fdffffff00101644"
+    "0320207061646465642020002a00000000000000")
+CHALLENGE = bytes.fromhex("ffffffff411b2f9004")
+
+EXPECTED_PLAYERS = [
+    ("Zed Slayer", 1520, 1832.5),
+    (f"[UNNAMED:{IP}:{PORT}:1]", 0, 12.0),
+    ("ナツ", -3, 600.25),
+    ("padded", 42, 0.0),
+]
+EXPECTED = [
+    (INFO_EDF, ("[KF] 猛男妙妙屋 | Hard | Long", "KF-BurningParis", 3, 7777), []),
+    (INFO_PLAIN, ("Tripwire Official", "KF-Outpost", 0, None), []),
+    (PLAYERS, None, EXPECTED_PLAYERS),
+    (CHALLENGE, None, []),
+]
+
+
+def split_reply(payload, packet_id, size, compressed=False):
+    """按 Source 格式把单包回包切成分片（压缩时第一个分片带解压后长度与 CRC32）"""
+    body = payload
+    if compressed:
+        body = struct.pack('<LL', len(payload), zlib.crc32(payload)) + bz2.compress(payload)
+        packet_id |= 0x80000000
+    chunks = [body[i:i + size] for i in range(0, len(body), size)]
+    return [SPLIT_HEADER + struct.pack('<LBBH', packet_id, len(chunks), number, 1248) + chunk
+            for number, chunk in enumerate(chunks)]
+
+
+def mutate(rng, packet):
+    """截断、翻转字节、插入 / 删除字节，或保留报头后接随机尾部"""
+    data = bytearray(packet)
+    op = rng.randrange(5)
+    if op == 0:
+        del data[rng.randint(0, len(data)):]
+    elif op == 1:
+        for _ in range(rng.randint(1, 4)):
+            if data:
+                data[rng.randrange(len(data))] = rng.randrange(256)
+    elif op == 2:
+        pos = rng.randint(0, len(data))
+        data[pos:pos] = bytes(rng.randrange(256) for _ in range(rng.randint(1, 8)))
+    elif op == 3:
+        pos = rng.randint(0, len(data))
+        del data[pos:pos + rng.randint(1, 8)]
+    else:
+        data = data[:rng.randint(4, 6)] + bytes(rng.randrange(256) for _ in range(rng.randint(0, 64)))
+    return bytes(data)
+
+
+class Fuzzer:
+    def __init__(self):
+        self.failures = []
+        self.cases = 0
+
+    def fail(self, what, data, error=None):
+        if len(self.failures) < 10:
+            print(f"[!] {what}: {data.hex()}" + (f" ({type(error).__name__}: {error})" if error else ""))
+        self.failures.append(data)
+
+    def parse(self, data):
+        """解析函数不允许抛出任何异常"""
+        self.cases += 1
+        for fn, args in ((parse_info, ()), (parse_players, (IP, PORT))):
+            try:
+                fn(data, *args)
+            except Exception as e:
+                self.fail(fn.__name__, data, e)
+
+    def split(self, pending, fragment):
+        """add_split_packet 只允许抛出 ValueError"""
+        self.cases += 1
+        try:
+            payload = add_split_packet(pending, fragment)
+        except ValueError:
+            return None
+        except Exception as e:
+            self.fail("add_split_packet", fragment, e)
+            return None
+        if payload is not None:
+            self.parse(payload)
+        return payload
+
+
+def check_expected(fuzzer, rng, split_replies):
+    for packet, info, players in EXPECTED:
+        if parse_info(packet) != info:
+            fuzzer.fail(f"parse_info expected {info}, got {parse_info(packet)}", packet)
+        if parse_players(packet, IP, PORT) != players:
+            fuzzer.fail(f"parse_players expected {players}, got {parse_players(packet, IP, PORT)}", packet)
+
+    for fragments in split_replies:
+        # 乱序到达，且第一个分片重复一次
+        shuffled = fragments[:] + fragments[:1]
+        rng.shuffle(shuffled)
+        pending = {}
+        results = [add_split_packet(pending, fragment) for fragment in shuffled]
+        complete = [result for result in results if result is not None]
+        if not complete or complete[0] != SPLIT_SOURCE or parse_players(complete[0], IP, PORT) != SPLIT_PLAYERS:
+            fuzzer.fail("split reply not reassembled", fragments[0])
+
+
+def run(iterations, seed, extra):
+    rng = random.Random(seed)
+    fuzzer = Fuzzer()
+    split_replies = [split_reply(SPLIT_SOURCE, 7, 64), split_reply(SPLIT_SOURCE, 8, 48, compressed=True)]
+    check_expected(fuzzer, rng, split_replies)
+
+    corpus = [packet for packet, _, _ in EXPECTED] + extra
+    # 每个样本的所有截断长度
+    for packet in corpus:
+        for end in range(len(packet) + 1):
+            fuzzer.parse(packet[:end])
+
+    for _ in range(iterations):
+        fuzzer.parse(mutate(rng, rng.choice(corpus)))
+
+        # 分片：变异其中一个分片（或把单包回包伪装成分片），其余照常到达
+        fragments = list(rng.choice(split_replies))
+        index = rng.randrange(len(fragments))
+        fragments[index] = mutate(rng, fragments[index])
+        if rng.random() < 0.1:
+            fragments.append(SPLIT_HEADER + mutate(rng, rng.choice(corpus))[4:])
+        rng.shuffle(fragments)
+        pending = {}
+        for fragment in fragments:
+            fuzzer.split(pending, fragment)
+
+    print(f"[*] {fuzzer.cases} cases from {len(corpus)} packets and {len(split_replies)} split replies, seed {seed}")
+    return fuzzer.failures
+
+
+# 分片样本：PLAYERS 的玩家记录重复 12 次，凑出需要多个分片的回包
+SPLIT_PLAYERS = [(name if not name.startswith("[UNNAMED") else f"[UNNAMED:{IP}:{PORT}:{slot}]", score, dur)
+                 for slot, (name, score, dur) in enumerate(EXPECTED_PLAYERS * 12)]
+SPLIT_SOURCE = PLAYERS[:5] + bytes([len(SPLIT_PLAYERS)]) + PLAYERS[6:] * 12
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if '--help' in args or '-h' in args:
+        print(__doc__)
+        sys.exit(0)
+    iterations = int(args[args.index('--iterations') + 1]) if '--iterations' in args else 20000
+    seed = int(args[args.index('--seed') + 1]) if '--seed' in args else 1
+    extra = []
+    if '--file' in args:
+        with open(args[args.index('--file') + 1], encoding='utf-8') as f:
+            extra = [bytes.fromhex(line.strip()) for line in f if line.strip()]
+
+    failures = run(iterations, seed, extra)
+    if failures:
+        print(f"[!] {len(failures)} failures")
+        sys.exit(1)
+    print("[OK] No failures")
@@ -2,6 +2,10 @@
 """
 KF2-Panopticon 数据收集器入口
 这是原 Query.py 的简化入口
+
+Usage:
+  python collector.py                          # 执行一次扫描（适用于 cron）
+  python collector.py --daemon [--interval N]  # 常驻进程，每 N 秒扫描一次，缓存跨周期保留
 """
 import os
 import sys
@@ -19,5 +23,11 @@ if __name__ == "__main__":
 ║   Data Collector                                         ║
 ╚═══════════════════════════════════════════════════════════╝
     """)
-    Query.main()
+    if '--daemon' in sys.argv:
+        interval = None
+        if '--interval' in sys.argv:
+            interval = int(sys.argv[sys.argv.index('--interval') + 1])
+        Query.run_daemon(interval)
+    else:
+        Query.main()
 
@@ -37,14 +37,73 @@ DEBUG_MODE = True
 # 本地回环 IP (如果在游戏服务器上运行收集器)
 LOCAL_LOOPBACK_IP = "127.0.0.1"
 
-# 最大并发线程数 (根据你的网络和机器性能调整)
-MAX_WORKERS = 150
+# 本机公网 IP (留空则自动识别并缓存)、识别结果的缓存文件与有效期 (秒)
+PUBLIC_IP = ""
+PUBLIC_IP_CACHE = "data/public_ip.json"
+PUBLIC_IP_TTL = 86400
 
-# 查询超时时间 (秒)
+# 最大并发查询数 (异步引擎同时在途的服务器查询上限，根据你的网络调整)
+MAX_WORKERS = 2048
+
+# 查询复用的 UDP 套接字数量
+QUERY_SOCKETS = 4
+
+# 查询超时时间 (秒) - 单个服务器查询的总预算，也是自适应超时的上限
 TIMEOUT = 3.0
 
+# 自适应超时下限 / 无 RTT 历史时的初始超时 (秒)
+MIN_TIMEOUT = 0.2
+INITIAL_TIMEOUT = 1.0
+
+# 单次扫描内丢包重传次数
+QUERY_RETRIES = 2
+
+# 发包限速 (包/秒，0 表示不限速) 与允许的突发包数
+SEND_RATE = 5000
+SEND_BURST = 250
+
 # 清理阈值 (分钟) - 超过此时间未见的玩家会被移到历史记录
 PRUNE_THRESHOLD = 6
+# 每条归档语句最多移动的会话数
+PRUNE_BATCH_SIZE = 5000
+
+# dim_servers.last_seen 刷新间隔 (秒) - 服务器状态无变化时，last_seen 最多每隔此时间写一次
+# 必须明显小于 15 分钟的掉线判定窗口；0 表示每次扫描都写
+LAST_SEEN_REFRESH = 300
+
+# 守护进程模式 (collector.py --daemon) 的扫描周期 (秒)
+COLLECTOR_INTERVAL = 60
+
+# 汇总表校对间隔 (秒) 与校对窗口 (今天之前的天数)
+ROLLUP_RECONCILE_INTERVAL = 3600
+ROLLUP_RECONCILE_DAYS = 1
+
+# 历史表提前创建的月分区数与保留月数 (0 = 不分离旧分区)
+HISTORY_PARTITION_MONTHS_AHEAD = 2
+HISTORY_RETENTION_MONTHS = 0
+
+# 扫描流水线：队列容量、每批服务器数与攒批等待时间 (秒)
+PIPELINE_QUEUE_SIZE = 2000
+PIPELINE_BATCH_SIZE = 250
+PIPELINE_BATCH_WAIT = 0.5
+# 并行写库线程数 (按 server_id 分片，需小于 DB_POOL_MAX)
+DB_WRITERS = 4
+
+# Steam 主服务器列表缓存文件、缓存有效期 (秒) 与下载时间预算 (秒)
+MASTER_LIST_CACHE = "data/master_list.json"
+MASTER_LIST_CACHE_TTL = 1800
+MASTER_LIST_TIMEOUT = 20
+
+# GeoIP 二进制索引文件 (由 import_geoip.py 生成)
+GEOIP_BINARY = "data/ip_ranges.bin"
+
+# 分层扫描：有玩家的服务器频繁探测，空服较少探测，不可达服务器指数退避
+# 有玩家服务器的探测间隔必须小于 PRUNE_THRESHOLD，否则在线玩家会被误清理
+TIERED_SCAN = True
+SCHEDULE_POPULATED_INTERVAL = 60    # 秒
+SCHEDULE_EMPTY_INTERVAL = 600       # 秒
+SCHEDULE_BACKOFF_BASE = 120         # 秒，每次失败翻倍
+SCHEDULE_BACKOFF_MAX = 21600        # 秒
 
 # Steam API 配置
 APP_ID = 232090  # Killing Floor 2 的 Steam App ID
@@ -51,14 +51,77 @@ DEBUG_MODE = os.environ.get('DEBUG_MODE', 'true').lower() in ('true', '1', 'yes'
 # 本地回环 IP (如果在服务器上运行)
 LOCAL_LOOPBACK_IP = os.environ.get('LOCAL_LOOPBACK_IP', '127.0.0.1')
 
-# 最大并发线程数
-MAX_WORKERS = int(os.environ.get('MAX_WORKERS', '150'))
+# 本机公网 IP - 留空则自动识别 (结果缓存到 PUBLIC_IP_CACHE，PUBLIC_IP_TTL 秒后在后台刷新)
+# 公网地址等于该 IP 的服务器改由 LOCAL_LOOPBACK_IP 探测
+PUBLIC_IP = os.environ.get('PUBLIC_IP', '')
+PUBLIC_IP_CACHE = os.environ.get('PUBLIC_IP_CACHE', str(BASE_DIR / 'data' / 'public_ip.json'))
+PUBLIC_IP_TTL = int(os.environ.get('PUBLIC_IP_TTL', '86400'))
 
-# 查询超时时间 (秒)
+# 最大并发查询数 (异步引擎同时在途的服务器查询上限)
+MAX_WORKERS = int(os.environ.get('MAX_WORKERS', '2048'))
+
+# 查询复用的 UDP 套接字数量
+QUERY_SOCKETS = int(os.environ.get('QUERY_SOCKETS', '4'))
+
+# 查询超时时间 (秒) - 单个服务器查询的总预算，也是自适应超时的上限
 TIMEOUT = float(os.environ.get('TIMEOUT', '3.0'))
 
+# 自适应超时下限 / 无 RTT 历史时的初始超时 (秒)
+MIN_TIMEOUT = float(os.environ.get('MIN_TIMEOUT', '0.2'))
+INITIAL_TIMEOUT = float(os.environ.get('INITIAL_TIMEOUT', '1.0'))
+
+# 单次扫描内丢包重传次数
+QUERY_RETRIES = int(os.environ.get('QUERY_RETRIES', '2'))
+
+# 发包限速 (包/秒，0 表示不限速) 与允许的突发包数
+SEND_RATE = float(os.environ.get('SEND_RATE', '5000'))
+SEND_BURST = int(os.environ.get('SEND_BURST', '250'))
+
 # 清理阈值 (分钟)
 PRUNE_THRESHOLD = int(os.environ.get('PRUNE_THRESHOLD', '6'))
+# 每条归档语句最多移动的会话数 (停机后积压的会话分批归档)
+PRUNE_BATCH_SIZE = int(os.environ.get('PRUNE_BATCH_SIZE', '5000'))
+
+# dim_servers.last_seen 刷新间隔 (秒) - 服务器状态无变化时，last_seen 最多每隔此时间写一次
+# 必须明显小于 15 分钟的掉线判定窗口；0 表示每次扫描都写
+LAST_SEEN_REFRESH = int(os.environ.get('LAST_SEEN_REFRESH', '300'))
+
+# 汇总表校对 - 汇总表按每次扫描的增量维护，每隔 ROLLUP_RECONCILE_INTERVAL 秒与明细表核对最近
+# ROLLUP_RECONCILE_DAYS 天（含今天之前的天数），发现偏差时重建该窗口
+ROLLUP_RECONCILE_INTERVAL = int(os.environ.get('ROLLUP_RECONCILE_INTERVAL', '3600'))
+ROLLUP_RECONCILE_DAYS = int(os.environ.get('ROLLUP_RECONCILE_DAYS', '1'))
+
+# 历史表分区 - fact_history / fact_server_history 按月分区 (migrations/V005)，采集器每月提前创建
+# HISTORY_PARTITION_MONTHS_AHEAD 个月的分区；HISTORY_RETENTION_MONTHS > 0 时分离 (DETACH) 更早的分区 (0 = 不分离)
+HISTORY_PARTITION_MONTHS_AHEAD = int(os.environ.get('HISTORY_PARTITION_MONTHS_AHEAD', '2'))
+HISTORY_RETENTION_MONTHS = int(os.environ.get('HISTORY_RETENTION_MONTHS', '0'))
+
+# 扫描流水线 - 探测结果经有界队列 (PIPELINE_QUEUE_SIZE) 流向写库线程，按微批次写入：
+# 每批最多 PIPELINE_BATCH_SIZE 个服务器，首个结果到达后最多等待 PIPELINE_BATCH_WAIT 秒
+PIPELINE_QUEUE_SIZE = int(os.environ.get('PIPELINE_QUEUE_SIZE', '2000'))
+PIPELINE_BATCH_SIZE = int(os.environ.get('PIPELINE_BATCH_SIZE', '250'))
+PIPELINE_BATCH_WAIT = float(os.environ.get('PIPELINE_BATCH_WAIT', '0.5'))
+# 并行写库线程数 - 按 server_id 分片，每个分片占用一个连接池连接 (需小于 DB_POOL_MAX)
+DB_WRITERS = int(os.environ.get('DB_WRITERS', '4'))
+
+# Steam 主服务器列表 - 最近一次成功的列表缓存到 MASTER_LIST_CACHE；接口失败或超过
+# MASTER_LIST_TIMEOUT 秒未下载完时，回退到不超过 MASTER_LIST_CACHE_TTL 秒的缓存
+MASTER_LIST_CACHE = os.environ.get('MASTER_LIST_CACHE', str(BASE_DIR / 'data' / 'master_list.json'))
+MASTER_LIST_CACHE_TTL = int(os.environ.get('MASTER_LIST_CACHE_TTL', '1800'))
+MASTER_LIST_TIMEOUT = int(os.environ.get('MASTER_LIST_TIMEOUT', '20'))
+
+# GeoIP 二进制索引文件 (由 import_geoip.py 生成，采集器以 mmap 方式共享读取；不存在时回退到 ip_ranges 表)
+GEOIP_BINARY = os.environ.get('GEOIP_BINARY', str(BASE_DIR / 'data' / 'ip_ranges.bin'))
+
+# 守护进程模式 (collector.py --daemon) 的扫描周期 (秒)
+COLLECTOR_INTERVAL = int(os.environ.get('COLLECTOR_INTERVAL', '60'))
+
+# 分层扫描：有玩家的服务器频繁探测，空服较少探测，不可达服务器指数退避
+TIERED_SCAN = os.environ.get('TIERED_SCAN', 'true').lower() in ('true', '1', 'yes')
+SCHEDULE_POPULATED_INTERVAL = int(os.environ.get('SCHEDULE_POPULATED_INTERVAL', '60'))   # 秒
+SCHEDULE_EMPTY_INTERVAL = int(os.environ.get('SCHEDULE_EMPTY_INTERVAL', '600'))          # 秒
+SCHEDULE_BACKOFF_BASE = int(os.environ.get('SCHEDULE_BACKOFF_BASE', '120'))              # 秒
+SCHEDULE_BACKOFF_MAX = int(os.environ.get('SCHEDULE_BACKOFF_MAX', '21600'))              # 秒
 
 # Steam API 配置
 APP_ID = int(os.environ.get('STEAM_APP_ID', '232090'))  # Killing Floor 2 的 Steam App ID
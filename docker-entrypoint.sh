@@ -27,6 +27,11 @@ case "$MODE" in
     exec python Query.py
     ;;
   
+  collector-daemon)
+    echo "Starting Data Collector (Daemon Mode)..."
+    exec python collector.py --daemon
+    ;;
+  
   init)
     echo "Initializing Database..."
     exec python init_db.py
@@ -44,7 +49,7 @@ case "$MODE" in
   
   *)
     echo "Unknown mode: $MODE"
-    echo "Available modes: web, collector, init, init-force, status"
+    echo "Available modes: web, collector, collector-daemon, init, init-force, status"
     exit 1
     ;;
 esac
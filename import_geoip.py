@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+GeoIP Import CLI Tool
+
+Usage:
+  python import_geoip.py <ranges.csv[.gz]>              # Load CSV into ip_ranges and compile the binary index
+  python import_geoip.py <ranges.csv[.gz]> --skip-db    # Only compile the binary index
+  python import_geoip.py --compile                      # Compile the binary index from the existing ip_ranges table
+  python import_geoip.py ... --binary data/ip_ranges.bin  # Binary index path (default: config.GEOIP_BINARY)
+
+Supported city-level CSV layouts (no header row, detected from the first field):
+  IP2Location LITE DB3/DB5/DB11: ip_from, ip_to, country_code, country_name, region, city, ...  (integer IPs)
+  DB-IP Lite City:               ip_start, ip_end, continent, country_code, region, city, ...   (dotted IPs, IPv6 rows skipped)
+"""
+import csv
+import gzip
+import ipaddress
+import os
+import sys
+import time
+
+import config
+from app.models.database import get_database, stream_copy_rows
+from app.services.geoip import GEOIP_VERSION_KEY, GeoIPBuilder, GeoIPIndex
+
+
+def open_csv(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    return open(path, 'r', encoding='utf-8', newline='')
+
+
+def _clean(value):
+    value = value.strip()
+    return None if value in ('', '-') else value
+
+
+def read_ranges(path):
+    """
+    逐行解析 CSV，产出 (ip_from, ip_to, country_code, city_name)
+
+    Yields:
+        tuple: IP 为 IPv4 整数
+    """
+    with open_csv(path) as f:
+        for fields in csv.reader(f):
+            if len(fields) < 6:
+                continue
+            if fields[0].isdigit():
+                # IP2Location: integer bounds, country code in column 3
+                ip_from, ip_to = int(fields[0]), int(fields[1])
+                country_code = fields[2]
+            else:
+                # DB-IP: dotted bounds, continent in column 3
+                if ':' in fields[0]:
+                    continue
+                try:
+                    ip_from = int(ipaddress.IPv4Address(fields[0]))
+                    ip_to = int(ipaddress.IPv4Address(fields[1]))
+                except ValueError:
+                    continue  # header row or malformed line
+                country_code = fields[3]
+            if ip_to > 0xFFFFFFFF:
+                continue
+            yield ip_from, ip_to, _clean(country_code), _clean(fields[5])
+
+
+def load_table(db, rows):
+    """
+    流式 COPY 到新表，建索引后与 ip_ranges 原子替换（采集器读到的始终是完整数据），
+    并在同一事务中更新 meta_kv 中的版本号
+
+    Returns:
+        int: 导入的区间数
+    """
+    with db.cursor() as cur:
+        cur.execute("DROP TABLE IF EXISTS ip_ranges_import")
+        cur.execute("""
+            CREATE TABLE ip_ranges_import (
+                ip_from BIGINT NOT NULL,
+                ip_to BIGINT NOT NULL,
+                country_code VARCHAR(2),
+                city_name TEXT
+            )
+        """)
+        count = stream_copy_rows(cur, "ip_ranges_import", ("ip_from", "ip_to", "country_code", "city_name"), rows)
+        print(f"[*] Copied {count} ranges, building index...")
+        # Lookups take the first range with ip_to >= ip, so a btree on ip_to answers them with one probe
+        cur.execute("CREATE INDEX idx_ip_ranges_import_ip_to ON ip_ranges_import (ip_to)")
+        cur.execute("DROP TABLE IF EXISTS ip_ranges")
+        cur.execute("ALTER TABLE ip_ranges_import RENAME TO ip_ranges")
+        cur.execute("ALTER INDEX idx_ip_ranges_import_ip_to RENAME TO idx_ip_ranges_ip_to")
+        cur.execute("ANALYZE ip_ranges")
+        # Tell running collectors to reload their in-memory index
+        cur.execute("""
+            INSERT INTO meta_kv (key, value) VALUES (%s, %s)
+            ON CONFLICT(key) DO UPDATE SET value=excluded.value
+        """, (GEOIP_VERSION_KEY, str(time.time())))
+    db.commit()
+    return count
+
+
+def main():
+    args = sys.argv[1:]
+    binary_path = args[args.index('--binary') + 1] if '--binary' in args else config.GEOIP_BINARY
+    positional = [a for i, a in enumerate(args) if not a.startswith('--') and (i == 0 or args[i - 1] != '--binary')]
+    start = time.perf_counter()
+
+    if '--compile' in args:
+        db = get_database()
+        with db.cursor() as cur:
+            index = GeoIPIndex.load(cur)
+        db.commit()
+    elif positional:
+        csv_path = positional[0]
+        if not os.path.exists(csv_path):
+            print(f"[ERROR] File not found: {csv_path}")
+            sys.exit(1)
+
+        builder = GeoIPBuilder()
+
+        def rows():
+            for ip_from, ip_to, country_code, city_name in read_ranges(csv_path):
+                builder.add(ip_to, city_name, country_code)
+                yield ip_from, ip_to, country_code, city_name
+
+        if '--skip-db' in args:
+            for _ in rows():
+                pass
+        else:
+            try:
+                load_table(get_database(), rows())
+            except Exception as e:
+                print(f"[ERROR] Failed to load ip_ranges: {e}")
+                sys.exit(1)
+        index = builder.build()
+    else:
+        print(__doc__)
+        sys.exit(1)
+
+    if binary_path:
+        os.makedirs(os.path.dirname(os.path.abspath(binary_path)), exist_ok=True)
+        index.to_file(binary_path)
+        print(f"[*] Binary index written: {binary_path} ({os.path.getsize(binary_path) / 1048576:.1f} MB)")
+
+    print(f"[OK] {len(index)} ranges, {len(index.names)} locations in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    if '--help' in sys.argv or '-h' in sys.argv:
+        print(__doc__)
+        sys.exit(0)
+
+    main()
@@ -0,0 +1,19 @@
+-- Per-scan network statistics from the collector's A2S query engine
+-- (RTT, packet loss and retransmits), one row per scan
+
+CREATE TABLE IF NOT EXISTS fact_scan_stats (
+    id SERIAL PRIMARY KEY,
+    scan_time TIMESTAMP NOT NULL,
+    targets INTEGER NOT NULL,
+    responded INTEGER NOT NULL,
+    packets_sent INTEGER NOT NULL,
+    replies INTEGER NOT NULL,
+    lost_packets INTEGER NOT NULL,
+    retries INTEGER NOT NULL,
+    avg_rtt_ms REAL,
+    p50_rtt_ms REAL,
+    p95_rtt_ms REAL,
+    duration_ms INTEGER NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_fact_scan_stats_scan_time ON fact_scan_stats(scan_time DESC);
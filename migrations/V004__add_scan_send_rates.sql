@@ -0,0 +1,4 @@
+-- Achieved send rate vs reply rate per scan, for tuning SEND_RATE / SEND_BURST
+
+ALTER TABLE fact_scan_stats ADD COLUMN IF NOT EXISTS send_pps REAL;
+ALTER TABLE fact_scan_stats ADD COLUMN IF NOT EXISTS reply_pps REAL;
@@ -0,0 +1,57 @@
+-- Convert fact_history and fact_server_history to monthly range partitions on session_start
+--
+-- The existing heap is not rewritten: it is renamed to <table>_legacy and attached as the
+-- partition for everything before the first month after the migration, so its indexes and
+-- foreign keys are reused instead of rebuilt. The collector creates the monthly partitions
+-- (<table>_pYYYYMM) ahead of time; rows with a NULL session_start live in <table>_default.
+--
+-- Runs as a single DO block, i.e. one transaction, and skips tables that are already partitioned.
+-- Unique indexes (the id primary key) cannot be declared on the parent because they would have to
+-- include session_start; the legacy partition keeps its primary key and every partition gets an
+-- index on id.
+
+DO $$
+DECLARE
+    tbl TEXT;
+    legacy TEXT;
+    seq TEXT;
+    item RECORD;
+    bound TIMESTAMP := date_trunc('month', LOCALTIMESTAMP) + INTERVAL '1 month';
+BEGIN
+    FOREACH tbl IN ARRAY ARRAY['fact_history', 'fact_server_history'] LOOP
+        CONTINUE WHEN EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = tbl::regclass);
+        legacy := tbl || '_legacy';
+        seq := pg_get_serial_sequence(tbl, 'id');
+
+        EXECUTE format('ALTER TABLE %I RENAME TO %I', tbl, legacy);
+        FOR item IN SELECT indexname FROM pg_indexes
+                    WHERE schemaname = current_schema() AND tablename = legacy
+                      AND strpos(indexname, tbl) > 0 LOOP
+            EXECUTE format('ALTER INDEX %I RENAME TO %I', item.indexname, replace(item.indexname, tbl, legacy));
+        END LOOP;
+
+        EXECUTE format('CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS) PARTITION BY RANGE (session_start)', tbl, legacy);
+        EXECUTE format('ALTER SEQUENCE %s OWNED BY %I.id', seq, tbl);
+        FOR item IN SELECT conname, pg_get_constraintdef(oid) AS def FROM pg_constraint
+                    WHERE conrelid = legacy::regclass AND contype = 'f' LOOP
+            EXECUTE format('ALTER TABLE %I ADD CONSTRAINT %I %s', tbl, item.conname, item.def);
+        END LOOP;
+
+        EXECUTE format('CREATE TABLE %I PARTITION OF %I DEFAULT', tbl || '_default', tbl);
+        EXECUTE format('CREATE INDEX %I ON %I (id)', tbl || '_default_id_idx', tbl || '_default');
+        EXECUTE format('INSERT INTO %I SELECT * FROM %I WHERE session_start IS NULL OR session_start >= %L',
+                       tbl, legacy, bound);
+        EXECUTE format('DELETE FROM %I WHERE session_start IS NULL OR session_start >= %L', legacy, bound);
+        EXECUTE format('ALTER TABLE %I ATTACH PARTITION %I FOR VALUES FROM (MINVALUE) TO (%L)', tbl, legacy, bound);
+
+        -- Recreate the non-unique indexes on the parent under their original names;
+        -- the matching legacy indexes are attached rather than rebuilt
+        FOR item IN SELECT indexdef FROM pg_indexes
+                    WHERE schemaname = current_schema() AND tablename = legacy
+                      AND strpos(indexname, legacy) > 0
+                      AND indexdef NOT LIKE 'CREATE UNIQUE%' LOOP
+            EXECUTE replace(item.indexdef, legacy, tbl);
+        END LOOP;
+    END LOOP;
+END
+$$;
@@ -0,0 +1,62 @@
+-- Downsampled tiers of fact_global_stats for the /stats charts
+--
+-- fact_global_stats keeps raw per-scan rows for 48 hours; the 5-minute tier is kept for 30 days
+-- and the hourly / daily tiers forever. Buckets store sums and sample counts rather than
+-- averages, so the collector adds each scan with an upsert and averages over any coarser
+-- window stay exact. Retention is applied by the collector.
+
+CREATE TABLE IF NOT EXISTS fact_global_stats_5m (
+    bucket TIMESTAMP PRIMARY KEY,
+    samples INTEGER NOT NULL,
+    sum_players BIGINT NOT NULL,
+    max_players INTEGER,
+    sum_servers BIGINT NOT NULL,
+    max_servers INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS fact_global_stats_hourly (
+    bucket TIMESTAMP PRIMARY KEY,
+    samples INTEGER NOT NULL,
+    sum_players BIGINT NOT NULL,
+    max_players INTEGER,
+    sum_servers BIGINT NOT NULL,
+    max_servers INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS fact_global_stats_daily (
+    bucket TIMESTAMP PRIMARY KEY,
+    samples INTEGER NOT NULL,
+    sum_players BIGINT NOT NULL,
+    max_players INTEGER,
+    sum_servers BIGINT NOT NULL,
+    max_servers INTEGER
+);
+
+-- Backfill every tier from the raw rows collected so far; the collector trims the
+-- raw table and the 5-minute tier to their windows on its next scan
+INSERT INTO fact_global_stats_5m (bucket, samples, sum_players, max_players, sum_servers, max_servers)
+SELECT date_trunc('hour', scan_time) + FLOOR(EXTRACT(MINUTE FROM scan_time) / 5) * INTERVAL '5 minutes',
+       COUNT(*), COALESCE(SUM(active_players), 0), MAX(active_players),
+       COALESCE(SUM(active_servers), 0), MAX(active_servers)
+FROM fact_global_stats
+WHERE scan_time IS NOT NULL
+GROUP BY 1
+ON CONFLICT (bucket) DO NOTHING;
+
+INSERT INTO fact_global_stats_hourly (bucket, samples, sum_players, max_players, sum_servers, max_servers)
+SELECT date_trunc('hour', scan_time),
+       COUNT(*), COALESCE(SUM(active_players), 0), MAX(active_players),
+       COALESCE(SUM(active_servers), 0), MAX(active_servers)
+FROM fact_global_stats
+WHERE scan_time IS NOT NULL
+GROUP BY 1
+ON CONFLICT (bucket) DO NOTHING;
+
+INSERT INTO fact_global_stats_daily (bucket, samples, sum_players, max_players, sum_servers, max_servers)
+SELECT date_trunc('day', scan_time),
+       COUNT(*), COALESCE(SUM(active_players), 0), MAX(active_players),
+       COALESCE(SUM(active_servers), 0), MAX(active_servers)
+FROM fact_global_stats
+WHERE scan_time IS NOT NULL
+GROUP BY 1
+ON CONFLICT (bucket) DO NOTHING;
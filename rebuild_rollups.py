@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Rollup Backfill / Rebuild CLI Tool
+
+Rebuilds the daily rollup tables (fact_operator_daily, fact_map_daily, fact_server_daily,
+fact_player_daily, fact_traffic_daily) from fact_history / fact_server_history in day or
+month chunks, each chunk in its own short transaction on one of several pooled connections.
+Finished chunks are checkpointed in meta_kv, so an interrupted run resumes where it stopped
+when started again with the same arguments.
+
+Usage:
+  python rebuild_rollups.py                                    # Backfill every table over the full history
+  python rebuild_rollups.py --table fact_map_daily             # Only this table (repeatable)
+  python rebuild_rollups.py --from 2025-01-01 --to 2025-01-31  # Only this date range (inclusive)
+  python rebuild_rollups.py --chunk month                      # Chunk size: day (default) or month
+  python rebuild_rollups.py --workers 4                        # Parallel connections (default: 4)
+  python rebuild_rollups.py --restart                          # Ignore checkpoints of a previous run
+"""
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+
+from app.models.database import get_database
+import Query
+
+CHECKPOINT_PREFIX = "rollup_rebuild:"
+# 每次运行解析出的日期范围，续跑时沿用（历史表在运行期间仍会增长）
+BOUNDS_PREFIX = "rollup_rebuild_bounds:"
+
+
+def parse_day(value):
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def chunk_windows(first_day, last_day, chunk):
+    """[start, end) windows covering first_day..last_day inclusive"""
+    windows = []
+    start = first_day
+    while start <= last_day:
+        if chunk == 'month':
+            end = date(start.year + (start.month == 12), start.month % 12 + 1, 1)
+        else:
+            end = start + timedelta(days=1)
+        windows.append((start, min(end, last_day + timedelta(days=1))))
+        start = end
+    return windows
+
+
+def history_bounds(db):
+    """fact_history / fact_server_history 中最早与最晚的会话日期"""
+    with db.cursor() as cur:
+        cur.execute("""
+            SELECT MIN(first_day) AS first_day, MAX(last_day) AS last_day FROM (
+                SELECT MIN(session_start)::date AS first_day, MAX(session_start)::date AS last_day FROM fact_history
+                UNION ALL
+                SELECT MIN(session_start)::date, MAX(session_start)::date FROM fact_server_history
+            ) bounds
+        """)
+        row = cur.fetchone()
+    db.commit()
+    return row['first_day'], row['last_day']
+
+
+def load_checkpoints(db, run_id):
+    with db.cursor() as cur:
+        cur.execute("SELECT key FROM meta_kv WHERE key LIKE %s AND value = %s", (CHECKPOINT_PREFIX + '%', run_id))
+        done = {row['key'] for row in cur.fetchall()}
+    db.commit()
+    return done
+
+
+def load_bounds(db, run_id):
+    with db.cursor() as cur:
+        value = Query._kv_get(cur, BOUNDS_PREFIX + run_id)
+    db.commit()
+    if not value:
+        return None
+    first_day, last_day = value.split('|')
+    return parse_day(first_day), parse_day(last_day)
+
+
+def save_bounds(db, run_id, first_day, last_day):
+    with db.cursor() as cur:
+        Query._kv_set(cur, BOUNDS_PREFIX + run_id, f"{first_day}|{last_day}")
+    db.commit()
+
+
+def clear_checkpoints(db, run_id):
+    with db.cursor() as cur:
+        cur.execute("DELETE FROM meta_kv WHERE key LIKE %s AND value = %s", (CHECKPOINT_PREFIX + '%', run_id))
+        cur.execute("DELETE FROM meta_kv WHERE key = %s", (BOUNDS_PREFIX + run_id,))
+    db.commit()
+
+
+def checkpoint_key(spec, start):
+    return f"{CHECKPOINT_PREFIX}{spec['table']}:{start.isoformat()}"
+
+
+def rebuild_chunk(db, spec, start, end, run_id):
+    """
+    在独立事务中重建一个分块，并在同一事务中写入检查点（要么都生效，要么都不生效）。
+    持有共享咨询锁：分块之间可并行，但与采集器的增量写入互斥。
+    """
+    started = time.perf_counter()
+    try:
+        with db.cursor() as cur:
+            Query.lock_rollups(cur, shared=True)
+            Query.rebuild_rollup_window(cur, spec, start, end)
+            Query._kv_set(cur, checkpoint_key(spec, start), run_id)
+        db.commit()
+        return time.perf_counter() - started
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        # Hand the thread's connection back so the pool is not exhausted by idle workers
+        db.close()
+
+
+def main():
+    args = sys.argv[1:]
+
+    def values(flag):
+        return [args[i + 1] for i, a in enumerate(args) if a == flag and i + 1 < len(args)]
+
+    tables = values('--table')
+    chunk = (values('--chunk') or ['day'])[0]
+    workers = int((values('--workers') or ['4'])[0])
+    specs = [spec for spec in Query.ROLLUP_SPECS if not tables or spec['table'] in tables]
+    unknown = set(tables) - {spec['table'] for spec in Query.ROLLUP_SPECS}
+    if unknown or chunk not in ('day', 'month'):
+        print(f"[ERROR] Unknown table(s) {sorted(unknown)} or chunk '{chunk}'")
+        print(__doc__)
+        sys.exit(1)
+
+    db = get_database()
+    from_day = (values('--from') or ['auto'])[0]
+    to_day = (values('--to') or ['auto'])[0]
+    full_backfill = not tables and from_day == 'auto' and to_day == 'auto'
+
+    # The run id ties checkpoints to the command as typed, so a different rebuild never skips
+    # chunks while rerunning the same command resumes even after the history has grown
+    run_id = f"{','.join(spec['table'] for spec in specs)}|{from_day}|{to_day}|{chunk}"
+    if '--restart' in args:
+        clear_checkpoints(db, run_id)
+
+    # Bounds resolved from the history on the first invocation are reused on resume
+    bounds = load_bounds(db, run_id)
+    if bounds is None:
+        first_day, last_day = history_bounds(db)
+        if first_day is None:
+            print("[OK] History is empty, nothing to rebuild")
+            return
+        if from_day != 'auto':
+            first_day = parse_day(from_day)
+        if to_day != 'auto':
+            last_day = parse_day(to_day)
+        save_bounds(db, run_id, first_day, last_day)
+    else:
+        first_day, last_day = bounds
+    done = load_checkpoints(db, run_id)
+
+    jobs = [(spec, start, end) for start, end in chunk_windows(first_day, last_day, chunk) for spec in specs
+            if checkpoint_key(spec, start) not in done]
+    total = len(jobs) + len(done)
+    print(f"[*] Rebuilding {len(specs)} table(s) from {first_day} to {last_day} in {chunk} chunks: "
+          f"{len(jobs)} pending, {len(done)} already done, {workers} workers")
+
+    started = time.perf_counter()
+    failures = 0
+    finished = len(done)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(rebuild_chunk, db, spec, start, end, run_id): (spec, start)
+                   for spec, start, end in jobs}
+        for future in as_completed(futures):
+            spec, start = futures[future]
+            finished += 1
+            try:
+                elapsed = future.result()
+                print(f"[*] [{finished}/{total}] {spec['table']} {start} in {elapsed:.2f}s")
+            except Exception as e:
+                failures += 1
+                print(f"[!] [{finished}/{total}] {spec['table']} {start} failed: {e}")
+
+    if failures:
+        print(f"[ERROR] {failures} chunk(s) failed; rerun the same command to resume")
+        sys.exit(1)
+
+    clear_checkpoints(db, run_id)
+    if full_backfill:
+        with db.cursor() as cur:
+            Query._kv_set(cur, "rollups_backfilled", "1")
+        db.commit()
+    print(f"[OK] Rebuilt {len(jobs)} chunk(s) in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == '__main__':
+    if '--help' in sys.argv or '-h' in sys.argv:
+        print(__doc__)
+        sys.exit(0)
+
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Operator Reclassification CLI Tool
+
+Re-runs the faction classifier over every server in dim_servers, writes the
+changed operator names back in bulk and rebuilds fact_operator_daily for the
+operators that gained or lost servers.
+
+Usage:
+  python reclassify.py                 # Reclassify and apply
+  python reclassify.py --dry-run       # Only report the reassignments
+  python reclassify.py --workers 8     # Process pool size (default: CPU count)
+  python reclassify.py --top 50        # Number of reassignment groups to list (default: 20)
+"""
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from psycopg2.extras import execute_values
+
+from app.models.database import get_database
+from app.services.faction import FactionClassifier
+import Query
+
+# Below this many servers the pool start-up costs more than it saves
+POOL_THRESHOLD = 5000
+CHUNK_SIZE = 2000
+
+_classifier = None
+
+
+def _classify_chunk(chunk):
+    """工作进程：每个进程只编译一次分类器；不启用 LRU（每个名字只出现一次）"""
+    global _classifier
+    if _classifier is None:
+        _classifier = FactionClassifier(memo_size=0)
+    return [(sid, _classifier.classify(name, ip)) for sid, name, ip in chunk]
+
+
+def classify_all(servers, workers):
+    """
+    Returns:
+        dict: {server_id: operator_name}
+    """
+    items = [(row['id'], row['name'], row['ip_address']) for row in servers]
+    if len(items) < POOL_THRESHOLD or workers <= 1:
+        return dict(_classify_chunk(items))
+    chunks = [items[i:i + CHUNK_SIZE] for i in range(0, len(items), CHUNK_SIZE)]
+    result = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for part in pool.map(_classify_chunk, chunks):
+            result.update(part)
+    return result
+
+
+def report(changes, top):
+    moves = Counter((old, new) for _, old, new in changes)
+    print(f"[*] {len(changes)} servers reassigned across {len(moves)} operator changes")
+    for (old, new), count in moves.most_common(top):
+        print(f"    {count:>6}  {old or '(none)'} -> {new}")
+    if len(moves) > top:
+        print(f"    ... {len(moves) - top} more")
+
+
+def main():
+    args = sys.argv[1:]
+    dry_run = '--dry-run' in args
+    workers = int(args[args.index('--workers') + 1]) if '--workers' in args else (os.cpu_count() or 1)
+    top = int(args[args.index('--top') + 1]) if '--top' in args else 20
+    start = time.perf_counter()
+
+    db = get_database()
+    try:
+        with db.cursor() as cur:
+            cur.execute("SELECT id, name, ip_address, operator_name FROM dim_servers")
+            servers = cur.fetchall()
+            print(f"[*] Loaded {len(servers)} servers in {time.perf_counter() - start:.2f}s")
+
+            phase = time.perf_counter()
+            classified = classify_all(servers, workers)
+            print(f"[*] Classified in {time.perf_counter() - phase:.2f}s ({workers} workers)")
+
+            changes = [(row['id'], row['operator_name'], classified[row['id']])
+                       for row in servers if classified[row['id']] != row['operator_name']]
+            report(changes, top)
+            if not changes or dry_run:
+                db.rollback()
+                return
+
+            phase = time.perf_counter()
+            execute_values(cur, """
+                UPDATE dim_servers AS d SET operator_name = v.operator_name
+                FROM (VALUES %s) AS v(id, operator_name)
+                WHERE d.id = v.id
+            """, [(sid, new) for sid, _, new in changes], template="(%s::int, %s::text)", page_size=1000)
+
+            affected = sorted({name for _, old, new in changes for name in (old, new) if name})
+            Query.rebuild_operator_rollups(cur, affected)
+        db.commit()
+        print(f"[*] Wrote {len(changes)} servers and rebuilt fact_operator_daily for {len(affected)} operators "
+              f"in {time.perf_counter() - phase:.2f}s")
+    except Exception as e:
+        db.rollback()
+        print(f"[ERROR] Reclassification failed: {e}")
+        sys.exit(1)
+
+    print(f"[OK] Done in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == '__main__':
+    if '--help' in sys.argv or '-h' in sys.argv:
+        print(__doc__)
+        sys.exit(0)
+
+    main()